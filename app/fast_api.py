@@ -1,23 +1,262 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
-from src.image_classifier import Image_Classifier
-from src.rag_integration import retrieve_answer
-from src.audio_handler import Audio
-from src.translate_handler import Translation
-from PIL import Image
+from src.image_classifier import Batch_Classifier
+from src.orchestrator import Inference_Orchestrator
+from src.worker_pool import Worker_Pool
+from src.model_registry import registry
+from src.rag_integration import aretrieve_answer, stream_answer
+from src.embeddings import query_cache
+from src.audio_handler import Audio, TRANSCRIBE_WORKERS
+from src.translate_handler import Translation, sentence_cache
+from src.language_id import language_cache
+from src.job_store import JobStore, Job_Queue, idempotency_key_for
+from src.admission import (Admission_Controller, Overloaded, request_priority, PRIORITY_JOB, PRIORITY_AUDIO,
+                           IMAGE_MAX_BATCH)
+from src.metrics import metrics, trace_id, new_trace_id, cache_gauges
+from starlette.background import BackgroundTask
+import threading
+import asyncio
+import json
+import time
 import os
-import uuid
-import shutil
 
 app = FastAPI()
 
 image_model = None
+image_batcher = None
+orchestrator = None
+worker_pool = None
+job_store = None
+job_queue = None
+# Per-stage concurrency limits and bounded priority queues
+admission = Admission_Controller()
+
+
+def semantic_cache_stats():
+    ''' Stats of the LLM's semantic answer cache, empty until the LLM is loaded '''
+    if registry.is_loaded("llm") and registry.get("llm").semantic_cache:
+        return registry.get("llm").semantic_cache.stats()
+    return {}
+
+
+REQUEST_SECONDS = metrics.histogram("agrox_request_seconds", "HTTP request latency", ("path", "status"))
+cache_gauges({
+    "query_embedding": query_cache.stats,
+    "translation": sentence_cache.stats,
+    "language_id": language_cache.stats,
+    "semantic_answer": semantic_cache_stats,
+})
+metrics.gauge("agrox_semantic_cache_hit_ratio", "Semantic answer cache hit ratio per route", ("route",),
+              lambda: {route: s["hit_rate"] for route, s in semantic_cache_stats().get("routes", {}).items()})
+for field in ("hits", "misses"):
+    metrics.gauge(f"agrox_semantic_cache_{field}", f"Semantic answer cache {field} per route", ("route",),
+                  lambda field=field: {route: s[field]
+                                       for route, s in semantic_cache_stats().get("routes", {}).items()})
+metrics.gauge("agrox_admission_queue_depth", "Requests waiting for a stage", ("stage",),
+              lambda: {stage: s["queue_depth"] for stage, s in admission.stats().items()})
+metrics.gauge("agrox_admission_active", "Requests inside a stage", ("stage",),
+              lambda: {stage: s["active"] for stage, s in admission.stats().items()})
+metrics.gauge("agrox_admission_shed", "Requests shed by a stage since start", ("stage", "reason"),
+              lambda: {(stage, reason): s[f"shed_{reason}"]
+                       for stage, s in admission.stats().items() for reason in ("full", "deadline")})
+metrics.gauge("agrox_image_batch_occupancy", "Average share of the image batch filled", (),
+              lambda: {(): image_batcher.get_stats()["avg_occupancy"]} if image_batcher else {})
+metrics.gauge("agrox_jobs", "Live background jobs per status", ("status",),
+              lambda: job_store.counts() if job_store else {})
+metrics.gauge("agrox_job_queue_depth", "Background jobs waiting for a worker", (),
+              lambda: {(): job_queue.queue.qsize()} if job_queue else {})
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Tag the request with a trace id (the caller's X-Trace-Id / X-Request-ID or a new one)
+    that stage logs carry, echo it back, and record the request latency."""
+    trace = request.headers.get("x-trace-id") or request.headers.get("x-request-id") or new_trace_id()
+    token = trace_id.set(trace)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        trace_id.reset(token)
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(time.perf_counter() - start,
+                            path=route.path if route else "unmatched", status=response.status_code)
+    response.headers["X-Trace-Id"] = trace
+    return response
 
 @app.on_event("startup")
 async def load_model():
-    global image_model
-    image_model = Image_Classifier()
+    global image_model, image_batcher, orchestrator, worker_pool, job_store, job_queue
+    # e.g. AGROX_WORKER_PROCESSES=image_classifier,whisper,embedder runs those models in their own processes
+    families = [name.strip() for name in os.getenv("AGROX_WORKER_PROCESSES", "").split(",") if name.strip()]
+    if families:
+        worker_pool = await run_in_threadpool(lambda: Worker_Pool(families).start())
+        worker_pool.install(registry)
+    warmup = os.getenv("AGROX_WARMUP_MODELS", "image_classifier,whisper,embedder,llm")
+    registry.warm_up([name.strip() for name in warmup.split(",") if name.strip()])
+    image_model = registry.get("image_classifier")
+    # The batcher keeps a reference for the lifetime of the app
+    registry.pin("image_classifier")
+    image_batcher = Batch_Classifier(
+        image_model,
+        max_batch_size=IMAGE_MAX_BATCH,
+        batch_window_ms=float(os.getenv("AGROX_IMAGE_BATCH_WINDOW_MS", 10)),
+    )
+    await image_batcher.start()
+    orchestrator = Inference_Orchestrator(
+        image_batcher,
+        max_workers=int(os.getenv("AGROX_INFER_WORKERS", 4)),
+        admission=admission,
+    )
+    job_store = JobStore(
+        os.getenv("AGROX_JOB_DB", os.path.join("database", "jobs.db")),
+        ttl=float(os.getenv("AGROX_JOB_TTL", 24 * 3600)),
+    )
+    job_queue = Job_Queue(
+        job_store,
+        run_job,
+        workers=int(os.getenv("AGROX_JOB_WORKERS", 2)),
+        maxsize=int(os.getenv("AGROX_JOB_QUEUE_SIZE", 1000)),
+    )
+    await job_queue.start()
+
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    if job_queue:
+        await job_queue.stop()
+    if image_batcher:
+        await image_batcher.stop()
+    if orchestrator:
+        orchestrator.shutdown()
+    if worker_pool:
+        worker_pool.stop()
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "image_classifier": image_batcher.get_stats() if image_batcher else {},
+        "models": registry.stats(),
+        "workers": worker_pool.stats() if worker_pool else {},
+        "admission": admission.stats(),
+        "jobs": {**job_queue.get_stats(), **job_store.counts()} if job_queue else {},
+        "query_embedding_cache": query_cache.stats(),
+        "translation_cache": sentence_cache.stats(),
+        "language_id_cache": language_cache.stats(),
+        "semantic_answer_cache": semantic_cache_stats(),
+    }
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Stage latencies, generation speed, cache hit ratios and queue depths in the Prometheus text format."""
+    return PlainTextResponse(await run_in_threadpool(metrics.render),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.post("/transcribe/stream")
+async def transcribe_stream(
+    audio: UploadFile = File(...),
+    workers: int = Form(1)
+):
+    """Stream a transcript as newline-delimited JSON, one line per audio chunk."""
+    try:
+        # Held until the stream finishes, like the llm slot of /infer/stream
+        await admission["whisper"].acquire(PRIORITY_AUDIO)
+    except Overloaded as e:
+        return overloaded_response(e)
+    release_whisper = stream_releaser(admission["whisper"])
+    try:
+        audio_handler = await run_in_threadpool(Audio, await audio.read())
+    except Exception as e:
+        release_whisper()
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+    def chunks():
+        try:
+            for i, text in enumerate(audio_handler.transcribe_stream(workers=max(1, min(workers, TRANSCRIBE_WORKERS)))):
+                yield json.dumps({"chunk": i, "text": text}) + "\n"
+            yield json.dumps({"done": True}) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+        finally:
+            release_whisper()
+
+    return StreamingResponse(chunks(), media_type="application/x-ndjson", background=BackgroundTask(release_whisper))
+
+
+def overloaded_response(e):
+    return JSONResponse(status_code=503, content={"error": str(e), "stage": e.stage},
+                        headers={"Retry-After": str(e.retry_after)})
+
+
+def stream_releaser(limiter):
+    """Release function for a slot held across a streaming response.
+
+    Safe to call from the streaming thread and again as a background task
+    (in case the stream never started); only the first call releases.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    released = threading.Event()
+
+    def release():
+        if not released.is_set():
+            released.set()
+            loop.call_soon_threadsafe(limiter.release, time.perf_counter() - started)
+    return release
+
+
+async def read_inputs(image, audio, text):
+    """Read the uploads and prepare the prompt through the orchestrator."""
+    return await orchestrator.prepare(
+        image_bytes=await image.read() if image else None,
+        audio_bytes=await audio.read() if audio else None,
+        text=text,
+        priority=request_priority(image, audio, text),
+    )
+
+
+async def run_inference(image_bytes=None, audio_bytes=None, text=None, priority=None, **admission_kwargs):
+    """Prepare the prompt, answer it and translate back to Igbo when needed.
+
+    Args:
+        priority: admission lane, derived from the inputs when not given
+        admission_kwargs: passed to Stage_Limiter.acquire (e.g. timeout=None for background jobs)
+
+    Returns:
+        (response content, Stage_Timings)
+
+    Raises:
+        Overloaded: a stage's queue was full or its deadline passed
+    """
+    if priority is None:
+        priority = request_priority(image_bytes, audio_bytes, text)
+    prepared = await orchestrator.prepare(image_bytes=image_bytes, audio_bytes=audio_bytes, text=text,
+                                          priority=priority, **admission_kwargs)
+    prompt, translator, timings = prepared["prompt"], prepared["translator"], prepared["timings"]
+
+    start = time.perf_counter()
+    async with admission["llm"].slot(priority, **admission_kwargs):
+        timings.add("llm_queue", time.perf_counter() - start)
+        start = time.perf_counter()
+        answer = await aretrieve_answer(prompt, context_ids=prepared["context_ids"])
+    timings.add("generate", time.perf_counter() - start)
+
+    if translator and translator.lang == "ig":
+        start = time.perf_counter()
+        answer_igbo = await run_in_threadpool(lambda: Translation(answer).translate())
+        timings.add("back_translate", time.perf_counter() - start)
+        return {
+            "prompt": prompt,
+            "answer_english": answer,
+            "answer_igbo": answer_igbo
+        }, timings
+
+    return {"prompt": prompt, "answer": answer}, timings
 
 
 @app.post("/infer")
@@ -30,60 +269,114 @@ async def infer(
         if not any([image, audio, text]):
             raise HTTPException(status_code=400, detail="At least one input (image, audio, or text) is required.")
 
-        prompt = ""
-        translator = None
-        
-        if image:
-            image_ext = os.path.splitext(image.filename)[1]
-            image_path = f"temp_{uuid.uuid4().hex}{image_ext}"
-            with open(image_path, "wb") as f:
-                shutil.copyfileobj(image.file, f)
-
-            img = Image.open(image_path)
-            label = image_model.classify_plant_image(img)
-            prompt += f"Image shows: {label}. "
-            os.remove(image_path)
-
-        if audio:
-            audio_ext = os.path.splitext(audio.filename)[1]
-            audio_path = f"temp_{uuid.uuid4().hex}{audio_ext}"
-            wav_path = f"temp_{uuid.uuid4().hex}.wav"
-            with open(audio_path, "wb") as f:
-                shutil.copyfileobj(audio.file, f)
-
-            audio_handler = Audio(audio_path, output_path=wav_path)
-            raw_text = audio_handler.transcribe_audio()
-
-            translator = Translation(raw_text)
-            if translator.lang == "ig":
-                translated_text = translator.translate()
-                prompt += f"Farmer said (in Igbo): {translated_text}. "
-            else:
-                prompt += f"Farmer said: {raw_text}. "
-
-            os.remove(audio_path)
-            os.remove(wav_path)
-
-        if text:
-            translator = Translation(text)
-            if translator.lang == "ig":
-                translated_text = translator.translate()
-                prompt += f"Farmer typed (in Igbo): {translated_text}. "
-            else:
-                prompt += f"Farmer typed: {text}. "
-
-        answer = retrieve_answer(prompt)
-
-        if translator and translator.lang == "ig":
-            back_translator = Translation(answer)
-            answer_igbo = back_translator.translate()
-            return {
-                "prompt": prompt,
-                "answer_english": answer,
-                "answer_igbo": answer_igbo
-            }
-
-        return {"prompt": prompt, "answer": answer}
+        content, timings = await run_inference(
+            image_bytes=await image.read() if image else None,
+            audio_bytes=await audio.read() if audio else None,
+            text=text,
+        )
+        return JSONResponse(content=content, headers={"Server-Timing": timings.header()})
+
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+async def run_job(inputs):
+    # Jobs already wait in their own queue, so they take the lowest lane and are never shed
+    content, timings = await run_inference(**inputs, priority=PRIORITY_JOB, timeout=None, bounded=False)
+    return {**content, "timings_ms": {name: seconds * 1000 for name, seconds in timings.stages.items()}}
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+    image: UploadFile = File(None),
+    audio: UploadFile = File(None),
+    text: str = Form(None),
+    idempotency_key: str = Header(None)
+):
+    """Queue an /infer request and return its id at once; poll GET /jobs/{id} for the result.
+
+    Retries with the same Idempotency-Key header return the job created by the
+    first attempt. Without one, identical uploads share a job only while it is
+    still queued or running.
+    """
+    if not any([image, audio, text]):
+        raise HTTPException(status_code=400, detail="At least one input (image, audio, or text) is required.")
+    inputs = {
+        "image_bytes": await image.read() if image else None,
+        "audio_bytes": await audio.read() if audio else None,
+        "text": text,
+    }
+    key = idempotency_key or idempotency_key_for(inputs["image_bytes"], inputs["audio_bytes"], text)
+    job, created = await run_in_threadpool(job_store.create, inputs, key, active_only=not idempotency_key)
+    if created:
+        try:
+            job_queue.submit(job["job_id"])
+        except asyncio.QueueFull:
+            await run_in_threadpool(job_store.fail, job["job_id"], "Job queue is full")
+            return JSONResponse(status_code=503, content={"error": "Job queue is full, retry later"},
+                                headers={"Retry-After": "30"})
+    return JSONResponse(status_code=202 if created else 200, content={
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/jobs/{job['job_id']}",
+    })
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 
+@app.post("/infer/stream")
+async def infer_stream(
+    image: UploadFile = File(None),
+    audio: UploadFile = File(None),
+    text: str = Form(None)
+):
+    """Server-sent events variant of /infer: a prompt event, token events as
+    the answer is generated, then a done event (with the Igbo translation
+    when the farmer used Igbo)."""
+    if not any([image, audio, text]):
+        raise HTTPException(status_code=400, detail="At least one input (image, audio, or text) is required.")
+    priority = request_priority(image, audio, text)
+    try:
+        prepared = await read_inputs(image, audio, text)
+        # Held until the stream finishes; released from the streaming thread
+        await admission["llm"].acquire(priority)
+    except Overloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
+    prompt, translator = prepared["prompt"], prepared["translator"]
+    release_llm = stream_releaser(admission["llm"])
+
+    def events():
+        yield sse("prompt", {"prompt": prompt})
+        pieces = []
+        try:
+            for token in stream_answer(prompt, context_ids=prepared["context_ids"]):
+                pieces.append(token)
+                yield sse("token", {"text": token})
+            answer = "".join(pieces).strip()
+            done = {"answer": answer}
+            if translator and translator.lang == "ig":
+                done["answer_igbo"] = Translation(answer).translate()
+            yield sse("done", done)
+        except Exception as e:
+            yield sse("error", {"error": str(e)})
+        finally:
+            release_llm()
+
+    # Generation timing is not known until the stream ends, so only input preparation is reported
+    return StreamingResponse(events(), media_type="text/event-stream", background=BackgroundTask(release_llm),
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no",
+                                      "Server-Timing": prepared["timings"].header()})
@@ -1,7 +1,7 @@
 import streamlit as st
 from PIL import Image
 import os
-from src.image_classifier import Image_Classifier
+from src.model_registry import registry
 from src.rag_integration import qa_chain  # RAG setup
 
 st.title("🌿 AgriSense Assistant")
@@ -26,7 +26,8 @@ if image:
     image_path = os.path.join("images", "live_leaf.jpg")
     image.save(image_path)
 
-    image_model = Image_Classifier()
+    # Shared across reruns: the registry loads the classifier once per process
+    image_model = registry.get("image_classifier")
     label = image_model.classify_plant_image(image_path)
     st.success(f"🦠 Detected Disease: `{label}`")
 
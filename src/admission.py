@@ -0,0 +1,196 @@
+import itertools
+import asyncio
+import logging
+import heapq
+import time
+import os
+
+logging.basicConfig(level=logging.INFO)
+
+# Request lanes, served in this order when a stage is saturated
+PRIORITY_TEXT = 0
+PRIORITY_IMAGE = 1
+PRIORITY_AUDIO = 2
+PRIORITY_JOB = 3
+
+# Largest batch the image batcher forms
+IMAGE_MAX_BATCH = int(os.getenv("AGROX_IMAGE_MAX_BATCH", 8))
+
+# stage: (concurrency, max queued, seconds a request may wait in the queue)
+# Override with AGROX_ADMISSION_<STAGE>="concurrency,max_queue,queue_timeout"
+# The classifier admits a full batch at once, otherwise the batcher never fills one.
+# Whisper runs one decode at a time on the shared model, so more concurrency only adds waiting
+DEFAULT_LIMITS = {
+    "classifier": (IMAGE_MAX_BATCH, 32, 5.0),
+    "whisper": (1, 16, 20.0),
+    "llm": (2, 16, 30.0),
+}
+
+
+class Overloaded(Exception):
+    ''' A stage shed the request; retry_after is a hint in seconds '''
+
+    def __init__(self, stage, reason, retry_after):
+        super().__init__(f"{stage} is overloaded ({reason})")
+        self.stage = stage
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def request_priority(image=None, audio=None, text=None):
+    ''' Lane of a request from its inputs: text-only first, audio last '''
+    if audio:
+        return PRIORITY_AUDIO
+    if image:
+        return PRIORITY_IMAGE
+    return PRIORITY_TEXT
+
+
+class Stage_Limiter:
+    ''' Concurrency limit with a bounded priority queue in front of one stage
+
+    Up to `concurrency` callers run at once. Others wait in priority order
+    (FIFO within a lane). A caller is shed straight away when the queue is
+    full, or once it has waited longer than queue_timeout.
+    '''
+
+    def __init__(self, name, concurrency, max_queue, queue_timeout):
+        ''' Initialize limiter
+        Args:
+            name: stage name, used in errors and stats
+            concurrency: callers allowed in the stage at once
+            max_queue: callers allowed to wait; further callers are rejected
+            queue_timeout: seconds a caller may wait before it is rejected
+        '''
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._service_seconds = 0.0
+        self._stats = {"admitted": 0, "shed_full": 0, "shed_deadline": 0, "completed": 0,
+                       "queue_wait_seconds": 0.0}
+
+    def retry_after(self):
+        ''' Seconds until the current queue would likely have drained '''
+        completed = self._stats["completed"]
+        avg = self._service_seconds / completed if completed else 1.0
+        return max(1, round(avg * (len(self._waiters) + 1) / self.concurrency))
+
+    async def acquire(self, priority=PRIORITY_TEXT, timeout=-1, bounded=True):
+        ''' Wait for a slot
+        Args:
+            priority: lane, lower runs first
+            timeout: queue deadline in seconds; -1 uses queue_timeout, None waits forever
+            bounded: False lets the caller queue beyond max_queue (background jobs)
+        Raises:
+            Overloaded: the queue is full or the deadline passed
+        '''
+        if self._active < self.concurrency and not self._waiters:
+            self._active += 1
+            self._stats["admitted"] += 1
+            return
+        if bounded and len(self._waiters) >= self.max_queue:
+            self._stats["shed_full"] += 1
+            raise Overloaded(self.name, "queue full", self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), future)
+        heapq.heappush(self._waiters, entry)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout if timeout == -1 else timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # Granted just as the deadline passed; hand the slot on
+                self._release_slot()
+            else:
+                future.cancel()
+            self._remove(entry)
+            self._stats["shed_deadline"] += 1
+            raise Overloaded(self.name, "queue deadline exceeded", self.retry_after())
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release_slot()
+            else:
+                future.cancel()
+            self._remove(entry)
+            raise
+        finally:
+            self._stats["queue_wait_seconds"] += time.perf_counter() - start
+        self._stats["admitted"] += 1
+
+    def _remove(self, entry):
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+
+    def _release_slot(self):
+        ''' Give the slot to the next live waiter, or free it '''
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(True)
+                return
+        self._active -= 1
+
+    def release(self, seconds=0.0):
+        ''' Free a slot
+        Args:
+            seconds: time the caller spent in the stage, for Retry-After estimates
+        '''
+        self._service_seconds += seconds
+        self._stats["completed"] += 1
+        self._release_slot()
+
+    def slot(self, priority=PRIORITY_TEXT, **kwargs):
+        ''' Async context manager around acquire/release '''
+        return _Slot(self, priority, kwargs)
+
+    def stats(self):
+        completed = self._stats["completed"]
+        return {
+            **self._stats,
+            "active": self._active,
+            "queue_depth": len(self._waiters),
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "avg_service_seconds": self._service_seconds / completed if completed else 0.0,
+        }
+
+
+class _Slot:
+    def __init__(self, limiter, priority, kwargs):
+        self.limiter = limiter
+        self.priority = priority
+        self.kwargs = kwargs
+
+    async def __aenter__(self):
+        await self.limiter.acquire(self.priority, **self.kwargs)
+        self.start = time.perf_counter()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.limiter.release(time.perf_counter() - self.start)
+        return False
+
+
+class Admission_Controller:
+    ''' One Stage_Limiter per expensive stage '''
+
+    def __init__(self, limits=None):
+        limits = dict(limits or DEFAULT_LIMITS)
+        for stage in limits:
+            override = os.getenv(f"AGROX_ADMISSION_{stage.upper()}")
+            if override:
+                concurrency, max_queue, queue_timeout = override.split(",")
+                limits[stage] = (int(concurrency), int(max_queue), float(queue_timeout))
+        self.stages = {stage: Stage_Limiter(stage, *limit) for stage, limit in limits.items()}
+
+    def __getitem__(self, stage):
+        return self.stages[stage]
+
+    def stats(self):
+        return {stage: limiter.stats() for stage, limiter in self.stages.items()}
@@ -1,49 +1,264 @@
 import logging
+from src.model_registry import registry, WHISPER_MODEL
+from src.metrics import timed
+from src.worker_pool import Remote_Model
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from collections import deque
+import numpy as np
+import subprocess
+import threading
+import tempfile
 import whisper
-from pydub import AudioSegment
 import os
-import time
+
+SAMPLE_RATE = 16000
+
+# Threads (and so Whisper instances) of the chunk pool shared by all streaming requests.
+# Each thread loads its own model outside the registry's budget, so keep this small.
+# When whisper runs in a worker process the threads send their chunks there instead.
+TRANSCRIBE_WORKERS = max(1, int(os.getenv("AGROX_TRANSCRIBE_WORKERS", 2)))
+
+# Whisper installs decoding hooks on the model, so concurrent chunks each get
+# their own model instance, one per pool thread.
+_worker_state = threading.local()
+_pool = None
+_pool_lock = threading.Lock()
+
+# The registry's Whisper model is shared by all requests, and the same hooks make
+# concurrent decodes on it corrupt each other, so its callers take turns.
+_shared_model_lock = threading.Lock()
+
+
+def _worker_model():
+    if not hasattr(_worker_state, "model"):
+        _worker_state.model = whisper.load_model(WHISPER_MODEL)
+    return _worker_state.model
+
+
+def _chunk_model():
+    ''' The Whisper worker process when there is one, otherwise this thread's own model '''
+    if registry.is_loaded("whisper"):
+        model = registry.get("whisper")
+        if isinstance(model, Remote_Model):
+            return model
+    return _worker_model()
+
+
+def _transcribe_shared(audio):
+    ''' Transcribe on the registry's Whisper model, one call at a time '''
+    model = registry.get("whisper")
+    with _shared_model_lock:
+        with timed("transcribe"):
+            return model.transcribe(audio)
+
+
+@timed("transcribe")
+def _transcribe_chunk(chunk):
+    result = _chunk_model().transcribe(chunk)
+    return result["text"].strip(), result.get("language")
+
+
+def _get_pool():
+    ''' Fixed-size chunk pool, created on first use and kept so its per-thread models are reused '''
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=TRANSCRIBE_WORKERS, thread_name_prefix="whisper")
+        return _pool
+
+@contextmanager
+def _seekable_input(data):
+    ''' Path ffmpeg can seek in for encoded audio bytes, plus the fds the child must inherit
+
+    MP4/M4A files with the moov atom at the end (typical of phone recordings)
+    cannot be demuxed from a pipe. On Linux the bytes go to an anonymous
+    in-memory file; elsewhere to a temporary file that is removed afterwards.
+    '''
+    if hasattr(os, "memfd_create"):
+        fd = os.memfd_create("agrox-audio")
+        try:
+            with open(fd, "wb", closefd=False) as f:
+                f.write(data)
+            yield f"/proc/self/fd/{fd}", (fd,)
+        finally:
+            os.close(fd)
+        return
+    f = tempfile.NamedTemporaryFile(suffix=".audio", delete=False)
+    try:
+        with f:
+            f.write(data)
+        yield f.name, ()
+    finally:
+        os.remove(f.name)
+
 
 class Audio:
     ''' Class for Handling Audio Inputs '''
-    def __init__(self, file_path, output_path=None):
-        ''' Function for audio conversion to wav 
+    def __init__(self, source):
+        ''' Decode audio into a 16 kHz mono float32 array
         Args:
-            file_path: path to the audio
-            output_path: optional converted audio path
+            source: path to the audio, raw bytes, or a file-like object
         '''
         try:
-            logging.info("Audio File Conversion In Progress")
-            if file_path.endswith(".wav"):
-                self.output_path = file_path
-            else:
-                sound = AudioSegment.from_file(file_path)
-                sound = sound.set_frame_rate(16000).set_channels(1).set_sample_width(2)
-
-                if not output_path:
-                    output_path = os.path.splitext(file_path)[0] + ".wav"
-                    
-                sound.export(output_path, format="wav")
-                self.output_path = output_path
+            logging.info("Audio Decoding In Progress")
+            self.sample_rate = SAMPLE_RATE
+            with timed("decode"):
+                self.audio = self.decode(self.read_source(source))
+            # Language Whisper detected in the last transcription, used as a language-ID hint
+            self.language = None
 
         except Exception as e:
-            logging.exception(f"An Error Occurred During Audio File Conversion: {e}")
+            logging.exception(f"An Error Occurred During Audio Decoding: {e}")
             raise e
 
+    @staticmethod
+    def read_source(source):
+        ''' Return a file path unchanged, or the encoded audio bytes of a bytes or file-like source '''
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return bytes(source)
+        if hasattr(source, "read"):
+            return source.read()
+        if isinstance(source, (str, os.PathLike)):
+            if not os.path.exists(source):
+                raise FileNotFoundError(source)
+            return os.fspath(source)
+        raise ValueError("Audio source must be a file path, bytes or a file-like object")
+
+    @staticmethod
+    def decode(data, sample_rate=SAMPLE_RATE):
+        ''' Decode any ffmpeg-readable audio to mono float32 samples in [-1, 1]
+        Args:
+            data: encoded audio bytes, or a path ffmpeg reads directly
+            sample_rate: target sample rate
+        Returns:
+            np.ndarray: float32 samples
+        '''
+        def run(path, pass_fds=()):
+            cmd = [
+                "ffmpeg", "-nostdin", "-threads", "0",
+                "-i", path,
+                "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate),
+                "pipe:1",
+            ]
+            return subprocess.run(cmd, capture_output=True, check=True, pass_fds=pass_fds).stdout
+
+        try:
+            if isinstance(data, str):
+                out = run(data)
+            else:
+                # ffmpeg needs a seekable input for containers such as M4A
+                with _seekable_input(data) as (path, pass_fds):
+                    out = run(path, pass_fds)
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Failed to decode audio: {e.stderr.decode(errors='replace')}") from e
+        return np.frombuffer(out, np.int16).astype(np.float32) / 32768.0
+
+    @property
+    def duration(self):
+        ''' Length of the decoded audio in seconds '''
+        return len(self.audio) / self.sample_rate
+
     def transcribe_audio(self):
-        ''' Audio Conversion to Text 
+        ''' Audio Conversion to Text
         Returns:
             text: converted audio to text
         '''
         try:
             logging.info("Converting Audio in Progress")
-            start = time.time()
-            model = whisper.load_model("tiny")
-            result = model.transcribe(self.output_path)
-            end = time.time()
-            logging.info(f"Conversion Completed, Time Taken {end - start}")")
+            result = _transcribe_shared(self.audio)
+            self.language = result.get("language")
             return result["text"]
 
         except Exception as e:
             logging.exception(f"An Error Occurred During Audio Conversion: {e}")
             raise e
+
+    def split_on_silence(self, frame_ms=30, silence_db=-40, min_silence_ms=400,
+                         min_chunk_seconds=2, max_chunk_seconds=25):
+        ''' Split the decoded audio at pauses using frame energy
+        Args:
+            frame_ms: analysis frame length
+            silence_db: frames quieter than this (dBFS) count as silence
+            min_silence_ms: shortest pause that may end a chunk
+            min_chunk_seconds: chunks are not cut before this length
+            max_chunk_seconds: chunks are force-cut at this length (Whisper's window is 30 s)
+        Returns:
+            list: float32 sample arrays, in order
+        '''
+        frame = int(self.sample_rate * frame_ms / 1000)
+        n_frames = len(self.audio) // frame
+        if n_frames == 0:
+            return [self.audio] if len(self.audio) else []
+
+        frames = self.audio[:n_frames * frame].reshape(n_frames, frame)
+        rms = np.sqrt(np.mean(frames ** 2, axis=1)) + 1e-10
+        silent = 20 * np.log10(rms) < silence_db
+
+        min_silence = max(1, min_silence_ms // frame_ms)
+        min_chunk = int(min_chunk_seconds * 1000 / frame_ms)
+        max_chunk = int(max_chunk_seconds * 1000 / frame_ms)
+
+        cuts, start, run = [], 0, 0
+        for i in range(n_frames):
+            run = run + 1 if silent[i] else 0
+            length = i + 1 - start
+            if run >= min_silence and length >= min_chunk and (i + 1 == n_frames or not silent[i + 1]):
+                # Cut in the middle of the pause
+                cut = i + 1 - run // 2
+                cuts.append(cut)
+                start, run = cut, 0
+            elif length >= max_chunk:
+                cuts.append(i + 1)
+                start, run = i + 1, 0
+
+        bounds = [0] + [c * frame for c in cuts] + [len(self.audio)]
+        chunks = [self.audio[a:b] for a, b in zip(bounds, bounds[1:]) if b > a]
+        # Drop chunks that are silence end to end
+        return [c for c in chunks if 20 * np.log10(np.sqrt(np.mean(c ** 2)) + 1e-10) >= silence_db]
+
+    def transcribe_stream(self, workers=1, **split_kwargs):
+        ''' Transcribe chunk by chunk, yielding text as soon as each chunk is done
+        Args:
+            workers: chunks of this request transcribed in parallel, capped at AGROX_TRANSCRIBE_WORKERS
+            split_kwargs: passed to split_on_silence
+        Yields:
+            str: transcript of the next chunk, in order
+        '''
+        try:
+            logging.info("Streaming Audio Conversion in Progress")
+            chunks = self.split_on_silence(**split_kwargs)
+            logging.info(f"Audio Split Into {len(chunks)} Chunks")
+            self.language = None
+
+            if workers <= 1:
+                for chunk in chunks:
+                    result = _transcribe_shared(chunk)
+                    self.language = self.language or result.get("language")
+                    text = result["text"].strip()
+                    if text:
+                        yield text
+            else:
+                pool = _get_pool()
+                workers = min(workers, TRANSCRIBE_WORKERS)
+                # Keep at most `workers` chunks of this request in flight on the shared pool
+                futures = deque(pool.submit(_transcribe_chunk, chunk) for chunk in chunks[:workers])
+                next_chunk = len(futures)
+                try:
+                    while futures:
+                        text, language = futures.popleft().result()
+                        if next_chunk < len(chunks):
+                            futures.append(pool.submit(_transcribe_chunk, chunks[next_chunk]))
+                            next_chunk += 1
+                        self.language = self.language or language
+                        if text:
+                            yield text
+                finally:
+                    for future in futures:
+                        future.cancel()
+
+            logging.info("Streaming Conversion Completed")
+
+        except Exception as e:
+            logging.exception(f"An Error Occurred During Streaming Audio Conversion: {e}")
+            raise e
@@ -0,0 +1,215 @@
+from collections import OrderedDict
+import threading
+import sqlite3
+import logging
+import pickle
+import string
+import time
+import os
+import re
+
+logging.basicConfig(level=logging.INFO)
+
+_PUNCTUATION = re.compile(f"[{re.escape(string.punctuation)}]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def approx_size(value):
+    ''' Approximate memory footprint of a cached value in bytes (its pickled size) '''
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+def normalise_text(text):
+    ''' Cache key form of a text: lower case, no punctuation, single spaces '''
+    text = _PUNCTUATION.sub(" ", text.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class SQLiteStore:
+    ''' Small on-disk key/value table backing an LRUCache
+
+    Values are pickled. WAL mode lets several worker processes share one file.
+    '''
+
+    def __init__(self, db_path, table="cache", max_entries=10000):
+        ''' Open (or create) the store
+        Args:
+            db_path: SQLite file path
+            table: table name, so several caches can share one file
+            max_entries: rows kept; the oldest are pruned beyond this
+        '''
+        if not re.fullmatch(r"\w+", table):
+            raise ValueError(f"Invalid table name: {table}")
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.table = table
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
+        self.conn.commit()
+
+    def get(self, key):
+        ''' Returns (value, created_at) or None '''
+        with self._lock:
+            row = self.conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(row[0]), row[1]
+
+    def set(self, key, value, created_at):
+        with self._lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at) VALUES (?, ?, ?)",
+                (key, pickle.dumps(value), created_at)
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._prune()
+            self.conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self.conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute(f"DELETE FROM {self.table}")
+            self.conn.commit()
+
+    def _prune(self):
+        self.conn.execute(f'''
+            DELETE FROM {self.table} WHERE key IN (
+                SELECT key FROM {self.table} ORDER BY created_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,))
+
+    def close(self):
+        self.conn.close()
+
+
+class LRUCache:
+    ''' Thread-safe LRU cache with optional TTL and optional SQLite persistence
+
+    Lookups that miss in memory fall through to the store (when given), so
+    entries survive restarts and are shared by processes using the same file.
+    '''
+
+    def __init__(self, maxsize=1024, ttl=None, store=None, sizeof=approx_size):
+        ''' Initialize cache
+        Args:
+            maxsize: entries kept in memory
+            ttl: seconds an entry stays valid, None for no expiry
+            store: optional SQLiteStore for persistence
+            sizeof: function giving a value's size in bytes for the stats
+        '''
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.store = store
+        self.sizeof = sizeof
+        self._data = OrderedDict()  # key -> (value, created_at)
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._stats = {"hits": 0, "misses": 0, "store_hits": 0, "evictions": 0, "expirations": 0}
+
+    def _expired(self, created_at):
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def get(self, key, default=None):
+        ''' Return the cached value, or default on a miss '''
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if not self._expired(entry[1]):
+                    self._data.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[0]
+                self._remove(key)
+                self._stats["expirations"] += 1
+
+        if self.store is not None:
+            entry = self.store.get(key)
+            if entry is not None and not self._expired(entry[1]):
+                with self._lock:
+                    self._insert(key, entry)
+                    self._stats["hits"] += 1
+                    self._stats["store_hits"] += 1
+                return entry[0]
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return default
+
+    def set(self, key, value):
+        ''' Store a value, evicting the least recently used entry when full '''
+        entry = (value, time.time())
+        with self._lock:
+            self._insert(key, entry)
+        if self.store is not None:
+            self.store.set(key, value, entry[1])
+
+    def _insert(self, key, entry):
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = entry
+        self._sizes[key] = self.sizeof(entry[0])
+        self._bytes += self._sizes[key]
+        while len(self._data) > self.maxsize:
+            self._remove(next(iter(self._data)))
+            self._stats["evictions"] += 1
+
+    def _remove(self, key):
+        del self._data[key]
+        self._bytes -= self._sizes.pop(key, 0)
+
+    def get_or_set(self, key, compute):
+        ''' Return the cached value, computing and caching it on a miss '''
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and not self._expired(entry[1])
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._bytes = 0
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self):
+        ''' Hit/miss counters and hit rate '''
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "bytes": self._bytes,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+            }
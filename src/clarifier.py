@@ -1,7 +1,13 @@
-from llama_cpp import Llama
+from llama_cpp import Llama, LlamaGrammar
+from src.prefix_cache import LlamaPrefixCache
+from src.fast_router import FastRouter, keyword_route
+from src.embeddings import embed_query
+from src.cache import LRUCache, SQLiteStore, normalise_text
+from src.gazetteer import Gazetteer
+from src.metrics import timed
 import json
+import os
 import re
-import hashlib
 import logging
 from typing import Dict, Any, Optional
 
@@ -9,8 +15,84 @@ from typing import Dict, Any, Optional
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Fixed preambles of the Router prompts. Their llama.cpp state is saved once
+# and restored per call, so only the user-specific tail is evaluated.
+CLARIFY_PREAMBLE = """You are a farming assistant clarifier. Rewrite the query to include all necessary information.
+
+Rules:
+- If no crop mentioned, assume "maize"
+- If no month mentioned, assume "July"
+- If no location mentioned, assume "Onitsha"
+- Keep original intent but make complete
+- Output ONLY the clarified query
+
+Examples:
+Input: "which plant is good to grow in Onitsha south"
+Output: Which plant is good to grow in Onitsha south in July?
+
+Input: "soil pH for tomatoes"
+Output: What is the soil pH requirement for tomatoes in Onitsha in July?
+
+Input: "how to plant maize"
+Output: How to plant maize in Onitsha in July?
+
+"""
+
+ROUTE_PREAMBLE = """You are a farming assistant router. Analyze the query and return JSON response.
+
+DATA SOURCES:
+- RAG: How-to guides, farming procedures, planting steps
+- DATABASE: Soil properties, pH, nutrients, fertilizers, crop suitability for locations
+- BOTH: Needs both farming procedures AND soil/location data
+
+Respond in valid JSON format:
+{
+  "ROUTE": "RAG or DATABASE or BOTH",
+  "REASON": "brief explanation",
+  "CROP": "extracted crop name",
+  "LOCATION": "extracted location",
+  "MONTH": "extracted month"
+}
+
+"""
+
+# Single-pass prompt: clarification and routing in one completion
+CLARIFY_ROUTE_PREAMBLE = """You are a farming assistant. Rewrite the query to include all necessary information, then decide which data source answers it.
+
+Rules:
+- If no crop mentioned, assume "maize"
+- If no month mentioned, assume "July"
+- If no location mentioned, assume "Onitsha"
+- Keep original intent but make complete
+
+DATA SOURCES:
+- RAG: How-to guides, farming procedures, planting steps
+- DATABASE: Soil properties, pH, nutrients, fertilizers, crop suitability for locations
+- BOTH: Needs both farming procedures AND soil/location data
+
+Example:
+Input: "soil pH for tomatoes"
+JSON Response: {"CLARIFIED": "What is the soil pH requirement for tomatoes in Onitsha in July?", "ROUTE": "DATABASE", "REASON": "Asks for a soil property", "CROP": "tomatoes", "LOCATION": "Onitsha", "MONTH": "July"}
+
+"""
+
+# Output schema for the single-pass prompt; llama.cpp compiles it to a GBNF
+# grammar so sampling can only produce a matching JSON object
+CLARIFY_ROUTE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "CLARIFIED": {"type": "string"},
+        "ROUTE": {"type": "string", "enum": ["RAG", "DATABASE", "BOTH"]},
+        "REASON": {"type": "string"},
+        "CROP": {"type": "string"},
+        "LOCATION": {"type": "string"},
+        "MONTH": {"type": "string"}
+    },
+    "required": ["CLARIFIED", "ROUTE", "REASON", "CROP", "LOCATION", "MONTH"]
+}
+
 class Router:
-    def __init__(self):
+    def __init__(self, single_pass: bool = True, fast_router: Optional[FastRouter] = None):
         self.default_crop = "maize"
         self.default_month = "July"
         self.default_location = "Onitsha"  # Major agricultural/commercial center in Southeast Nigeria
@@ -23,20 +105,54 @@ class Router:
             verbose=False
         )
         
-        # Simple in-memory cache
-        self.clarification_cache = {}
-        self.routing_cache = {}
+        # Saved KV state for the fixed prompt preambles
+        self.prefix_cache = LlamaPrefixCache(self.llm)
+        self.prefix_cache.register(CLARIFY_PREAMBLE)
+        self.prefix_cache.register(ROUTE_PREAMBLE)
+        self.prefix_cache.register(CLARIFY_ROUTE_PREAMBLE)
+        
+        # One grammar-constrained call instead of clarify_input + determine_route
+        self.single_pass = single_pass
+        self.route_grammar = LlamaGrammar.from_json_schema(json.dumps(CLARIFY_ROUTE_SCHEMA), verbose=False)
+        
+        # Keyword/embedding tier that answers obvious queries without the LLM
+        self.fast_router = fast_router or FastRouter(
+            embed_query,
+            threshold=float(os.getenv("AGROX_ROUTER_THRESHOLD", 0.8)),
+            log_path=os.getenv("AGROX_ROUTER_DECISION_LOG")
+        )
+        
+        # Crop/location/month names from the soil DB, matched without the LLM
+        self.gazetteer = Gazetteer.from_soil_db()
         
-    def ask_llm(self, prompt: str, max_tokens: int = 150, temperature: float = 0.3) -> str:
+        # Bounded LRU/TTL caches on normalised input; AGROX_ROUTER_CACHE_DB shares them across workers
+        cache_size = int(os.getenv("AGROX_ROUTER_CACHE_SIZE", 4096))
+        cache_ttl = float(os.getenv("AGROX_ROUTER_CACHE_TTL", 7 * 24 * 3600))
+        cache_db = os.getenv("AGROX_ROUTER_CACHE_DB")
+        self.clarification_cache = LRUCache(
+            maxsize=cache_size, ttl=cache_ttl,
+            store=SQLiteStore(cache_db, table="clarifications") if cache_db else None
+        )
+        self.routing_cache = LRUCache(
+            maxsize=cache_size, ttl=cache_ttl,
+            store=SQLiteStore(cache_db, table="routes") if cache_db else None
+        )
+        
+    def ask_llm(self, prompt: str, max_tokens: int = 150, temperature: float = 0.3,
+                grammar: Optional[LlamaGrammar] = None) -> str:
         """
         Wrapper for LLM calls with proper error handling and logging
         """
         try:
+            self.prefix_cache.prepare(prompt)
+            # A grammar already bounds the output; stop strings could cut the JSON short
+            stop = ["</s>"] if grammar else ["</s>", "\n\n", "Input:", "Original:"]
             response = self.llm.create_completion(
                 prompt=prompt,
                 max_tokens=max_tokens,
                 temperature=temperature,
-                stop=["</s>", "\n\n", "Input:", "Original:"],
+                stop=stop,
+                grammar=grammar,
                 echo=False
             )
             
@@ -48,10 +164,33 @@ class Router:
             logger.error(f"LLM call failed: {str(e)}")
             return ""
     
+    def ask_llm_stream(self, prompt: str, max_tokens: int = 150, temperature: float = 0.3):
+        """
+        Streaming variant of ask_llm, yielding text pieces as llama.cpp produces them
+        """
+        try:
+            self.prefix_cache.prepare(prompt)
+            for part in self.llm.create_completion(
+                prompt=prompt,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stop=["</s>", "\n\n", "Input:", "Original:"],
+                echo=False,
+                stream=True
+            ):
+                text = part["choices"][0]["text"]
+                if text:
+                    yield text
+
+        except Exception as e:
+            logger.error(f"LLM stream failed: {str(e)}")
+            return
+    
     def get_cache_key(self, text: str) -> str:
-        """Generate cache key from input text"""
-        return hashlib.md5(text.encode()).hexdigest()[:16]
+        """Generate cache key from input text (case, whitespace and punctuation insensitive)"""
+        return normalise_text(text)
     
+    @timed("route")
     def clarify_and_route(self, user_input: str) -> Dict[str, Any]:
         """
         Clarifies user input and determines routing strategy with caching
@@ -59,11 +198,32 @@ class Router:
         cache_key = self.get_cache_key(user_input)
         
         # Check cache first
-        if cache_key in self.routing_cache:
+        cached = self.routing_cache.get(cache_key)
+        if cached is not None:
             logger.info(f"Cache hit for input: {user_input[:50]}...")
-            return self.routing_cache[cache_key]
+            return {**cached, "original_input": user_input}
         
         try:
+            decision = self.fast_router.route(user_input)
+            if decision:
+                result = {
+                    "original_input": user_input,
+                    "clarified_query": user_input,
+                    "route_type": decision["route_type"],
+                    "extracted_info": self.extract_entities(user_input),
+                    "reasoning": f"Fast path ({decision['confidence']:.2f}): {decision['reasoning']}"
+                }
+                self.routing_cache.set(cache_key, result)
+                return result
+            
+            if self.single_pass:
+                result = self.clarify_and_route_single(user_input)
+                if result:
+                    result["extracted_info"] = self.extract_entities(user_input, result["extracted_info"])
+                    self.routing_cache.set(cache_key, result)
+                    return result
+                logger.warning("Single-pass routing failed, using two-step clarify and route")
+            
             # Clarify input
             clarified = self.clarify_input(user_input)
             if not clarified:
@@ -77,12 +237,12 @@ class Router:
                 "original_input": user_input,
                 "clarified_query": clarified,
                 "route_type": route_info["route_type"],
-                "extracted_info": route_info["extracted_info"],
+                "extracted_info": self.extract_entities(user_input, route_info["extracted_info"]),
                 "reasoning": route_info["reasoning"]
             }
             
             # Cache the result
-            self.routing_cache[cache_key] = result
+            self.routing_cache.set(cache_key, result)
             
             return result
             
@@ -90,39 +250,56 @@ class Router:
             logger.error(f"Clarify and route failed: {str(e)}")
             return self.create_fallback_response(user_input)
     
+    def extract_entities(self, user_input: str, llm_info: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Crop, location and month from the gazetteer; LLM values (or defaults) only fill what it missed"""
+        found = self.gazetteer.extract(user_input)
+        fallback = llm_info or {
+            "crop": self.default_crop,
+            "location": self.default_location,
+            "month": self.default_month
+        }
+        return {key: found.get(key, fallback[key]) for key in ("crop", "location", "month")}
+    
+    def clarify_and_route_single(self, user_input: str) -> Optional[Dict[str, Any]]:
+        """Clarify and route in one grammar-constrained completion; None if it fails"""
+        prompt = CLARIFY_ROUTE_PREAMBLE + f"""Input: "{user_input}"
+JSON Response: """
+        
+        response = self.ask_llm(prompt, max_tokens=250, temperature=0.1, grammar=self.route_grammar)
+        try:
+            data = json.loads(response)
+        except json.JSONDecodeError as e:
+            # Only reachable when max_tokens cut the object short
+            logger.warning(f"Single-pass JSON incomplete: {str(e)}")
+            return None
+        
+        return {
+            "original_input": user_input,
+            "clarified_query": data["CLARIFIED"].strip() or user_input,
+            "route_type": data["ROUTE"],
+            "extracted_info": {
+                "crop": data["CROP"] or self.default_crop,
+                "location": data["LOCATION"] or self.default_location,
+                "month": data["MONTH"] or self.default_month
+            },
+            "reasoning": data["REASON"]
+        }
+    
     def clarify_input(self, user_input: str) -> str:
         """Clarify and standardize user input with caching"""
-        cache_key = self.get_cache_key(f"clarify_{user_input}")
+        cache_key = self.get_cache_key(user_input)
         
-        if cache_key in self.clarification_cache:
-            return self.clarification_cache[cache_key]
+        cached = self.clarification_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        prompt = f"""You are a farming assistant clarifier. Rewrite the query to include all necessary information.
-
-Rules:
-- If no crop mentioned, assume "maize"
-- If no month mentioned, assume "July"
-- If no location mentioned, assume "Onitsha"
-- Keep original intent but make complete
-- Output ONLY the clarified query
-
-Examples:
-Input: "which plant is good to grow in Onitsha south"
-Output: Which plant is good to grow in Onitsha south in July?
-
-Input: "soil pH for tomatoes"
-Output: What is the soil pH requirement for tomatoes in Onitsha in July?
-
-Input: "how to plant maize"
-Output: How to plant maize in Onitsha in July?
-
-Input: "{user_input}"
+        prompt = CLARIFY_PREAMBLE + f"""Input: "{user_input}"
 Output: """
         
         try:
             result = self.ask_llm(prompt, max_tokens=100, temperature=0.2)
             if result:
-                self.clarification_cache[cache_key] = result
+                self.clarification_cache.set(cache_key, result)
                 return result
             else:
                 logger.warning("Empty clarification result")
@@ -135,23 +312,7 @@ Output: """
     def determine_route(self, original_input: str, clarified_input: str) -> Dict[str, Any]:
         """Determine routing with structured JSON output"""
         
-        route_prompt = f"""You are a farming assistant router. Analyze the query and return JSON response.
-
-DATA SOURCES:
-- RAG: How-to guides, farming procedures, planting steps
-- DATABASE: Soil properties, pH, nutrients, fertilizers, crop suitability for locations
-- BOTH: Needs both farming procedures AND soil/location data
-
-Respond in valid JSON format:
-{{
-  "ROUTE": "RAG or DATABASE or BOTH",
-  "REASON": "brief explanation",
-  "CROP": "extracted crop name",
-  "LOCATION": "extracted location",
-  "MONTH": "extracted month"
-}}
-
-Original: "{original_input}"
+        route_prompt = ROUTE_PREAMBLE + f"""Original: "{original_input}"
 Clarified: "{clarified_input}"
 
 JSON Response:"""
@@ -214,24 +375,8 @@ JSON Response:"""
     
     def fallback_routing(self, clarified_input: str) -> Dict[str, Any]:
         """Rule-based fallback routing when LLM fails"""
-        text = clarified_input.lower()
-        
-        # Keyword-based routing
-        if any(phrase in text for phrase in ['how to', 'how do', 'steps to', 'guide to', 'procedure', 'method']):
-            route_type = "RAG"
-            reason = "Contains how-to/procedural keywords"
-        elif any(word in text for word in ['soil', 'ph', 'nutrient', 'fertilizer', 'nitrogen', 'phosphorus', 'potassium']):
-            route_type = "DATABASE"
-            reason = "Contains soil/nutrient keywords"
-        elif any(phrase in text for phrase in ['what to plant', 'which plant', 'good to grow', 'suitable for']):
-            route_type = "DATABASE"
-            reason = "Contains crop suitability keywords"
-        elif 'plant' in text and any(word in text for word in ['prepare', 'land', 'field']):
-            route_type = "RAG"
-            reason = "Contains land preparation keywords"
-        else:
-            route_type = "DATABASE"
-            reason = "Default fallback to database"
+        # Keyword-based routing, shared with the fast-path router
+        route_type, reason = keyword_route(clarified_input) or ("DATABASE", "Default fallback to database")
         
         return {
             "route_type": route_type,
@@ -263,11 +408,13 @@ JSON Response:"""
         self.routing_cache.clear()
         logger.info("Caches cleared")
     
-    def get_cache_stats(self) -> Dict[str, int]:
-        """Get cache statistics"""
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get cache statistics (hits, misses, evictions, bytes per cache)"""
         return {
-            "clarification_cache_size": len(self.clarification_cache),
-            "routing_cache_size": len(self.routing_cache)
+            "clarification_cache": self.clarification_cache.stats(),
+            "routing_cache": self.routing_cache.stats(),
+            "fast_path_accepted": self.fast_router.stats["accepted"],
+            "fast_path_deferred": self.fast_router.stats["deferred"]
         }
 
 # Usage example
@@ -0,0 +1,111 @@
+import logging
+import threading
+import requests
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ConnectivityMonitor:
+    """Background internet check with a cached online/offline state.
+
+    A daemon thread probes the target every `interval` seconds while online.
+    After a failed probe the wait doubles up to `max_backoff`, so an offline
+    device is not woken up every few seconds. Callers read `is_online`, which
+    never blocks.
+    """
+
+    def __init__(self, target="https://1.1.1.1", interval=30.0, timeout=3.0, max_backoff=300.0, probe=None):
+        """
+        Args:
+            target: URL probed with a HEAD request (point it at a local stub in tests)
+            interval: seconds between probes while online
+            timeout: probe timeout in seconds
+            max_backoff: longest wait between probes while offline
+            probe: optional zero-argument callable returning True when online,
+                replacing the HEAD request
+        """
+        self.target = target
+        self.interval = interval
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self._probe_fn = probe
+        self._online = False
+        self._last_change = time.time()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def is_online(self) -> bool:
+        return self._online
+
+    def probe(self) -> bool:
+        """Run one connectivity check and update the cached state."""
+        if self._probe_fn is not None:
+            try:
+                online = bool(self._probe_fn())
+            except Exception:
+                online = False
+        else:
+            try:
+                requests.head(self.target, timeout=self.timeout)
+                online = True
+            except requests.RequestException:
+                online = False
+        self._set_state(online)
+        return online
+
+    def _set_state(self, online):
+        if online != self._online:
+            self._online = online
+            self._last_change = time.time()
+            logger.info(f"Connectivity changed: {'online' if online else 'offline'}")
+
+    def mark_offline(self):
+        """Flip to offline now (e.g. an upstream call failed) and re-probe soon."""
+        self._set_state(False)
+        self._wake.set()
+
+    def mark_online(self):
+        self._set_state(True)
+
+    def start(self):
+        """Probe once synchronously, then keep probing in the background."""
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self.probe()
+        self._thread = threading.Thread(target=self._run, name="connectivity-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 1)
+            self._thread = None
+
+    def _run(self):
+        delay = self.interval if self._online else min(self.interval, self.max_backoff)
+        while not self._stop.is_set():
+            woken = self._wake.wait(delay)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            if woken:
+                # A caller reported a failure: confirm shortly rather than immediately
+                time.sleep(min(1.0, self.interval))
+            if self.probe():
+                delay = self.interval
+            else:
+                delay = min(delay * 2, self.max_backoff) if not woken else self.interval
+
+    def stats(self):
+        return {
+            "online": self._online,
+            "target": self.target,
+            "seconds_since_change": time.time() - self._last_change,
+        }
@@ -0,0 +1,109 @@
+import os
+import mmap
+import logging
+import tempfile
+import numpy as np
+from contextlib import contextmanager
+
+logging.basicConfig(level=logging.INFO)
+
+OFFSETS_FILE = "documents.offsets.npy"
+BLOB_FILE = "documents.blob"
+
+
+@contextmanager
+def replace_atomically(path):
+    ''' Yield a temporary path next to path; once the block succeeds it replaces path in one step
+
+    Readers that already have the old file open or memory-mapped keep seeing
+    the old content, and a crash never leaves a half-written file at path.
+    '''
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        yield tmp
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class DocumentStore:
+    ''' Memory-mapped document store keyed by FAISS id
+
+    Documents live in one contiguous UTF-8 blob; an int64 offsets array holds
+    where document i starts (offsets[i]) and ends (offsets[i + 1]). Both files
+    are memory-mapped, so fetching k documents touches only those k spans.
+    '''
+
+    def __init__(self, directory):
+        ''' Open a store written by DocumentStore.write
+        Args:
+            directory: folder holding the offsets and blob files
+        '''
+        try:
+            self.directory = directory
+            self.offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+            self._file = open(os.path.join(directory, BLOB_FILE), "rb")
+            size = os.fstat(self._file.fileno()).st_size
+            # mmap cannot map an empty file
+            self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+            logging.info(f"Document Store Opened With {len(self)} Documents")
+        except Exception as e:
+            logging.exception(f"An Error Occurred While Opening Document Store: {e}")
+            raise e
+
+    @staticmethod
+    def write(directory, documents):
+        ''' Write documents to disk, the position in the list being the id
+
+        Both files are replaced atomically, so a running server that has the
+        store mapped keeps reading the old files until it reopens the store.
+        Args:
+            directory: output folder
+            documents: sequence of str; None marks an unused id
+        '''
+        os.makedirs(directory, exist_ok=True)
+        offsets = np.zeros(len(documents) + 1, dtype=np.int64)
+        with replace_atomically(os.path.join(directory, BLOB_FILE)) as tmp, open(tmp, "wb") as f:
+            position = 0
+            for i, doc in enumerate(documents):
+                if doc:
+                    data = doc.encode("utf-8")
+                    f.write(data)
+                    position += len(data)
+                offsets[i + 1] = position
+        with replace_atomically(os.path.join(directory, OFFSETS_FILE)) as tmp, open(tmp, "wb") as f:
+            np.save(f, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get(self, doc_id):
+        ''' Return the document for one id, or None if the id is unused '''
+        doc_id = int(doc_id)
+        if doc_id < 0 or doc_id >= len(self):
+            return None
+        start, end = int(self.offsets[doc_id]), int(self.offsets[doc_id + 1])
+        if start == end:
+            return None
+        return self._blob[start:end].decode("utf-8")
+
+    def get_many(self, ids):
+        ''' Return documents for ids in order, skipping unused ids (e.g. FAISS -1) '''
+        docs = []
+        for doc_id in np.asarray(ids).ravel():
+            doc = self.get(doc_id)
+            if doc is not None:
+                docs.append(doc)
+        return docs
+
+    def close(self):
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._file.close()
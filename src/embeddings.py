@@ -0,0 +1,22 @@
+import os
+import numpy as np
+from src.cache import LRUCache, SQLiteStore, normalise_text
+from src.model_registry import registry
+from src.metrics import timed
+
+# Query embeddings, keyed on normalised text; set AGROX_EMBED_CACHE_DB to persist them
+_cache_db = os.getenv("AGROX_EMBED_CACHE_DB")
+query_cache = LRUCache(
+    maxsize=int(os.getenv("AGROX_EMBED_CACHE_SIZE", 2048)),
+    ttl=float(os.getenv("AGROX_EMBED_CACHE_TTL", 7 * 24 * 3600)),
+    store=SQLiteStore(_cache_db, table="query_embeddings") if _cache_db else None,
+)
+
+
+@timed("embed", log=False)
+def embed_query(query: str):
+    """Embed a query, reusing the cached vector for repeated questions."""
+    return query_cache.get_or_set(
+        normalise_text(query),
+        lambda: np.asarray(registry.get("embedder").encode([query])[0], dtype="float32"),
+    )
@@ -0,0 +1,219 @@
+from collections import Counter
+import numpy as np
+import threading
+import argparse
+import logging
+import json
+import time
+
+logging.basicConfig(level=logging.INFO)
+
+ROUTES = ["RAG", "DATABASE", "BOTH"]
+
+# Keyword rules, checked in order: (route, reason, any-of phrases, all-of phrase groups)
+KEYWORD_RULES = [
+    ("RAG", "Contains how-to/procedural keywords",
+     ['how to', 'how do', 'steps to', 'guide to', 'procedure', 'method'], []),
+    ("DATABASE", "Contains soil/nutrient keywords",
+     ['soil', 'ph', 'nutrient', 'fertilizer', 'nitrogen', 'phosphorus', 'potassium'], []),
+    ("DATABASE", "Contains crop suitability keywords",
+     ['what to plant', 'which plant', 'good to grow', 'suitable for'], []),
+    ("RAG", "Contains land preparation keywords",
+     ['plant'], [['prepare', 'land', 'field']]),
+]
+
+# Labelled queries the embedding centroids are built from
+ROUTE_EXAMPLES = {
+    "RAG": [
+        "how to plant maize",
+        "step by step guide to planting cassava",
+        "how to prepare land for farming",
+        "how do I control armyworm on my maize farm",
+        "what is the best way to store harvested yam",
+        "how far apart should I space cassava cuttings",
+        "when and how should I weed my rice field",
+        "how do I treat cassava mosaic disease",
+        "method for making compost from farm waste",
+        "how to raise tomato seedlings in a nursery",
+    ],
+    "DATABASE": [
+        "which plant is good to grow in Onitsha south",
+        "soil pH for tomatoes",
+        "what is the nitrogen content of my soil",
+        "phosphorus levels in Onitsha soil",
+        "fertilizer requirements for maize in August",
+        "what crops are suitable for Nsukka soil",
+        "potassium level of soil in Awka",
+        "is the soil in Owerri acidic",
+        "organic matter content of soil in Abakaliki",
+        "which crop grows best in Enugu in May",
+    ],
+    "BOTH": [
+        "how should I fertilize maize given the soil in Nsukka",
+        "how to plant yam in Awka soil in March",
+        "my soil in Umuahia is acidic, how do I prepare it for cassava",
+        "how do I improve soil nitrogen before planting maize in Onitsha",
+        "guide to growing tomatoes on the soil in Owerri",
+        "how much fertilizer should I apply to rice in Abakaliki soil",
+    ],
+}
+
+
+def keyword_route(text):
+    ''' Route from the keyword rules
+    Args:
+        text: query text
+    Returns:
+        (route, reason), or None when no rule matches
+    '''
+    text = text.lower()
+    for route, reason, any_of, all_of in KEYWORD_RULES:
+        if any(phrase in text for phrase in any_of) and \
+                all(any(phrase in text for phrase in group) for group in all_of):
+            return route, reason
+    return None
+
+
+class FastRouter:
+    ''' Cheap first tier of the Router: keyword rules plus nearest centroid over query embeddings
+
+    Each route's centroid is the mean of its normalised example embeddings.
+    Cosine similarities to the centroids are turned into a probability per route,
+    a matching keyword rule adds weight to its route, and the decision is only
+    returned when the winning probability reaches the confidence threshold.
+    Everything else goes to the LLM router.
+    '''
+
+    def __init__(self, embed_fn, threshold=0.8, examples=None, rule_weight=0.5,
+                 temperature=0.05, log_path=None):
+        ''' Initialize router
+        Args:
+            embed_fn: function mapping a text to a 1-D embedding
+            threshold: minimum confidence to answer without the LLM (see tune_threshold)
+            examples: {route: [queries]} used for the centroids, defaults to ROUTE_EXAMPLES
+            rule_weight: probability mass added to the route of a matching keyword rule
+            temperature: softmax temperature over cosine similarities
+            log_path: JSON lines file every decision is appended to
+        '''
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.examples = examples or ROUTE_EXAMPLES
+        self.rule_weight = rule_weight
+        self.temperature = temperature
+        self.log_path = log_path
+        self.routes = None
+        self.centroids = None
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def _embed(self, text):
+        vector = np.asarray(self.embed_fn(text), dtype="float32")
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _ensure_centroids(self):
+        with self._lock:
+            if self.centroids is not None:
+                return
+            start = time.time()
+            routes, centroids = [], []
+            for route, queries in self.examples.items():
+                centroid = np.mean([self._embed(q) for q in queries], axis=0)
+                centroids.append(centroid / (np.linalg.norm(centroid) or 1.0))
+                routes.append(route)
+            self.routes = routes
+            self.centroids = np.stack(centroids)
+            logging.info(f"Router Centroids Built from {sum(map(len, self.examples.values()))} Examples, Time Taken {time.time() - start}")
+
+    def classify(self, text):
+        ''' Score a query without deciding whether to trust it
+        Returns:
+            dict with route, confidence, reason and per-route probabilities
+        '''
+        self._ensure_centroids()
+        similarities = self.centroids @ self._embed(text)
+        scores = np.exp((similarities - similarities.max()) / self.temperature)
+        probs = scores / scores.sum()
+
+        rule = keyword_route(text)
+        if rule:
+            probs = probs + self.rule_weight * (np.array(self.routes) == rule[0])
+            probs = probs / probs.sum()
+
+        best = int(np.argmax(probs))
+        route = self.routes[best]
+        if rule and rule[0] == route:
+            reason = rule[1]
+        else:
+            reason = f"Closest to {route} examples (similarity {similarities[best]:.2f})"
+        return {
+            "route_type": route,
+            "confidence": float(probs[best]),
+            "reasoning": reason,
+            "probabilities": {r: float(p) for r, p in zip(self.routes, probs)},
+        }
+
+    def route(self, text):
+        ''' Decision for a confident query, None when the LLM should decide '''
+        decision = self.classify(text)
+        decision["accepted"] = decision["confidence"] >= self.threshold
+        self.stats["accepted" if decision["accepted"] else "deferred"] += 1
+        self.log(text, decision)
+        return decision if decision["accepted"] else None
+
+    def log(self, text, decision):
+        ''' Append a decision to the decision log '''
+        logging.info(f"Fast Route {decision['route_type']} (confidence {decision['confidence']:.2f}, "
+                     f"{'accepted' if decision['accepted'] else 'deferred to LLM'})")
+        if not self.log_path:
+            return
+        record = {"time": time.time(), "query": text, **decision}
+        with self._lock:
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+
+    def tune_threshold(self, eval_set, target_accuracy=0.95):
+        ''' Lowest threshold whose accepted queries meet the target accuracy
+        Args:
+            eval_set: iterable of (query, route) pairs
+            target_accuracy: required accuracy on the queries answered without the LLM
+        Returns:
+            dict with threshold, coverage (share of queries accepted) and accuracy
+        '''
+        scored = []
+        for query, route in eval_set:
+            decision = self.classify(query)
+            scored.append((decision["confidence"], decision["route_type"] == route))
+        if not scored:
+            raise ValueError("Evaluation set is empty")
+        scored.sort(key=lambda item: item[0], reverse=True)
+
+        # Accept the k most confident queries; keep the largest k that is accurate enough
+        best = {"threshold": 1.0, "coverage": 0.0, "accuracy": None}
+        correct = 0
+        for k, (confidence, is_correct) in enumerate(scored, start=1):
+            correct += is_correct
+            tied = k < len(scored) and scored[k][0] == confidence
+            if not tied and correct / k >= target_accuracy:
+                best = {"threshold": confidence, "coverage": k / len(scored), "accuracy": correct / k}
+        self.threshold = best["threshold"]
+        logging.info(f"Router Threshold Tuned to {self.threshold:.3f} (coverage {best['coverage']:.2f})")
+        return best
+
+
+def load_eval_set(path):
+    ''' (query, route) pairs from a JSON lines file of {"query": ..., "route": ...} '''
+    with open(path, 'r', encoding='utf-8') as f:
+        return [(row["query"], row["route"]) for row in map(json.loads, filter(str.strip, f))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune the fast router's confidence threshold on a labelled set")
+    parser.add_argument("eval_set", help='JSON lines file of {"query": ..., "route": ...}')
+    parser.add_argument("--target-accuracy", type=float, default=0.95)
+    args = parser.parse_args()
+
+    from src.embeddings import embed_query
+
+    router = FastRouter(embed_query)
+    print(json.dumps(router.tune_threshold(load_eval_set(args.eval_set), args.target_accuracy)))
+    print(f"Set AGROX_ROUTER_THRESHOLD={router.threshold:.3f} to use it")
@@ -0,0 +1,182 @@
+from src.soil_db_handler import SOUTHEAST_DATA, CROPS
+from src.cache import normalise_text
+from functools import lru_cache
+import difflib
+import logging
+import re
+
+logging.basicConfig(level=logging.INFO)
+
+MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December"]
+
+# Month names that are also ordinary English words; matched only when capitalised
+AMBIGUOUS_MONTHS = {"may", "march", "mar"}
+
+# Crop names farmers use that are not spelled as in the soil DB
+CROP_ALIASES = {
+    "corn": "Maize",
+    "palm": "Oil Palm",
+    "palm oil": "Oil Palm",
+    "cocoa yam": "Cocoyam",
+    "sweet potatoes": "Sweet Potato",
+    "vegetable": "Vegetables",
+    "peppers": "Pepper",
+    "tomato": "Tomato",
+    "tomatoes": "Tomato",
+    "okra": "Okra",
+    "groundnut": "Groundnut",
+    "groundnuts": "Groundnut",
+    "beans": "Beans",
+    "cowpea": "Cowpea",
+    "cowpeas": "Cowpea",
+    "melon": "Melon",
+    "egusi": "Melon",
+}
+
+# Everyday farming words that sit close to a crop or place name ("planting" ~ "plantain")
+COMMON_WORDS = {
+    "plant", "plants", "planted", "planter", "planters", "planting", "plantation", "plantations",
+    "price", "prices", "priced", "pricing", "rains", "rainy", "raining", "season", "seasons",
+    "market", "markets", "manure", "mulching", "weeding", "spacing", "storage",
+}
+
+# Inflected verbs and nouns are ordinary words, never misspelt names
+COMMON_SUFFIXES = ("ing", "ed", "tion", "tions")
+
+_LGA_DIRECTION = re.compile(r"\s+(North|South|East|West|Municipal)$")
+
+
+class Gazetteer:
+    ''' Token trie of known crop, location and month names
+
+    Texts are normalised like cache keys (case, punctuation and spacing ignored)
+    and scanned left to right for the longest phrase starting at each token.
+    A token with no exact child in the trie is matched to the closest child by
+    string similarity, so misspellings such as "Onitsa" still resolve. Fuzzy
+    matches must share the first letter, and common words and inflections
+    (COMMON_WORDS, COMMON_SUFFIXES) only ever match exactly.
+    '''
+
+    def __init__(self, fuzzy_cutoff=0.85, min_fuzzy_len=5):
+        ''' Initialize an empty gazetteer
+        Args:
+            fuzzy_cutoff: minimum difflib similarity for a misspelt token to match
+            min_fuzzy_len: shorter tokens must match exactly
+        '''
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.min_fuzzy_len = min_fuzzy_len
+        self.root = {}
+        self.size = 0
+        self._closest = lru_cache(maxsize=4096)(self._closest_uncached)
+
+    def add(self, kind, phrase, canonical=None):
+        ''' Add a phrase
+        Args:
+            kind: entity type, e.g. "crop", "location", "month"
+            phrase: surface form to match
+            canonical: value reported for a match, defaults to the phrase
+        '''
+        tokens = normalise_text(phrase).split()
+        if not tokens:
+            return
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node.setdefault("$", []).append((kind, canonical or phrase))
+        self.size += 1
+        self._closest.cache_clear()
+
+    @classmethod
+    def from_soil_db(cls, **kwargs):
+        ''' Gazetteer of the soil DB's states, LGAs and crops plus month names '''
+        gazetteer = cls(**kwargs)
+        for state, info in SOUTHEAST_DATA.items():
+            gazetteer.add("location", state)
+            gazetteer.add("location", f"{state} State", state)
+            for lga in info["lgas"]:
+                gazetteer.add("location", lga)
+                # "Onitsha North" -> farmers usually just say "Onitsha"
+                town = _LGA_DIRECTION.sub("", lga)
+                if town != lga:
+                    gazetteer.add("location", town)
+        for crop in CROPS:
+            gazetteer.add("crop", crop)
+            gazetteer.add("crop", crop + ("es" if crop.endswith("o") else "s"), crop)
+        for alias, crop in CROP_ALIASES.items():
+            gazetteer.add("crop", alias, crop)
+        for month in MONTHS:
+            gazetteer.add("month", month)
+            if len(month) > 3:
+                gazetteer.add("month", month[:3], month)
+        gazetteer.add("month", "Sept", "September")
+        logging.info(f"Gazetteer Built with {gazetteer.size} Phrases")
+        return gazetteer
+
+    def _node(self, path):
+        node = self.root
+        for token in path:
+            node = node[token]
+        return node
+
+    def _closest_uncached(self, token, path):
+        candidates = [key for key in self._node(path) if key != "$" and key[0] == token[0]]
+        matches = difflib.get_close_matches(token, candidates, n=1, cutoff=self.fuzzy_cutoff)
+        if not matches:
+            return None, 0.0
+        return matches[0], difflib.SequenceMatcher(None, token, matches[0]).ratio()
+
+    def _step(self, path, token):
+        ''' (matched trie token, similarity) for the next token after path, or (None, 0) '''
+        if token in self._node(path):
+            return token, 1.0
+        if len(token) < self.min_fuzzy_len or token in COMMON_WORDS or token.endswith(COMMON_SUFFIXES):
+            return None, 0.0
+        return self._closest(token, path)
+
+    def find(self, text):
+        ''' All non-overlapping matches in a text, longest first at each position
+        Returns:
+            list of dicts with kind, value, text (the matched words) and score
+        '''
+        tokens = normalise_text(text).split()
+        words = set(re.findall(r"\w+", text))
+        matches = []
+        i = 0
+        while i < len(tokens):
+            path, score, best = (), 1.0, None
+            for j in range(i, len(tokens)):
+                key, similarity = self._step(path, tokens[j])
+                if key is None:
+                    break
+                path += (key,)
+                score *= similarity
+                node = self._node(path)
+                if "$" in node:
+                    best = (j + 1, score, node["$"])
+            if best is None:
+                i += 1
+                continue
+            end, score, entries = best
+            surface = " ".join(tokens[i:end])
+            for kind, value in entries:
+                if kind == "month" and surface in AMBIGUOUS_MONTHS and surface.capitalize() not in words:
+                    continue
+                matches.append({"kind": kind, "value": value, "text": surface, "score": score})
+            i = end
+        return matches
+
+    def extract(self, text):
+        ''' Best value per entity kind
+        Returns:
+            dict such as {"crop": "Maize", "location": "Onitsha", "month": "July"};
+            kinds that were not found are absent
+        '''
+        found = {}
+        for match in self.find(text):
+            current = found.get(match["kind"])
+            # Prefer exact over fuzzy matches, then longer (more specific) phrases
+            rank = (match["score"], len(match["text"]))
+            if current is None or rank > current[0]:
+                found[match["kind"]] = (rank, match["value"])
+        return {kind: value for kind, (rank, value) in found.items()}
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import random
+import threading
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Upstream errors worth retrying; anything else (bad request, auth) fails fast
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.InternalServerError,
+)
+
+
+class GeminiClient:
+    """Shared Gemini client with pooled models, a concurrency cap and request coalescing.
+
+    One GenerativeModel per model name is created and reused. Async calls are
+    limited by a semaphore, time out individually and are retried with
+    exponential backoff plus full jitter. Identical prompts in flight at the
+    same time share a single upstream call.
+    """
+
+    def __init__(self, model="gemini-2.5-flash", max_concurrency=8, timeout=30.0,
+                 retries=3, backoff=0.5, max_backoff=8.0):
+        """
+        Args:
+            model: default Gemini model name
+            max_concurrency: max simultaneous upstream requests
+            timeout: seconds allowed per attempt
+            retries: extra attempts after a retryable failure
+            backoff: base delay in seconds for the first retry
+            max_backoff: cap on the delay between retries
+        """
+        self.model = model
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._models = {}
+        self._models_lock = threading.Lock()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight = {}
+        self.stats = {"requests": 0, "coalesced": 0, "upstream_calls": 0, "retries": 0, "failures": 0}
+
+    def _get_model(self, model):
+        with self._models_lock:
+            if model not in self._models:
+                self._models[model] = genai.GenerativeModel(model)
+            return self._models[model]
+
+    def generate_sync(self, prompt, temperature=0.7, model=None):
+        """Blocking generation with the pooled model."""
+        self.stats["upstream_calls"] += 1
+        response = self._get_model(model or self.model).generate_content(
+            prompt,
+            generation_config={"temperature": temperature},
+            request_options={"timeout": self.timeout},
+        )
+        return response.text.strip()
+
+    def stream_sync(self, prompt, temperature=0.7, model=None):
+        """Blocking generation that yields text pieces as Gemini sends them."""
+        self.stats["upstream_calls"] += 1
+        response = self._get_model(model or self.model).generate_content(
+            prompt,
+            generation_config={"temperature": temperature},
+            request_options={"timeout": self.timeout},
+            stream=True,
+        )
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. the final finish_reason chunk)
+                continue
+            if text:
+                yield text
+
+    async def generate(self, prompt, temperature=0.7, model=None):
+        """Async generation; concurrent identical requests are coalesced."""
+        self.stats["requests"] += 1
+        key = (model or self.model, temperature, prompt)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._generate_with_retry(prompt, temperature, key[0]))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+        # Shield so one caller disconnecting does not cancel the shared call
+        return await asyncio.shield(task)
+
+    async def _generate_with_retry(self, prompt, temperature, model):
+        gemini_model = self._get_model(model)
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    self.stats["upstream_calls"] += 1
+                    response = await asyncio.wait_for(
+                        gemini_model.generate_content_async(prompt, generation_config={"temperature": temperature}),
+                        timeout=self.timeout,
+                    )
+                return response.text.strip()
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.retries:
+                    self.stats["failures"] += 1
+                    raise
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                self.stats["retries"] += 1
+                logger.warning(f"Gemini call failed ({type(e).__name__}), retry {attempt + 1} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+            except Exception:
+                self.stats["failures"] += 1
+                raise
@@ -1,79 +1,245 @@
 import os
+import asyncio
 import logging
-import requests
 from langchain_core.language_models.llms import LLM as BaseLLM
+from langchain_core.outputs import GenerationChunk
 import google.generativeai as genai
 from src.model_loader import Load_Model
+from src.connectivity import ConnectivityMonitor
+from src.gemini_client import GeminiClient
 from pydantic import PrivateAttr
 
 # Logging config
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Fixed start of every RAG prompt; the local model caches its KV state
+RAG_PROMPT_PREFIX = "Use the following context to answer the question:\n\n"
+
 class HybridLLM(BaseLLM):
     """Hybrid LLM: Uses online Gemini if available, falls back to local model"""
     _use_online: bool = PrivateAttr()
     _local_model: any = PrivateAttr()
     _temperature: float = PrivateAttr()
+    _semantic_cache: any = PrivateAttr()
+    _connectivity: any = PrivateAttr()
+    _gemini: any = PrivateAttr()
 
 
-    def __init__(self, use_online=True, local_model_name=r"AgroX\models\gpt2", temperature=0.7):
+    def __init__(self, use_online=True, local_model_name=r"AgroX\models\gpt2", temperature=0.7,
+                 semantic_cache=None, connectivity=None, gemini_client=None):
         super().__init__()
         self._use_online = use_online
         self._temperature = temperature
         self._local_model = None
+        self._semantic_cache = semantic_cache
 
-        # Setup Gemini
+        # Setup Gemini; GEMINI_API_ENDPOINT points the client at another (e.g. local fake) server
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             logger.error("GEMINI_API_KEY not found in environment variables")
             raise EnvironmentError("GEMINI_API_KEY not found.")
-        genai.configure(api_key=api_key)
+        endpoint = os.getenv("GEMINI_API_ENDPOINT")
+        if endpoint:
+            genai.configure(api_key=api_key, transport=os.getenv("GEMINI_TRANSPORT", "rest"),
+                            client_options={"api_endpoint": endpoint})
+        else:
+            genai.configure(api_key=api_key)
+        self._gemini = gemini_client or GeminiClient(
+            max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", 8)),
+            timeout=float(os.getenv("GEMINI_TIMEOUT", 30)),
+        )
+
+        self._connectivity = connectivity
+        if self._connectivity is None and use_online:
+            self._connectivity = ConnectivityMonitor(
+                target=os.getenv("AGROX_CONNECTIVITY_URL", "https://1.1.1.1"),
+                interval=float(os.getenv("AGROX_CONNECTIVITY_INTERVAL", 30)),
+            ).start()
 
         # Load local model
         try:
             self._local_model = Load_Model(local_model_name)
+            self._local_model.register_prefix(RAG_PROMPT_PREFIX)
             logger.info(f"Local model '{local_model_name}' loaded successfully.")
         except Exception as e:
             logger.exception("Failed to load local model.")
             if not self._use_online:
                 raise RuntimeError("Offline mode selected, but local model failed to load.") from e
 
-    def _call(self, prompt, stop=None, run_manager=None):
-        """Main call method with routing logic."""
+    def _call(self, prompt, stop=None, run_manager=None, question=None, context_ids=None, route=None, **kwargs):
+        """Main call method with routing logic.
+
+        question, context_ids and route are optional and key the semantic cache:
+        an answer is reused for a similar question with the same context.
+        """
+        route = route or ("local" if self._should_use_local(prompt) else "auto")
+        cache_text = question or prompt
+        if self._semantic_cache is not None:
+            cached = self._semantic_cache.lookup(cache_text, context_ids, route)
+            if cached is not None:
+                return cached
+
+        response, backend = self._generate_uncached(prompt)
+
+        if self._semantic_cache is not None and self._cacheable(route, backend):
+            self._semantic_cache.store(cache_text, response, context_ids, route)
+        return response
+
+    def _generate_uncached(self, prompt):
+        """Route the prompt to the local model or Gemini.
+
+        Returns (answer, backend) where backend ("local" or "gemini") is the model that answered.
+        """
         try:
             if self._should_use_local(prompt):
                 logger.info("Using local model for generation.")
-                return self._local_model.generate_response(prompt)
+                return self._local_model.generate_response(prompt), "local"
             elif self._use_online and self._is_online():
                 logger.info("Using Gemini API for generation.")
-                return self._call_gemini(prompt)
+                try:
+                    return self._call_gemini(prompt), "gemini"
+                except Exception:
+                    self._connectivity.mark_offline()
+                    if not self._local_model:
+                        raise
+                    logger.warning("Gemini call failed, falling back to local model.")
+                    return self._local_model.generate_response(prompt), "local"
             elif self._local_model:
                 logger.warning("Falling back to local model due to no internet.")
-                return self._local_model.generate_response(prompt)
+                return self._local_model.generate_response(prompt), "local"
             else:
                 raise RuntimeError("No model available for inference.")
         except Exception as e:
             logger.exception("LLM generation failed.")
             raise e
 
+    async def _acall(self, prompt, stop=None, run_manager=None, question=None, context_ids=None, route=None, **kwargs):
+        """Async call: Gemini requests go through the pooled client, local generation runs in a thread."""
+        route = route or ("local" if self._should_use_local(prompt) else "auto")
+        cache_text = question or prompt
+        if self._semantic_cache is not None:
+            cached = await asyncio.to_thread(self._semantic_cache.lookup, cache_text, context_ids, route)
+            if cached is not None:
+                return cached
+
+        response, backend = await self._agenerate_uncached(prompt)
+
+        if self._semantic_cache is not None and self._cacheable(route, backend):
+            await asyncio.to_thread(self._semantic_cache.store, cache_text, response, context_ids, route)
+        return response
+
+    async def _agenerate_uncached(self, prompt):
+        """Async counterpart of _generate_uncached."""
+        try:
+            if self._should_use_local(prompt):
+                logger.info("Using local model for generation.")
+                return await asyncio.to_thread(self._local_model.generate_response, prompt), "local"
+            elif self._use_online and self._is_online():
+                logger.info("Using Gemini API for generation.")
+                try:
+                    return await self._gemini.generate(prompt, temperature=self._temperature), "gemini"
+                except Exception:
+                    logger.exception("Gemini API call failed.")
+                    self._connectivity.mark_offline()
+                    if not self._local_model:
+                        raise
+                    logger.warning("Gemini call failed, falling back to local model.")
+                    return await asyncio.to_thread(self._local_model.generate_response, prompt), "local"
+            elif self._local_model:
+                logger.warning("Falling back to local model due to no internet.")
+                return await asyncio.to_thread(self._local_model.generate_response, prompt), "local"
+            else:
+                raise RuntimeError("No model available for inference.")
+        except Exception as e:
+            logger.exception("LLM generation failed.")
+            raise e
+
+    def _stream(self, prompt, stop=None, run_manager=None, question=None, context_ids=None, route=None, **kwargs):
+        """Stream tokens from the local model or Gemini; cache hits arrive as one chunk."""
+        route = route or ("local" if self._should_use_local(prompt) else "auto")
+        cache_text = question or prompt
+        if self._semantic_cache is not None:
+            cached = self._semantic_cache.lookup(cache_text, context_ids, route)
+            if cached is not None:
+                yield self._emit(cached, run_manager)
+                return
+
+        pieces, used = [], {}
+        for text in self._stream_uncached(prompt, used):
+            pieces.append(text)
+            yield self._emit(text, run_manager)
+
+        if self._semantic_cache is not None and pieces and self._cacheable(route, used.get("backend")):
+            self._semantic_cache.store(cache_text, "".join(pieces).strip(), context_ids, route)
+
+    @staticmethod
+    def _emit(text, run_manager):
+        chunk = GenerationChunk(text=text)
+        if run_manager:
+            run_manager.on_llm_new_token(text, chunk=chunk)
+        return chunk
+
+    def _stream_uncached(self, prompt, used):
+        """Route a streaming generation; falls back to local if Gemini fails before any token.
+
+        used["backend"] is set to the model ("local" or "gemini") the tokens came from.
+        """
+        try:
+            if self._should_use_local(prompt):
+                logger.info("Streaming from local model.")
+                used["backend"] = "local"
+                yield from self._local_model.stream_response(prompt)
+            elif self._use_online and self._is_online():
+                logger.info("Streaming from Gemini API.")
+                used["backend"] = "gemini"
+                started = False
+                try:
+                    for text in self._gemini.stream_sync(prompt, temperature=self._temperature):
+                        started = True
+                        yield text
+                except Exception:
+                    self._connectivity.mark_offline()
+                    if started or not self._local_model:
+                        raise
+                    logger.warning("Gemini stream failed, falling back to local model.")
+                    used["backend"] = "local"
+                    yield from self._local_model.stream_response(prompt)
+            elif self._local_model:
+                logger.warning("Falling back to local model due to no internet.")
+                used["backend"] = "local"
+                yield from self._local_model.stream_response(prompt)
+            else:
+                raise RuntimeError("No model available for inference.")
+        except Exception as e:
+            logger.exception("LLM streaming failed.")
+            raise e
+
+    @property
+    def semantic_cache(self):
+        return self._semantic_cache
+
+    @staticmethod
+    def _cacheable(route, backend):
+        """Whether an answer may be cached under its route.
+
+        An "auto" answer from the local model is an offline or Gemini-failure
+        fallback; caching it would keep serving it for "auto" lookups after the
+        device is back online, so only Gemini answers are cached for "auto".
+        """
+        return backend == "gemini" if route == "auto" else backend == route
+
     def _should_use_local(self, prompt: str) -> bool:
         """Simple keyword check to force offline mode."""
         return "<USE_OFFLINE>" in prompt
 
     def _is_online(self) -> bool:
-        """Ping Google DNS for internet check."""
-        try:
-            requests.head("https://1.1.1.1", timeout=3)
-            return True
-        except requests.RequestException:
-            return False
+        """Cached state from the background connectivity monitor."""
+        return self._connectivity is not None and self._connectivity.is_online
 
     def _call_gemini(self, prompt: str, model="gemini-2.5-flash") -> str:
         try:
-            gemini_model = genai.GenerativeModel(model)
-            response = gemini_model.generate_content(prompt, generation_config={"temperature": self.temperature})
-            return response.text.strip()
+            return self._gemini.generate_sync(prompt, temperature=self._temperature, model=model)
         except Exception as e:
             logger.exception("Gemini API call failed.")
             raise e
@@ -1,5 +1,8 @@
 from transformers import AutoImageProcessor, AutoModelForImageClassification
+from concurrent.futures import ThreadPoolExecutor
+from src.metrics import timed
 from PIL import Image
+import asyncio
 import torch
 import logging
 import os
@@ -7,21 +10,34 @@ import time
 
 class Image_Classifier:
     ''' Class for Classifying Plant Images '''
-    
+
     def __init__(self, image_model=r"C:\Users\SPOT\Documents\AgroX\models\image_classifier_model"):
         ''' Initialize image model '''
         try:
             logging.info("Initializing Image Model")
-            start = time.time()
             self.processor = AutoImageProcessor.from_pretrained(image_model)
             self.model = AutoModelForImageClassification.from_pretrained(image_model)
             self.labels = self.model.config.id2label
-            end = time.time()
-            logging.info(f"Image Model initialized successfully,  Time Taken {end - start}")
+            logging.info("Image Model initialized successfully")
         except Exception as e:
             logging.exception(f"An Error Occurred during Image Initialization: {e}")
             raise e
 
+    @staticmethod
+    def load_image(image_input):
+        ''' Convert an image path or PIL.Image to an RGB PIL.Image
+        Args:
+            image_input (str or PIL.Image): Path to image or Image object
+        Returns:
+            PIL.Image: RGB image
+        '''
+        if isinstance(image_input, str) and os.path.exists(image_input):
+            return Image.open(image_input).convert("RGB")
+        elif isinstance(image_input, Image.Image):
+            return image_input.convert("RGB")
+        else:
+            raise ValueError("Input must be a valid file path or PIL.Image.Image")
+
     def classify_plant_image(self, image_input):
         ''' Predict plant disease from image path or PIL.Image
         Args:
@@ -31,25 +47,164 @@ class Image_Classifier:
         '''
         try:
             logging.info("Image Classification in Progress")
-            start = time.time()
-
-            # Accept both path and PIL image
-            if isinstance(image_input, str) and os.path.exists(image_input):
-                image = Image.open(image_input).convert("RGB")
-            elif isinstance(image_input, Image.Image):
-                image = image_input.convert("RGB")
-            else:
-                raise ValueError("Input must be a valid file path or PIL.Image.Image")
-
-            # Run model
-            inputs = self.processor(images=image, return_tensors="pt")
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                predicted_idx = outputs.logits.argmax(dim=1).item()
-            end = time.time()
-            logging.info(f"Image Classified Successfully, Time Taken {end - start}")
-            return self.labels[predicted_idx]
+            with timed("classify"):
+                return self.classify_plant_images([image_input])[0]
 
         except Exception as e:
             logging.exception(f"An Error Occurred during Image Classification: {e}")
             raise e
+
+    def classify_plant_images(self, image_inputs):
+        ''' Predict plant disease for several images in one forward pass
+        Args:
+            image_inputs (list): Image paths or PIL.Image objects
+        Returns:
+            list: Predicted class label for each image, in input order
+        '''
+        images = [self.load_image(image_input) for image_input in image_inputs]
+        inputs = self.processor(images=images, return_tensors="pt")
+        with torch.no_grad():
+            outputs = self.model(**inputs)
+            predicted = outputs.logits.argmax(dim=1).tolist()
+        return [self.labels[idx] for idx in predicted]
+
+
+class Batch_Classifier:
+    ''' Micro-batching queue in front of an Image_Classifier
+
+    Concurrent callers await classify(); requests arriving within the batch
+    window (or until max_batch_size is reached) share one forward pass, which
+    runs on a worker thread so the event loop is never blocked.
+    '''
+
+    def __init__(self, classifier, max_batch_size=8, batch_window_ms=10, executor=None):
+        ''' Initialize batching queue
+        Args:
+            classifier: Image_Classifier used for inference
+            max_batch_size (int): Max number of images per forward pass
+            batch_window_ms (float): How long to wait for more requests after the first one
+            executor: Optional executor for the forward pass, defaults to a single thread
+        '''
+        self.classifier = classifier
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window_ms / 1000
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-batch")
+        self._queue = None
+        self._worker = None
+        self._stats = {
+            "batches": 0,
+            "images": 0,
+            "failed_batches": 0,
+            "total_batch_seconds": 0.0,
+            "max_batch_seconds": 0.0,
+            "total_wait_seconds": 0.0,
+            "last_batch_size": 0,
+        }
+
+    async def start(self):
+        ''' Start the batching loop on the running event loop '''
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+            logging.info(f"Image Batching Started, max batch {self.max_batch_size}, window {self.batch_window * 1000} ms")
+
+    async def stop(self):
+        ''' Stop the batching loop '''
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def classify(self, image_input):
+        ''' Queue an image for classification
+        Args:
+            image_input (str or PIL.Image): Path to image or Image object
+        Returns:
+            str: Predicted class label
+        '''
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image_input, future, time.perf_counter()))
+        return await future
+
+    async def _run(self):
+        ''' Collect requests into batches and dispatch them '''
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._process(batch)
+
+    async def _process(self, batch):
+        ''' Run one batch on the executor and resolve each caller's future '''
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        images = [image_input for image_input, _, _ in batch]
+        try:
+            results = await loop.run_in_executor(self._executor, self._classify_batch, images)
+        except Exception as e:
+            logging.exception(f"An Error Occurred during Batch Classification: {e}")
+            self._stats["failed_batches"] += 1
+            results = [e] * len(batch)
+        elapsed = time.perf_counter() - start
+
+        self._stats["batches"] += 1
+        self._stats["images"] += len(batch)
+        self._stats["last_batch_size"] = len(batch)
+        self._stats["total_batch_seconds"] += elapsed
+        self._stats["max_batch_seconds"] = max(self._stats["max_batch_seconds"], elapsed)
+        self._stats["total_wait_seconds"] += sum(start - queued for _, _, queued in batch)
+
+        for (_, future, _), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    @timed("classify")
+    def _classify_batch(self, image_inputs):
+        ''' Decode images and classify the valid ones together
+        Returns:
+            list: label or exception for each input
+        '''
+        results = [None] * len(image_inputs)
+        images, positions = [], []
+        for i, image_input in enumerate(image_inputs):
+            try:
+                # Decoding needs no model, and a worker-process classifier only exposes its classify methods
+                images.append(Image_Classifier.load_image(image_input))
+                positions.append(i)
+            except Exception as e:
+                results[i] = e
+
+        if images:
+            labels = self.classifier.classify_plant_images(images)
+            for i, label in zip(positions, labels):
+                results[i] = label
+        return results
+
+    def get_stats(self):
+        ''' Batch occupancy and latency counters '''
+        batches = self._stats["batches"]
+        images = self._stats["images"]
+        return {
+            **self._stats,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "avg_batch_size": images / batches if batches else 0.0,
+            "avg_occupancy": images / (batches * self.max_batch_size) if batches else 0.0,
+            "avg_batch_ms": 1000 * self._stats["total_batch_seconds"] / batches if batches else 0.0,
+            "avg_wait_ms": 1000 * self._stats["total_wait_seconds"] / images if images else 0.0,
+        }
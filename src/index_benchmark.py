@@ -0,0 +1,108 @@
+import os
+import json
+import time
+import faiss
+import logging
+import argparse
+import numpy as np
+from src.rag_pipeline import FAISSGenerator, EMBEDDINGS_FILE, MANIFEST_FILE
+
+logging.basicConfig(level=logging.INFO)
+
+# Index settings compared by default; each dict is passed to FAISSGenerator
+DEFAULT_CONFIGS = [
+    {"index_type": "flat"},
+    {"index_type": "ivf_flat", "nprobe": 8},
+    {"index_type": "ivf_flat", "nprobe": 32},
+    {"index_type": "ivf_pq", "nprobe": 16},
+    {"index_type": "ivf_pq", "nprobe": 64},
+    {"index_type": "hnsw", "ef_search": 32},
+    {"index_type": "hnsw", "ef_search": 128},
+]
+
+
+def load_vectors(index_dir):
+    ''' Stored chunk embeddings and their ids, written by FAISSGenerator.build_faiss_index
+    Args:
+        index_dir: folder with the manifest and embeddings
+    Returns:
+        (vectors, ids)
+    '''
+    with open(os.path.join(index_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    ids = np.array(sorted(i for info in manifest["files"].values() for i in info["ids"]), dtype=np.int64)
+    vectors = np.load(os.path.join(index_dir, EMBEDDINGS_FILE), mmap_mode='r')
+    return np.ascontiguousarray(vectors[ids]), ids
+
+
+def make_queries(vectors, n_queries=500, noise=0.05, seed=0):
+    ''' Corpus vectors with small Gaussian noise, so queries sit near but not on the data '''
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)]
+    scale = noise * float(vectors.std())
+    return (picks + rng.normal(0, scale, picks.shape)).astype("float32")
+
+
+def benchmark(vectors, ids, queries, configs=DEFAULT_CONFIGS, k=10):
+    ''' Compare index types against exact search
+    Args:
+        vectors: float32 corpus embeddings
+        ids: id for each vector
+        queries: float32 query embeddings
+        configs: FAISSGenerator keyword arguments, one per index to test
+        k: neighbours retrieved per query
+    Returns:
+        list of result dicts (recall@k, QPS, build time and index size)
+    '''
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+    truth = ids[truth]
+
+    results = []
+    for config in configs:
+        generator = FAISSGenerator(**config)
+        start = time.perf_counter()
+        index = generator.create_index(vectors, ids)
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, found = index.search(queries, k)
+        search_seconds = time.perf_counter() - start
+
+        hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+        results.append({
+            "config": config,
+            f"recall@{k}": hits / (len(queries) * k),
+            "qps": len(queries) / search_seconds if search_seconds else float("inf"),
+            "build_seconds": build_seconds,
+            "index_mb": faiss.serialize_index(index).nbytes / (1024 * 1024),
+        })
+        logging.info(f"Benchmarked {config}")
+    return results
+
+
+def print_results(results, k=10):
+    print(f"{'index':<40}{'recall@' + str(k):>10}{'QPS':>12}{'build s':>10}{'MB':>10}")
+    for r in results:
+        name = ", ".join(f"{key}={value}" for key, value in r["config"].items())
+        print(f"{name:<40}{r[f'recall@{k}']:>10.3f}{r['qps']:>12.0f}{r['build_seconds']:>10.2f}{r['index_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall/QPS/memory benchmark of FAISS index types")
+    parser.add_argument("--index-dir", default=r'C:\Users\SPOT\Documents\AgroX\index\faiss_index')
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--recall-floor", type=float, default=0.9)
+    args = parser.parse_args()
+
+    vectors, ids = load_vectors(args.index_dir)
+    queries = make_queries(vectors, args.queries)
+    results = benchmark(vectors, ids, queries, k=args.k)
+    print_results(results, k=args.k)
+
+    passing = [r for r in results if r[f"recall@{args.k}"] >= args.recall_floor]
+    if passing:
+        best = max(passing, key=lambda r: r["qps"])
+        print(f"\nFastest index meeting recall@{args.k} >= {args.recall_floor}: {best['config']}")
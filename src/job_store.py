@@ -0,0 +1,255 @@
+from src.metrics import trace_id
+import threading
+import sqlite3
+import logging
+import asyncio
+import hashlib
+import pickle
+import json
+import uuid
+import time
+import os
+
+logging.basicConfig(level=logging.INFO)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+def idempotency_key_for(*parts):
+    ''' Content hash of a request's inputs, used when the client sends no Idempotency-Key '''
+    digest = hashlib.sha256()
+    for part in parts:
+        if part is None:
+            part = b""
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class JobStore:
+    ''' SQLite table of background jobs, their inputs and results
+
+    Jobs expire ttl seconds after they were created. An idempotency key maps a
+    retried submission to the job already created for it.
+    '''
+
+    def __init__(self, db_path, ttl=24 * 3600):
+        ''' Open (or create) the store
+        Args:
+            db_path: SQLite file path
+            ttl: seconds a job and its result are kept
+        '''
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=10)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                idempotency_key TEXT UNIQUE,
+                status TEXT NOT NULL,
+                inputs BLOB,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at)")
+        self.conn.commit()
+
+    def create(self, inputs, idempotency_key=None, active_only=False):
+        ''' Create a queued job, or return the live job with the same idempotency key
+        Args:
+            inputs: picklable job inputs
+            idempotency_key: retries with the same key get the same job
+            active_only: only match a queued or running job, e.g. for a key derived from
+                the inputs rather than sent by the client
+        Returns:
+            (job dict, created)
+        '''
+        now = time.time()
+        with self._lock:
+            if idempotency_key:
+                # An expired or failed job must not block a retry with its key
+                self.conn.execute(
+                    "DELETE FROM jobs WHERE idempotency_key = ? AND (expires_at <= ? OR status = ?)",
+                    (idempotency_key, now, FAILED)
+                )
+                if active_only:
+                    # A finished job keeps its result for whoever polls it, but gives up the key
+                    self.conn.execute(
+                        "UPDATE jobs SET idempotency_key = NULL WHERE idempotency_key = ? AND status = ?",
+                        (idempotency_key, DONE)
+                    )
+                row = self.conn.execute("SELECT * FROM jobs WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+                if row is not None:
+                    self.conn.commit()
+                    return self._to_dict(row), False
+            job_id = uuid.uuid4().hex
+            self.conn.execute(
+                "INSERT INTO jobs (id, idempotency_key, status, inputs, created_at, updated_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, idempotency_key, QUEUED, pickle.dumps(inputs), now, now, now + self.ttl)
+            )
+            self.conn.commit()
+        return self.get(job_id), True
+
+    def get(self, job_id):
+        ''' Job status and result, or None if unknown or expired '''
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT * FROM jobs WHERE id = ? AND expires_at > ?", (job_id, time.time())
+            ).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def inputs(self, job_id):
+        with self._lock:
+            row = self.conn.execute("SELECT inputs FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return pickle.loads(row["inputs"]) if row is not None and row["inputs"] is not None else None
+
+    def _update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self.conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+            self.conn.commit()
+
+    def mark_running(self, job_id):
+        self._update(job_id, status=RUNNING)
+
+    def finish(self, job_id, result):
+        # Uploads are dropped once the job is done; only the result is kept
+        self._update(job_id, status=DONE, result=json.dumps(result), inputs=None)
+
+    def fail(self, job_id, error):
+        self._update(job_id, status=FAILED, error=str(error), inputs=None)
+
+    def unfinished(self):
+        ''' Ids of queued or running jobs, oldest first (to requeue after a restart) '''
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND expires_at > ? ORDER BY created_at",
+                (QUEUED, RUNNING, time.time())
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def purge_expired(self):
+        ''' Delete expired jobs, returns how many were removed '''
+        with self._lock:
+            removed = self.conn.execute("DELETE FROM jobs WHERE expires_at <= ?", (time.time(),)).rowcount
+            self.conn.commit()
+        return removed
+
+    def counts(self):
+        ''' Number of live jobs per status '''
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT status, COUNT(*) AS n FROM jobs WHERE expires_at > ? GROUP BY status", (time.time(),)
+            ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    @staticmethod
+    def _to_dict(row):
+        job = {
+            "job_id": row["id"],
+            "status": row["status"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "expires_at": row["expires_at"],
+        }
+        if row["result"] is not None:
+            job["result"] = json.loads(row["result"])
+        if row["error"] is not None:
+            job["error"] = row["error"]
+        return job
+
+    def close(self):
+        self.conn.close()
+
+
+class Job_Queue:
+    ''' Asyncio worker pool draining queued jobs into a handler
+
+    Bursts wait in the queue instead of holding open connections; the store is
+    the source of truth for status, so clients poll it rather than this queue.
+    '''
+
+    def __init__(self, store, handler, workers=2, maxsize=1000, purge_interval=600):
+        ''' Initialize queue
+        Args:
+            store: JobStore
+            handler: async function(inputs) returning a JSON-serialisable result
+            workers: jobs processed concurrently
+            maxsize: queued jobs accepted before submit raises asyncio.QueueFull
+            purge_interval: seconds between expired-job cleanups
+        '''
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.purge_interval = purge_interval
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self._tasks = []
+        self.stats = {"completed": 0, "failed": 0, "purged": 0}
+
+    async def start(self):
+        ''' Start the workers and requeue jobs left unfinished by a previous run '''
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._purge()))
+        overflow = 0
+        for job_id in await asyncio.to_thread(self.store.unfinished):
+            try:
+                self.submit(job_id)
+            except asyncio.QueueFull:
+                # More left over than the queue holds; fail the rest so clients resubmit
+                overflow += 1
+                self.stats["failed"] += 1
+                await asyncio.to_thread(self.store.fail, job_id, "Job queue is full")
+        if overflow:
+            logging.warning(f"{overflow} Unfinished Jobs Did Not Fit The Queue And Were Failed")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job_id):
+        ''' Queue a job created in the store '''
+        self.queue.put_nowait(job_id)
+
+    async def _work(self):
+        while True:
+            job_id = await self.queue.get()
+            # Stage logs of the job carry its id
+            trace_id.set(job_id)
+            try:
+                inputs = await asyncio.to_thread(self.store.inputs, job_id)
+                if inputs is None:
+                    continue  # expired or already finished
+                await asyncio.to_thread(self.store.mark_running, job_id)
+                start = time.time()
+                result = await self.handler(inputs)
+                await asyncio.to_thread(self.store.finish, job_id, result)
+                self.stats["completed"] += 1
+                logging.info(f"Job {job_id} Completed, Time Taken {time.time() - start}")
+            except Exception as e:
+                logging.exception(f"Job {job_id} Failed")
+                self.stats["failed"] += 1
+                await asyncio.to_thread(self.store.fail, job_id, e)
+            finally:
+                self.queue.task_done()
+
+    async def _purge(self):
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                self.stats["purged"] += await asyncio.to_thread(self.store.purge_expired)
+            except Exception:
+                logging.exception("Purging Expired Jobs Failed")
+
+    def get_stats(self):
+        return {**self.stats, "queue_depth": self.queue.qsize(), "workers": self.workers}
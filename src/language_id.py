@@ -0,0 +1,97 @@
+from langdetect import DetectorFactory, detect_langs
+from src.cache import LRUCache
+from src.metrics import timed
+import unicodedata
+import hashlib
+import logging
+import os
+import re
+
+logging.basicConfig(level=logging.INFO)
+
+# langdetect samples randomly; a fixed seed makes it deterministic
+DetectorFactory.seed = 0
+
+# Characters looked at; language is clear long before the end of an answer
+SAMPLE_CHARS = int(os.getenv("AGROX_LANGID_SAMPLE_CHARS", 400))
+
+# Below this heuristic confidence the text goes to langdetect
+MIN_CONFIDENCE = float(os.getenv("AGROX_LANGID_MIN_CONFIDENCE", 0.8))
+
+# Dotted vowels and nasal n are specific to Igbo orthography among our languages
+IGBO_LETTERS = set("ịọụṅỊỌỤṄ")
+
+IGBO_WORDS = {
+    "na", "bụ", "nke", "ka", "ya", "ha", "anyị", "unu", "gị", "ihe", "maka", "nwere",
+    "dị", "mana", "ma", "ga", "kedu", "olee", "gini", "ginị", "ọ", "ahụ",
+    "mụ", "nwa", "ubi", "ji", "akpụ", "ọka", "ala", "mmiri", "oge", "onwa", "ọnwa",
+}
+
+# Igbo words are often typed without the dots, e.g. "bu" for "bụ"
+IGBO_WORDS |= {"".join(c for c in unicodedata.normalize("NFD", w) if not unicodedata.combining(c)) for w in IGBO_WORDS}
+
+ENGLISH_WORDS = {
+    "the", "is", "and", "of", "to", "in", "what", "how", "for", "my", "i", "with",
+    "when", "which", "should", "can", "do", "does", "are", "it", "on", "soil", "plant",
+    "crop", "farm", "grow", "best", "time", "this", "that", "you", "your",
+}
+
+_WORD = re.compile(r"[\w']+")
+
+language_cache = LRUCache(maxsize=int(os.getenv("AGROX_LANGID_CACHE_SIZE", 4096)))
+
+
+def _heuristic(sample):
+    ''' (language, confidence) from Igbo letters and common words, or (None, 0) '''
+    if any(ch in IGBO_LETTERS for ch in sample):
+        return "ig", 0.99
+
+    words = [w.lower() for w in _WORD.findall(sample)]
+    igbo = sum(w in IGBO_WORDS for w in words)
+    english = sum(w in ENGLISH_WORDS for w in words)
+    if igbo + english < 2:
+        return None, 0.0
+    if english >= igbo:
+        return "en", english / (igbo + english)
+    return "ig", igbo / (igbo + english)
+
+
+@timed("detect", log=False)
+def identify(text, hint=None, supported_langs=("ig", "en")):
+    ''' Identify the language of a text
+    Args:
+        text: text to identify
+        hint: language already known for the text, e.g. Whisper's detection for a transcript
+        supported_langs: languages a hint is trusted for
+    Returns:
+        dict with lang, confidence and source ("hint", "cache", "heuristic" or "langdetect")
+    '''
+    sample = text.strip()[:SAMPLE_CHARS]
+
+    # Whisper has no Igbo model and often labels Igbo speech "en", so a hint is
+    # only taken as final when the transcript does not clearly say otherwise
+    if hint in supported_langs:
+        lang, confidence = _heuristic(sample)
+        if lang is not None and lang != hint and confidence >= MIN_CONFIDENCE:
+            return {"lang": lang, "confidence": confidence, "source": "heuristic"}
+        return {"lang": hint, "confidence": 1.0, "source": "hint"}
+
+    key = hashlib.sha1(sample.encode("utf-8")).hexdigest()
+    cached = language_cache.get(key)
+    if cached is not None:
+        return {**cached, "source": "cache"}
+
+    lang, confidence = _heuristic(sample)
+    source = "heuristic"
+    if confidence < MIN_CONFIDENCE:
+        best = detect_langs(sample)[0]
+        lang, confidence, source = best.lang, best.prob, "langdetect"
+
+    result = {"lang": lang, "confidence": confidence, "source": source}
+    language_cache.set(key, result)
+    return result
+
+
+def detect_language(text, hint=None):
+    ''' Language code of a text (see identify) '''
+    return identify(text, hint)["lang"]
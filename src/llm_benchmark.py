@@ -0,0 +1,113 @@
+import sys
+import time
+import json
+import logging
+import argparse
+import multiprocessing as mp
+
+logging.basicConfig(level=logging.INFO)
+
+PROMPTS = [
+    "Use the following context to answer the question:\n\nMaize is planted at the start of the rainy season.\n\nQuestion: When should I plant maize?\nAnswer:",
+    "Use the following context to answer the question:\n\nCassava mosaic disease spreads through whiteflies and infected cuttings.\n\nQuestion: How do I stop cassava mosaic?\nAnswer:",
+    "Use the following context to answer the question:\n\nAcidic soils can be corrected by applying agricultural lime.\n\nQuestion: My soil pH is 4.5, what should I do?\nAnswer:",
+]
+
+
+def peak_mb():
+    ''' Peak resident memory of this process in MB, or None where getrusage is unavailable '''
+    try:
+        import resource
+    except ImportError:
+        # Windows has no resource module
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+
+def resident_mb():
+    ''' Resident memory of this process in MB '''
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        return peak_mb()
+
+
+def _run_backend(model, config, max_new_tokens, queue):
+    ''' Measure one backend in a fresh process so memory numbers do not mix '''
+    try:
+        from src.model_loader import Load_Model
+
+        baseline = resident_mb()
+        start = time.perf_counter()
+        llm = Load_Model(model, **config)
+        load_seconds = time.perf_counter() - start
+        loaded = resident_mb()
+
+        # One untimed call so lazy initialisation is not counted
+        "".join(llm.stream_response(PROMPTS[0], max_new_tokens=4))
+
+        tokens, first_token, seconds = 0, [], 0.0
+        for prompt in PROMPTS:
+            start = time.perf_counter()
+            pieces = []
+            for piece in llm.stream_response(prompt, max_new_tokens=max_new_tokens):
+                if not pieces:
+                    first_token.append(time.perf_counter() - start)
+                pieces.append(piece)
+            seconds += time.perf_counter() - start
+            tokens += llm.count_tokens("".join(pieces))
+
+        queue.put({
+            "config": config,
+            "load_seconds": load_seconds,
+            "model_mb": loaded - baseline,
+            "peak_rss_mb": peak_mb(),
+            "tokens_per_second": tokens / seconds if seconds else 0.0,
+            "first_token_ms": 1000 * sum(first_token) / len(first_token) if first_token else None,
+        })
+    except Exception as e:
+        queue.put({"config": config, "error": str(e)})
+
+
+def benchmark(model, configs, max_new_tokens=64):
+    ''' Tokens/sec and memory for each backend config
+    Args:
+        model: model name or path passed to Load_Model
+        configs: list of Load_Model keyword arguments, e.g. {"backend": "onnx", "quantize": True}
+        max_new_tokens: tokens generated per prompt
+    Returns:
+        list of result dicts
+    '''
+    ctx = mp.get_context("spawn")
+    results = []
+    for config in configs:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run_backend, args=(model, config, max_new_tokens, queue))
+        proc.start()
+        proc.join()
+        result = queue.get() if not queue.empty() else {"config": config, "error": f"exit code {proc.exitcode}"}
+        logging.info(f"Benchmarked {config}")
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tokens/sec and resident memory per local LLM backend")
+    parser.add_argument("--model", default=r"AgroX\models\gpt2")
+    parser.add_argument("--gguf", help="GGUF file for the llama_cpp backend")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    args = parser.parse_args()
+
+    configs = [
+        {"backend": "hf"},
+        {"backend": "onnx", "quantize": False},
+        {"backend": "onnx", "quantize": True},
+    ]
+    if args.gguf:
+        configs.append({"backend": "llama_cpp", "gguf_path": args.gguf})
+
+    for result in benchmark(args.model, configs, args.max_new_tokens):
+        print(json.dumps(result))
@@ -0,0 +1,209 @@
+from contextvars import ContextVar
+from collections import defaultdict
+from functools import wraps
+import threading
+import logging
+import bisect
+import time
+import uuid
+
+logging.basicConfig(level=logging.INFO)
+
+# Trace id of the request being handled; set by the API middleware
+trace_id = ContextVar("trace_id", default=None)
+
+# Seconds; covers a cache lookup up to a long local generation
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+def _labels_text(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    ''' Monotonic counter with optional labels '''
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels_text(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    ''' Cumulative-bucket histogram with optional labels '''
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                    cumulative += count
+                    labels = _labels_text(self.labelnames + ("le",), key + (bound,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _labels_text(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {series[-1]}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge:
+    ''' Value read at scrape time from a callback returning {label values: value} '''
+
+    def __init__(self, name, help, labelnames, collect):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.collect()
+        except Exception:
+            logging.exception(f"Collecting Gauge {self.name} Failed")
+            return lines
+        for key, value in sorted(values.items()):
+            key = key if isinstance(key, tuple) else (key,)
+            lines.append(f"{self.name}{_labels_text(self.labelnames, key)} {float(value)}")
+        return lines
+
+
+class Metrics_Registry:
+    ''' Process-wide collection of metrics, rendered in the Prometheus text format '''
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            # Re-registering (e.g. on reload) keeps the existing series
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name, help, labelnames, collect):
+        with self._lock:
+            self._metrics[name] = Gauge(name, help, labelnames, collect)
+            return self._metrics[name]
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics_Registry()
+
+STAGE_SECONDS = metrics.histogram("agrox_stage_seconds", "Duration of each pipeline stage", ("stage",))
+STAGE_ERRORS = metrics.counter("agrox_stage_errors_total", "Pipeline stages that raised", ("stage",))
+GENERATED_TOKENS = metrics.counter("agrox_generated_tokens_total", "Tokens generated by local models", ("backend",))
+TOKENS_PER_SECOND = metrics.histogram(
+    "agrox_generation_tokens_per_second", "Local generation speed per call", ("backend",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+
+
+class timed:
+    ''' Time a stage into agrox_stage_seconds and log it in one format
+
+    Works as a context manager (with timed("transcribe"): ...) or a decorator
+    (@timed("embed")). The log line carries the request's trace id; a generator
+    closed early by its consumer is not counted as an error.
+    '''
+
+    def __init__(self, stage, log=True):
+        self.stage = stage
+        self.log = log
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(self.seconds, stage=self.stage)
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            STAGE_ERRORS.inc(stage=self.stage)
+        elif self.log:
+            logging.info(f"Stage '{self.stage}' Completed in {self.seconds * 1000:.1f} ms (trace {trace_id.get() or '-'})")
+        return False
+
+    def __call__(self, fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(self.stage, self.log):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+def record_generation(backend, tokens, seconds):
+    ''' Count generated tokens and the call's tokens/sec '''
+    GENERATED_TOKENS.inc(tokens, backend=backend)
+    if seconds > 0 and tokens:
+        TOKENS_PER_SECOND.observe(tokens / seconds, backend=backend)
+
+
+def cache_gauges(caches):
+    ''' Export hit ratio, hits, misses, evictions and bytes for named caches
+    Args:
+        caches: {name: function returning the cache's stats() dict}
+    '''
+    def collect(field):
+        def values():
+            result = {}
+            for name, stats in caches.items():
+                current = stats() or {}
+                if field in current:
+                    result[name] = current[field]
+            return result
+        return values
+
+    metrics.gauge("agrox_cache_hit_ratio", "Cache hit ratio since start", ("cache",), collect("hit_rate"))
+    metrics.gauge("agrox_cache_bytes", "Approximate size of cached values", ("cache",), collect("bytes"))
+    for field in ("hits", "misses", "evictions"):
+        metrics.gauge(f"agrox_cache_{field}", f"Cache {field} since start", ("cache",), collect(field))
@@ -1,28 +1,219 @@
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from transformers import AutoTokenizer, AutoModelForCausalLM, TextIteratorStreamer
+from threading import Thread, Lock
+from src.prefix_cache import LlamaPrefixCache
+from src.metrics import timed, record_generation
 import torch
 import logging
-import time
+import shutil
+import copy
+import json
+import os
 
 logging.basicConfig(level=logging.INFO)
 
+# Per-model backend settings, e.g. {"AgroX\\models\\gpt2": {"backend": "onnx", "quantize": true}}
+BACKEND_CONFIG_PATH = os.getenv("AGROX_LLM_BACKENDS", os.path.join("models", "backends.json"))
+
+
+def load_backend_config(model, path=BACKEND_CONFIG_PATH):
+    ''' Backend settings for a model from the JSON config, defaulting to Hugging Face '''
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        if model in config:
+            return dict(config[model])
+    return {"backend": "hf"}
+
+
+class HFBackend:
+    ''' Eager PyTorch model through transformers '''
+
+    supports_prefix_cache = True
+
+    def __init__(self, model, **options):
+        self.tokenizer = AutoTokenizer.from_pretrained(model)
+        self.model = AutoModelForCausalLM.from_pretrained(model)
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.model = self.model.to(self.device)
+        self._prefixes = []
+        self._prefix_states = {}
+        self._prefix_lock = Lock()
+
+    def register_prefix(self, prefix):
+        if self.supports_prefix_cache and prefix not in self._prefixes:
+            self._prefixes.append(prefix)
+            self._prefixes.sort(key=len, reverse=True)
+
+    def _prepare_inputs(self, prompt):
+        ''' Tokenized prompt plus, when it starts with a registered prefix,
+        a copy of the prefix's past_key_values so generate only runs the tail '''
+        prefix = next((p for p in self._prefixes if prompt.startswith(p)), None)
+        tail = prompt[len(prefix):] if prefix else ""
+        if not prefix or not tail:
+            return dict(self.tokenizer(prompt, return_tensors="pt").to(self.device))
+
+        with self._prefix_lock:
+            if prefix not in self._prefix_states:
+                prefix_ids = self.tokenizer(prefix, return_tensors="pt")["input_ids"].to(self.device)
+                with torch.no_grad():
+                    past = self.model(prefix_ids, use_cache=True).past_key_values
+                self._prefix_states[prefix] = (prefix_ids, past)
+            prefix_ids, past = self._prefix_states[prefix]
+
+        tail_ids = self.tokenizer(tail, return_tensors="pt", add_special_tokens=False)["input_ids"].to(self.device)
+        input_ids = torch.cat([prefix_ids, tail_ids], dim=1)
+        # generate extends the cache in place, so every call gets its own copy
+        return {
+            "input_ids": input_ids,
+            "attention_mask": torch.ones_like(input_ids),
+            "past_key_values": copy.deepcopy(past),
+        }
+
+    def generate(self, prompt, max_new_tokens):
+        ''' (decoded prompt and completion, number of newly generated tokens) '''
+        inputs = self._prepare_inputs(prompt)
+        outputs = self.model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            pad_token_id=self.tokenizer.eos_token_id
+        )
+        new_tokens = outputs.shape[1] - inputs["input_ids"].shape[1]
+        return self.tokenizer.decode(outputs[0], skip_special_tokens=True), new_tokens
+
+    def stream(self, prompt, max_new_tokens):
+        inputs = self._prepare_inputs(prompt)
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        thread = Thread(target=self.model.generate, kwargs=dict(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            pad_token_id=self.tokenizer.eos_token_id,
+            streamer=streamer
+        ), daemon=True)
+        thread.start()
+        for text in streamer:
+            if text:
+                yield text
+        thread.join()
+
+    def count_tokens(self, text):
+        return len(self.tokenizer(text)["input_ids"])
+
+
+class ONNXBackend(HFBackend):
+    ''' ONNX Runtime export of a transformers model, optionally int8 dynamically quantized
+
+    The export and the quantized copy are cached next to the model
+    (<model>-onnx and <model>-onnx-int8) so they are only produced once.
+    '''
+
+    # ORT sessions take past_key_values only as graph inputs of their own shape
+    supports_prefix_cache = False
+
+    def __init__(self, model, quantize=True, onnx_dir=None, **options):
+        from optimum.onnxruntime import ORTModelForCausalLM
+
+        onnx_dir = onnx_dir or f"{model.rstrip(os.sep)}-onnx"
+        if not os.path.exists(onnx_dir):
+            logging.info(f"Exporting {model} to ONNX")
+            exported = ORTModelForCausalLM.from_pretrained(model, export=True)
+            exported.save_pretrained(onnx_dir)
+            AutoTokenizer.from_pretrained(model).save_pretrained(onnx_dir)
+
+        if quantize:
+            onnx_dir = self.quantize(onnx_dir)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(onnx_dir)
+        self.model = ORTModelForCausalLM.from_pretrained(onnx_dir)
+        self.device = torch.device("cpu")
+        self._prefixes = []
+
+    @staticmethod
+    def quantize(onnx_dir):
+        ''' int8 dynamic quantization of every .onnx file in onnx_dir
+        Returns:
+            path of the quantized copy
+        '''
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        quantized_dir = f"{onnx_dir}-int8"
+        if os.path.exists(quantized_dir):
+            return quantized_dir
+        logging.info(f"Quantizing {onnx_dir} to int8")
+        os.makedirs(quantized_dir)
+        for name in os.listdir(onnx_dir):
+            src = os.path.join(onnx_dir, name)
+            if name.endswith(".onnx"):
+                quantize_dynamic(src, os.path.join(quantized_dir, name), weight_type=QuantType.QInt8)
+            elif os.path.isfile(src) and not name.endswith(".onnx_data"):
+                shutil.copy(src, quantized_dir)
+        return quantized_dir
+
+
+class LlamaCppBackend:
+    ''' GGUF model through llama.cpp, the same runtime the Router uses '''
+
+    def __init__(self, model, gguf_path=None, n_ctx=2048, n_threads=4, **options):
+        from llama_cpp import Llama
+
+        self.model = Llama(
+            model_path=gguf_path or model,
+            n_ctx=n_ctx,
+            n_threads=n_threads,
+            verbose=False
+        )
+        self.prefix_cache = LlamaPrefixCache(self.model)
+
+    def register_prefix(self, prefix):
+        self.prefix_cache.register(prefix)
+
+    def generate(self, prompt, max_new_tokens):
+        ''' (echoed prompt and completion, number of newly generated tokens) '''
+        self.prefix_cache.prepare(prompt)
+        response = self.model.create_completion(prompt=prompt, max_tokens=max_new_tokens, echo=True)
+        return response["choices"][0]["text"], response["usage"]["completion_tokens"]
+
+    def stream(self, prompt, max_new_tokens):
+        self.prefix_cache.prepare(prompt)
+        for part in self.model.create_completion(prompt=prompt, max_tokens=max_new_tokens, stream=True):
+            text = part["choices"][0]["text"]
+            if text:
+                yield text
+
+    def count_tokens(self, text):
+        return len(self.model.tokenize(text.encode("utf-8"), add_bos=False))
+
+
+BACKENDS = {
+    "hf": HFBackend,
+    "onnx": ONNXBackend,
+    "llama_cpp": LlamaCppBackend,
+}
+
 
 class Load_Model:
     ''' Class for Loading and Using a Causal Language Model '''
-    
-    def __init__(self, model):
+
+    def __init__(self, model, backend=None, **backend_options):
         ''' Initializes Model
         Args:
-            model: LLM to be used 
+            model: LLM to be used
+            backend: "hf", "onnx" or "llama_cpp"; defaults to the model's entry in the backend config
+            backend_options: backend settings (e.g. quantize, gguf_path, n_threads)
         '''
         try:
-            start = time.time()
             logging.info("Model Selection Initialized")
-            self.tokenizer = AutoTokenizer.from_pretrained(model)
-            self.model = AutoModelForCausalLM.from_pretrained(model)
-            self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-            self.model = self.model.to(self.device)
-            end = time.time()
-            logging.info(f"Model Initialization Complete, Time Taken {end - start}")
+            config = load_backend_config(model)
+            config.update(backend_options)
+            self.backend_name = backend or config.pop("backend", "hf")
+            config.pop("backend", None)
+            if self.backend_name not in BACKENDS:
+                raise ValueError(f"Unknown backend '{self.backend_name}', expected one of {list(BACKENDS)}")
+
+            self.backend = BACKENDS[self.backend_name](model, **config)
+            self.model = self.backend.model
+            self.tokenizer = getattr(self.backend, "tokenizer", None)
+            self.device = getattr(self.backend, "device", torch.device("cpu"))
+            logging.info(f"Model Initialization Complete ({self.backend_name})")
         except Exception as e:
             logging.exception("An Error Occurred during Model Initialization")
             raise e
@@ -37,17 +228,43 @@ class Load_Model:
         '''
         try:
             logging.info("Generating Response In Progress")
-            inputs = self.tokenizer(prompt, return_tensors="pt").to(self.device)
-            outputs = self.model.generate(
-                **inputs,
-                max_new_tokens=max_new_tokens,
-                pad_token_id=self.tokenizer.eos_token_id
-            )
-
-            logging.info("Response Successfully Generated")
-            return self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+            with timed("generate") as timer:
+                # The response echoes the prompt, so the backend reports the new tokens itself
+                response, new_tokens = self.backend.generate(prompt, max_new_tokens)
+            record_generation(self.backend_name, new_tokens, timer.seconds)
+            return response
         except Exception as e:
             logging.exception(f"An Error Occurred During Generating Response: {e}")
             raise e
 
-            
\ No newline at end of file
+    def stream_response(self, prompt, max_new_tokens=100):
+        ''' Generate a response token by token
+        Args:
+            prompt (str): Input prompt.
+            max_new_tokens (int): Max number of tokens to generate.
+        Yields:
+            str: Decoded text pieces as they are generated (prompt excluded).
+        '''
+        try:
+            logging.info("Streaming Response In Progress")
+            pieces = []
+            with timed("generate") as timer:
+                for piece in self.backend.stream(prompt, max_new_tokens):
+                    pieces.append(piece)
+                    yield piece
+            # Streamed pieces exclude the prompt, so re-tokenizing them counts only new tokens
+            record_generation(self.backend_name, self.count_tokens("".join(pieces)), timer.seconds)
+        except Exception as e:
+            logging.exception(f"An Error Occurred During Streaming Response: {e}")
+            raise e
+
+    def register_prefix(self, prefix):
+        ''' Declare a fixed prompt preamble whose KV state should be computed once and reused
+        Args:
+            prefix (str): Text that prompts start with
+        '''
+        self.backend.register_prefix(prefix)
+
+    def count_tokens(self, text):
+        ''' Number of tokens in text under this model's tokenizer '''
+        return self.backend.count_tokens(text)
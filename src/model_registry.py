@@ -0,0 +1,236 @@
+from collections import OrderedDict
+from src.metrics import timed
+import numpy as np
+import threading
+import logging
+import gc
+import os
+import time
+
+logging.basicConfig(level=logging.INFO)
+
+
+class _ModelSpec:
+    ''' Registration details for a model '''
+
+    def __init__(self, loader, size_mb=None, warmup=None, pinned=False):
+        self.loader = loader
+        self.size_mb = size_mb
+        self.warmup = warmup
+        self.pinned = pinned
+
+
+class ModelRegistry:
+    ''' Process-wide, thread-safe registry of lazily loaded models
+
+    Models are loaded on first get(name) and shared by every caller. When a
+    memory budget is set, the least recently used unpinned models are
+    unloaded to make room for new ones.
+    '''
+
+    def __init__(self, memory_budget_mb=None):
+        ''' Initialize registry
+        Args:
+            memory_budget_mb (float): Optional upper bound on resident model memory
+        '''
+        self.memory_budget_mb = memory_budget_mb
+        self._specs = {}
+        self._models = OrderedDict()  # name -> (model, size_mb, last_used)
+        self._lock = threading.RLock()
+        self._load_locks = {}
+
+    def register(self, name, loader, size_mb=None, warmup=None, pinned=False):
+        ''' Register a model loader
+        Args:
+            name (str): Registry key
+            loader (callable): Zero-argument function returning the loaded model
+            size_mb (float): Optional size estimate used when it cannot be measured
+            warmup (callable): Optional hook run once with the freshly loaded model
+            pinned (bool): Pinned models are never unloaded by the memory budget
+        '''
+        with self._lock:
+            self._specs[name] = _ModelSpec(loader, size_mb, warmup, pinned)
+            self._load_locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        ''' Return a loaded model, loading it on first use
+        Args:
+            name (str): Registry key
+        Returns:
+            Loaded model object
+        '''
+        with self._lock:
+            if name in self._models:
+                model, size_mb, _ = self._models[name]
+                self._models[name] = (model, size_mb, time.time())
+                self._models.move_to_end(name)
+                return model
+            if name not in self._specs:
+                raise KeyError(f"Model '{name}' is not registered")
+            load_lock = self._load_locks[name]
+
+        # Load outside the registry lock so other models stay available meanwhile
+        with load_lock:
+            with self._lock:
+                if name in self._models:
+                    return self._models[name][0]
+            return self._load(name)
+
+    def _load(self, name):
+        ''' Load, warm up and store a model '''
+        spec = self._specs[name]
+        try:
+            logging.info(f"Loading Model '{name}'")
+            with timed("load", log=False) as timer:
+                model = spec.loader()
+                if spec.warmup:
+                    spec.warmup(model)
+            size_mb = _estimate_size_mb(model) or spec.size_mb or 0.0
+            logging.info(f"Model '{name}' Loaded ({size_mb:.1f} MB) in {timer.seconds * 1000:.1f} ms")
+        except Exception as e:
+            logging.exception(f"An Error Occurred While Loading Model '{name}': {e}")
+            raise e
+
+        with self._lock:
+            self._enforce_budget(incoming_mb=size_mb, keep=name)
+            self._models[name] = (model, size_mb, time.time())
+        return model
+
+    def _enforce_budget(self, incoming_mb, keep):
+        ''' Unload least recently used models until incoming_mb fits the budget '''
+        if self.memory_budget_mb is None:
+            return
+        for name in list(self._models):
+            if self.resident_mb() + incoming_mb <= self.memory_budget_mb:
+                break
+            if name == keep or self._specs[name].pinned:
+                continue
+            self.unload(name)
+        if self.resident_mb() + incoming_mb > self.memory_budget_mb:
+            logging.warning(f"Model memory budget of {self.memory_budget_mb} MB exceeded by pinned models")
+
+    def warm_up(self, names=None):
+        ''' Load models ahead of the first request
+        Args:
+            names (list): Models to load, defaults to every registered model
+        '''
+        for name in names or list(self._specs):
+            self.get(name)
+
+    def pin(self, name, pinned=True):
+        ''' Exclude a model from (or return it to) budget-driven unloading '''
+        with self._lock:
+            self._specs[name].pinned = pinned
+
+    def unload(self, name):
+        ''' Drop a loaded model so its memory can be reclaimed '''
+        with self._lock:
+            entry = self._models.pop(name, None)
+        if entry is not None:
+            logging.info(f"Unloading Model '{name}' ({entry[1]:.1f} MB)")
+            del entry
+            gc.collect()
+
+    def is_loaded(self, name):
+        with self._lock:
+            return name in self._models
+
+    def resident_mb(self):
+        ''' Estimated memory held by loaded models '''
+        with self._lock:
+            return sum(size_mb for _, size_mb, _ in self._models.values())
+
+    def stats(self):
+        ''' Loaded models, their sizes and idle times '''
+        now = time.time()
+        with self._lock:
+            return {
+                "memory_budget_mb": self.memory_budget_mb,
+                "resident_mb": self.resident_mb(),
+                "registered": sorted(self._specs),
+                "loaded": {
+                    name: {"size_mb": size_mb, "idle_seconds": now - last_used}
+                    for name, (_, size_mb, last_used) in self._models.items()
+                },
+            }
+
+
+def _estimate_size_mb(model, _depth=0):
+    ''' Estimate memory of a torch module, or of a wrapper holding one in .model '''
+    parameters = getattr(model, "parameters", None)
+    if callable(parameters):
+        try:
+            size = sum(p.numel() * p.element_size() for p in parameters())
+            size += sum(b.numel() * b.element_size() for b in model.buffers())
+            return size / (1024 * 1024)
+        except Exception:
+            return None
+    if _depth < 2:
+        for attr in ("model", "_local_model"):
+            inner = getattr(model, attr, None)
+            if inner is not None:
+                return _estimate_size_mb(inner, _depth + 1)
+    return None
+
+
+# Default models, imported lazily so loading one never pays for the others
+WHISPER_MODEL = os.getenv("AGROX_WHISPER_MODEL", "tiny")
+EMBEDDING_MODEL = os.getenv("AGROX_EMBEDDING_MODEL", r"AgroX\models\all-MiniLM-L6-v2")
+
+
+def _load_image_classifier():
+    from src.image_classifier import Image_Classifier
+    return Image_Classifier()
+
+
+def _warmup_image_classifier(model):
+    from PIL import Image
+    model.classify_plant_image(Image.new("RGB", (224, 224)))
+
+
+def _load_whisper():
+    import whisper
+    return whisper.load_model(WHISPER_MODEL)
+
+
+def _warmup_whisper(model):
+    model.transcribe(np.zeros(16000, dtype=np.float32), fp16=False)
+
+
+def _load_embedder():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL)
+
+
+def _warmup_embedder(model):
+    model.encode(["warm up"])
+
+
+def _load_llm():
+    from src.hybrid_llm import HybridLLM
+    from src.semantic_cache import SemanticCache
+    from src.embeddings import embed_query
+    semantic_cache = SemanticCache(
+        embed_query,
+        threshold=float(os.getenv("AGROX_SEMANTIC_CACHE_THRESHOLD", 0.95)),
+        maxsize=int(os.getenv("AGROX_SEMANTIC_CACHE_SIZE", 1000)),
+        ttl=float(os.getenv("AGROX_SEMANTIC_CACHE_TTL", 24 * 3600)),
+    )
+    return HybridLLM(use_online=True, semantic_cache=semantic_cache)
+
+
+def _load_translator(from_code, to_code):
+    def loader():
+        from src.translate_handler import Translation
+        return Translation.load_translation(from_code, to_code)
+    return loader
+
+
+_budget = os.getenv("AGROX_MODEL_MEMORY_MB")
+registry = ModelRegistry(memory_budget_mb=float(_budget) if _budget else None)
+registry.register("image_classifier", _load_image_classifier, warmup=_warmup_image_classifier)
+registry.register("whisper", _load_whisper, warmup=_warmup_whisper)
+registry.register("embedder", _load_embedder, warmup=_warmup_embedder)
+registry.register("llm", _load_llm)
+registry.register("translator_ig_en", _load_translator("ig", "en"), size_mb=100)
+registry.register("translator_en_ig", _load_translator("en", "ig"), size_mb=100)
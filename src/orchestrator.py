@@ -0,0 +1,149 @@
+from concurrent.futures import ThreadPoolExecutor
+from src.audio_handler import Audio
+from src.translate_handler import Translation
+from src.rag_integration import search, merge_hits
+from src.admission import PRIORITY_TEXT
+from contextlib import asynccontextmanager
+from PIL import Image
+import contextvars
+import asyncio
+import logging
+import time
+import io
+
+logging.basicConfig(level=logging.INFO)
+
+
+class Stage_Timings:
+    ''' Wall-clock duration of each stage of one request '''
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, name, seconds):
+        self.stages[name] = seconds
+
+    def header(self):
+        ''' Server-Timing header value, durations in milliseconds '''
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items())
+
+
+class Inference_Orchestrator:
+    ''' Prepares an /infer request with its input branches running concurrently
+
+    The image, audio and text branches run side by side on a bounded thread
+    pool (image classification itself is batched by the Batch_Classifier).
+    Each branch starts its own passage search as soon as its English text is
+    ready, and the per-branch hits are merged into the request's context.
+    '''
+
+    def __init__(self, image_batcher, max_workers=4, top_k=3, admission=None):
+        ''' Initialize orchestrator
+        Args:
+            image_batcher: started Batch_Classifier
+            max_workers: threads shared by all requests for decoding, transcription, translation and search
+            top_k: passages in the merged context
+            admission: optional Admission_Controller gating the classifier and whisper stages
+        '''
+        self.image_batcher = image_batcher
+        self.admission = admission
+        self.top_k = top_k
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="infer")
+
+    async def _timed(self, timings, name, fn, *args):
+        ''' Run fn in the pool and record how long it took '''
+        start = time.perf_counter()
+        # Carry the request's trace id into the pool thread
+        context = contextvars.copy_context()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, context.run, fn, *args)
+        finally:
+            timings.add(name, time.perf_counter() - start)
+
+    @asynccontextmanager
+    async def _admit(self, timings, stage, priority, admission_kwargs):
+        ''' Hold a slot of an admission stage, recording the time spent queued '''
+        if self.admission is None:
+            yield
+            return
+        start = time.perf_counter()
+        async with self.admission[stage].slot(priority, **admission_kwargs):
+            timings.add(f"{stage}_queue", time.perf_counter() - start)
+            yield
+
+    async def _image_branch(self, timings, image_bytes, priority, admission_kwargs):
+        start = time.perf_counter()
+        img = await self._timed(timings, "image_decode", lambda: Image.open(io.BytesIO(image_bytes)))
+        async with self._admit(timings, "classifier", priority, admission_kwargs):
+            label = await self.image_batcher.classify(img)
+        timings.add("image", time.perf_counter() - start)
+        return f"Image shows: {label}. ", label, None
+
+    @staticmethod
+    def _transcribe(audio_bytes):
+        audio_handler = Audio(audio_bytes)
+        raw_text = audio_handler.transcribe_audio()
+        translator = Translation(raw_text, lang_hint=audio_handler.language)
+        if translator.lang == "ig":
+            translated_text = translator.translate()
+            return f"Farmer said (in Igbo): {translated_text}. ", translated_text, translator
+        return f"Farmer said: {raw_text}. ", raw_text, translator
+
+    @staticmethod
+    def _read_text(text):
+        translator = Translation(text)
+        if translator.lang == "ig":
+            translated_text = translator.translate()
+            return f"Farmer typed (in Igbo): {translated_text}. ", translated_text, translator
+        return f"Farmer typed: {text}. ", text, translator
+
+    async def _audio_branch(self, timings, audio_bytes, priority, admission_kwargs):
+        async with self._admit(timings, "whisper", priority, admission_kwargs):
+            return await self._timed(timings, "audio", self._transcribe, audio_bytes)
+
+    async def _branch(self, timings, name, branch):
+        ''' Run a branch, then search passages for its English text right away '''
+        segment, english, translator = await branch
+        hits = await self._timed(timings, f"{name}_search", search, english, self.top_k)
+        return segment, translator, hits
+
+    async def prepare(self, image_bytes=None, audio_bytes=None, text=None, priority=PRIORITY_TEXT, **admission_kwargs):
+        ''' Turn the uploaded inputs into an English prompt and its passages
+
+        Args:
+            priority: admission lane of the request
+            admission_kwargs: passed to Stage_Limiter.acquire (e.g. timeout, bounded)
+
+        Returns:
+            dict with prompt, translator (the last Translation used, so the answer
+            can be translated back), context_ids and timings (Stage_Timings)
+        '''
+        timings = Stage_Timings()
+        start = time.perf_counter()
+
+        # Kept in prompt order: image, then audio, then text
+        branches = []
+        if image_bytes:
+            branches.append(self._branch(timings, "image",
+                                         self._image_branch(timings, image_bytes, priority, admission_kwargs)))
+        if audio_bytes:
+            branches.append(self._branch(timings, "audio",
+                                         self._audio_branch(timings, audio_bytes, priority, admission_kwargs)))
+        if text:
+            branches.append(self._branch(timings, "text", self._timed(timings, "text", self._read_text, text)))
+
+        results = await asyncio.gather(*branches)
+        timings.add("prepare", time.perf_counter() - start)
+
+        translator = None
+        for _, branch_translator, _ in results:
+            translator = branch_translator or translator
+        return {
+            "prompt": "".join(segment for segment, _, _ in results),
+            "translator": translator,
+            "context_ids": merge_hits([hits for _, _, hits in results], self.top_k),
+            "timings": timings,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,65 @@
+from collections import OrderedDict
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LlamaPrefixCache:
+    """Saved llama.cpp states for fixed prompt preambles.
+
+    The first time a prompt starts with a registered prefix, the prefix is
+    evaluated once and the model state saved. Later prompts restore that
+    state; llama.cpp then sees the matching token prefix and only evaluates
+    the variable tail.
+    """
+
+    def __init__(self, llm, max_states=4):
+        """
+        Args:
+            llm: llama_cpp.Llama instance
+            max_states: saved states kept (each holds a copy of the KV cache)
+        """
+        self.llm = llm
+        self.max_states = max_states
+        self._prefixes = []
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "no_prefix": 0}
+
+    def register(self, prefix: str):
+        if prefix not in self._prefixes:
+            self._prefixes.append(prefix)
+            # Longest first, so nested preambles pick the most specific one
+            self._prefixes.sort(key=len, reverse=True)
+
+    def match(self, prompt: str):
+        return next((p for p in self._prefixes if prompt.startswith(p)), None)
+
+    def prepare(self, prompt: str) -> bool:
+        """Restore the state for the prompt's preamble, if it has one.
+
+        Returns:
+            True when a saved state was loaded into the model
+        """
+        prefix = self.match(prompt)
+        if prefix is None:
+            self.stats["no_prefix"] += 1
+            return False
+        with self._lock:
+            state = self._states.get(prefix)
+            if state is None:
+                self.stats["misses"] += 1
+                tokens = self.llm.tokenize(prefix.encode("utf-8"))
+                self.llm.reset()
+                self.llm.eval(tokens)
+                state = self.llm.save_state()
+                self._states[prefix] = state
+                while len(self._states) > self.max_states:
+                    self._states.popitem(last=False)
+                logger.info(f"Cached llama.cpp state for a {len(tokens)}-token preamble")
+            else:
+                self.stats["hits"] += 1
+                self._states.move_to_end(prefix)
+            self.llm.load_state(state)
+        return True
@@ -1,35 +1,81 @@
-import faiss
-import pickle
+import asyncio
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from pathlib import Path
-from src.hybrid_llm import HybridLLM
-
-# Load SentenceTransformer model
-embedding_model = SentenceTransformer(r"AgroX\models\all-MiniLM-L6-v2")  # or 'sentence-transformers/all-MiniLM-L6-v2'
+from src.model_registry import registry
+from src.embeddings import embed_query
+from src.document_store import DocumentStore
+from src.rag_pipeline import FAISSGenerator
+from src.hybrid_llm import RAG_PROMPT_PREFIX
+from src.metrics import timed
 
 # Load FAISS index
 index_path = Path.home() / "Documents" / "AgroX" / "index" / "faiss_index"
-index = faiss.read_index(str(index_path / "index.faiss"))
+index = FAISSGenerator.load_index(str(index_path))  # applies persisted nprobe/efSearch
 
+# Memory-mapped passages, looked up by FAISS id
+documents = DocumentStore(str(index_path))
 
-# Init your local/online LLM
-llm = HybridLLM(use_online=True)  # set to True if you want to call Gemini or similar
+# Embedding model and local/online LLM are shared process-wide through the registry
 
 # Query pipeline
-def retrieve_answer(query: str, top_k=3):
-    # Embed query
-    query_vector = embedding_model.encode([query])
+def search(query: str, top_k=3):
+    """Embed the query and return the ids of its top_k passages, best first."""
+    query_vector = embed_query(query)
+    with timed("search", log=False):
+        D, I = index.search(query_vector.reshape(1, -1), top_k)
+    return [int(i) for i in I[0] if i >= 0]
+
+
+def merge_hits(hit_lists, top_k=3):
+    """Interleave several ranked id lists by rank, dropping duplicates.
+
+    Used when each input of a request (image label, transcript, typed text)
+    was searched separately; ranks are comparable whatever the index metric.
+    """
+    merged = []
+    for rank in range(max(map(len, hit_lists), default=0)):
+        for hits in hit_lists:
+            if rank < len(hits) and hits[rank] not in merged:
+                merged.append(hits[rank])
+    return merged[:top_k]
+
+
+def build_prompt(query: str, top_k=3, context_ids=None):
+    """Fetch the top_k passages for the query and build the RAG prompt.
+
+    Args:
+        context_ids: passage ids already retrieved for this query; skips the search
 
-    # Search FAISS
-    D, I = index.search(np.array(query_vector).astype("float32"), top_k)
+    Returns:
+        (prompt, context_ids)
+    """
+    if context_ids is None:
+        context_ids = search(query, top_k)
 
-    # Retrieve top_k context docs
-    context = I
+    # Retrieve context docs
+    context = "\n\n".join(documents.get_many(context_ids))
 
     # Combine prompt
-    prompt = f"Use the following context to answer the question:\n\n{context}\n\nQuestion: {query}\nAnswer:"
+    prompt = f"{RAG_PROMPT_PREFIX}{context}\n\nQuestion: {query}\nAnswer:"
+    return prompt, list(context_ids)
 
-    # Get response from LLM
-    response = llm(prompt)
+
+def retrieve_answer(query: str, top_k=3, context_ids=None):
+    prompt, context_ids = build_prompt(query, top_k, context_ids)
+
+    # Get response from LLM; question and context ids key its semantic answer cache
+    response = registry.get("llm").invoke(prompt, question=query, context_ids=context_ids)
     return response
+
+
+async def aretrieve_answer(query: str, top_k=3, context_ids=None):
+    """Async retrieve_answer: retrieval runs in a thread, generation is awaited."""
+    prompt, context_ids = await asyncio.to_thread(build_prompt, query, top_k, context_ids)
+    llm = await asyncio.to_thread(registry.get, "llm")
+    return await llm.ainvoke(prompt, question=query, context_ids=context_ids)
+
+
+def stream_answer(query: str, top_k=3, context_ids=None):
+    """Like retrieve_answer, but yields the answer's text pieces as they are generated."""
+    prompt, context_ids = build_prompt(query, top_k, context_ids)
+    yield from registry.get("llm").stream(prompt, question=query, context_ids=context_ids)
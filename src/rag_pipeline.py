@@ -1,15 +1,94 @@
 import os
+import json
 import faiss
 import chardet
+import hashlib
 import logging
-import pickle
+import numpy as np
 from sentence_transformers import SentenceTransformer
+from src.document_store import DocumentStore, replace_atomically
 
 logging.basicConfig(level=logging.INFO)
 
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.faiss"
+EMBEDDINGS_FILE = "embeddings.npy"
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+# 8-bit PQ codebooks need 256 training vectors
+PQ_MIN_TRAIN = 256
+
 class FAISSGenerator:
     ''' Class for FAISS building '''
-    
+
+    def __init__(self,
+                 data_dir=r'C:\Users\SPOT\Documents\AgroX\data',
+                 index_dir=r'C:\Users\SPOT\Documents\AgroX\index\faiss_index',
+                 model_path=r'C:\Users\SPOT\Documents\AgroX\models\models--sentence-transformers--all-MiniLM-L6-v2',
+                 chunk_size=1000,
+                 chunk_overlap=200,
+                 index_type="flat",
+                 nlist=1024,
+                 pq_m=48,
+                 hnsw_m=32,
+                 nprobe=16,
+                 ef_search=64,
+                 train_sample=50000):
+        ''' Initializes index builder
+        Args:
+            data_dir: folder with the .txt documents
+            index_dir: folder for the index, document store and manifest
+            model_path: local SentenceTransformer model (must have been downloaded beforehand)
+            chunk_size: max characters per chunk
+            chunk_overlap: characters shared by consecutive chunks
+            index_type: one of "flat", "ivf_flat", "ivf_pq", "hnsw"
+            nlist: IVF coarse clusters (capped by corpus size)
+            pq_m: IVF-PQ sub-quantizers, must divide the embedding dimension
+            hnsw_m: HNSW graph neighbours per node
+            nprobe: IVF clusters visited per query
+            ef_search: HNSW search breadth
+            train_sample: max vectors used to train IVF indexes
+        '''
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"index_type must be one of {INDEX_TYPES}")
+        self.data_dir = data_dir
+        self.index_dir = index_dir
+        self.model_path = model_path
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.index_type = index_type
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.hnsw_m = hnsw_m
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.train_sample = train_sample
+        self._model = None
+
+    @property
+    def model(self):
+        ''' Embedding model, only loaded when something needs embedding '''
+        if self._model is None:
+            self._model = SentenceTransformer(self.model_path)
+        return self._model
+
+    @staticmethod
+    def read_document(file_path):
+        ''' Read a file once, returning its content hash and decoded text
+        Args:
+            file_path: path to the document
+        Returns:
+            (sha256 hex digest, text)
+        '''
+        with open(file_path, 'rb') as f:
+            raw_data = f.read()
+        digest = hashlib.sha256(raw_data).hexdigest()
+        try:
+            text = raw_data.decode('utf-8')
+        except UnicodeDecodeError:
+            encoding = chardet.detect(raw_data)['encoding'] or 'utf-8'
+            text = raw_data.decode(encoding, errors='replace')
+        return digest, text
+
     def load_document(self, folder_path):
         ''' Function for loading documents for embeddings
         Args:
@@ -19,15 +98,10 @@ class FAISSGenerator:
         try:
             logging.info("Document Ingestion In Progress")
             docs = []
-            for filename in os.listdir(folder_path):
+            for filename in sorted(os.listdir(folder_path)):
                 if filename.endswith('.txt'):
-                    file_path = os.path.join(folder_path, filename)
-                    with open(file_path, 'rb') as f:
-                        raw_data = f.read()
-                        encoding = chardet.detect(raw_data)['encoding'] or 'utf-8'
-                    with open(file_path, 'r', encoding=encoding, errors='replace') as f:
-                        content = f.read()
-                        docs.append(content)
+                    _, content = self.read_document(os.path.join(folder_path, filename))
+                    docs.append(content)
             logging.info("Document Ingestion Completed")
             return docs
 
@@ -35,28 +109,252 @@ class FAISSGenerator:
             logging.exception(f"An Error Occurred During Data Ingestion: {e}")
             raise e
 
-    def build_faiss_index(self):
-        ''' Function to build a FAISS index and save it '''
+    def chunk_text(self, text):
+        ''' Split text into overlapping chunks that end on whitespace
+        Args:
+            text: document text
+        Returns:
+            list of chunk strings
+        '''
+        text = text.strip()
+        chunks, start, n = [], 0, len(text)
+        while start < n:
+            end = min(start + self.chunk_size, n)
+            if end < n:
+                lo = start + self.chunk_size // 2
+                space = max(text.rfind(" ", lo, end), text.rfind("\n", lo, end))
+                if space != -1:
+                    end = space
+            chunk = text[start:end].strip()
+            if chunk:
+                chunks.append(chunk)
+            if end >= n:
+                break
+            next_start = max(end - self.chunk_overlap, start + 1)
+            space = text.find(" ", next_start, end)
+            start = space + 1 if space != -1 else next_start
+        return chunks
+
+    def index_config(self, n=None):
+        ''' Build-time index settings; a change forces the index to be recreated
+        Args:
+            n: number of vectors the index holds; ivf_pq falls back to ivf_flat below PQ_MIN_TRAIN
+        Returns:
+            dict of the settings actually used for n vectors
+        '''
+        index_type = self.index_type
+        if index_type == "ivf_pq" and n is not None and n < PQ_MIN_TRAIN:
+            index_type = "ivf_flat"
+        config = {"type": index_type}
+        if index_type.startswith("ivf"):
+            config["nlist"] = self.nlist
+        if index_type == "ivf_pq":
+            config["pq_m"] = self.pq_m
+        if index_type == "hnsw":
+            config["hnsw_m"] = self.hnsw_m
+        return config
+
+    def search_params(self):
+        ''' Query-time settings persisted with the index '''
+        return {"nprobe": self.nprobe, "ef_search": self.ef_search}
+
+    @staticmethod
+    def apply_search_params(index, params):
+        ''' Set nprobe / efSearch on whichever index type supports them '''
+        space = faiss.ParameterSpace()
+        inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+        if isinstance(inner, faiss.IndexIVF):
+            space.set_index_parameter(index, "nprobe", params["nprobe"])
+        elif isinstance(inner, faiss.IndexHNSW):
+            space.set_index_parameter(index, "efSearch", params["ef_search"])
+
+    @staticmethod
+    def load_index(index_dir):
+        ''' Read a saved index and apply its persisted search settings
+        Args:
+            index_dir: folder written by build_faiss_index
+        Returns:
+            faiss index
+        '''
+        index = faiss.read_index(os.path.join(index_dir, INDEX_FILE))
+        manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                params = json.load(f).get("search")
+            if params:
+                FAISSGenerator.apply_search_params(index, params)
+        return index
+
+    def create_index(self, vectors, ids):
+        ''' Create, train and fill an index of the configured type
+        Args:
+            vectors: float32 array (n, dim)
+            ids: int64 ids for each row
+        Returns:
+            faiss index
+        '''
+        n, dim = vectors.shape
+        index_type = self.index_config(n)["type"]
+        if index_type != self.index_type:
+            logging.warning(f"Only {n} vectors, too few to train PQ codebooks; using ivf_flat")
+
+        if index_type == "flat":
+            index = faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+        elif index_type == "hnsw":
+            index = faiss.IndexIDMap2(faiss.IndexHNSWFlat(dim, self.hnsw_m))
+        else:
+            # Keep at least ~39 training points per cluster
+            nlist = max(1, min(self.nlist, n // 39))
+            quantizer = faiss.IndexFlatL2(dim)
+            if index_type == "ivf_pq":
+                index = faiss.IndexIVFPQ(quantizer, dim, nlist, self.pq_m, 8)
+            else:
+                index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(n, size=min(n, self.train_sample), replace=False)]
+            logging.info(f"Training {index_type} Index On {len(sample)} Vectors, nlist {nlist}")
+            index.train(sample)
+
+        index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+        self.apply_search_params(index, self.search_params())
+        return index
+
+    def _load_manifest(self):
+        ''' Previous build state, or None when a full build is needed '''
+        manifest_path = os.path.join(self.index_dir, MANIFEST_FILE)
+        for required in (MANIFEST_FILE, INDEX_FILE, EMBEDDINGS_FILE):
+            if not os.path.exists(os.path.join(self.index_dir, required)):
+                return None
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if (manifest.get("chunk_size"), manifest.get("chunk_overlap")) != (self.chunk_size, self.chunk_overlap):
+            logging.info("Chunking settings changed, rebuilding index from scratch")
+            return None
+        return manifest
+
+    def _save_manifest(self, manifest):
+        with replace_atomically(os.path.join(self.index_dir, MANIFEST_FILE)) as tmp:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+
+    def _save_index(self, index):
+        with replace_atomically(os.path.join(self.index_dir, INDEX_FILE)) as tmp:
+            faiss.write_index(index, tmp)
+
+    def build_faiss_index(self, rebuild=False):
+        ''' Build or incrementally update the FAISS index and document store
+
+        Only files whose content hash changed since the last build are re-chunked
+        and re-embedded; chunks of deleted or changed files are removed by id.
+        Args:
+            rebuild: ignore the manifest and re-embed everything
+        '''
         try:
-            raw_docs = self.load_document(r'C:\Users\SPOT\Documents\AgroX\data')
             logging.info("Building FAISS in Progress")
+            manifest = None if rebuild else self._load_manifest()
+            if manifest is None:
+                manifest = {"chunk_size": self.chunk_size, "chunk_overlap": self.chunk_overlap,
+                            "next_id": 0, "files": {}}
+                index, old_store, old_vectors = None, None, None
+            else:
+                index = faiss.read_index(os.path.join(self.index_dir, INDEX_FILE))
+                old_store = DocumentStore(self.index_dir)
+                old_vectors = np.load(os.path.join(self.index_dir, EMBEDDINGS_FILE), mmap_mode='r')
+
+            # Work out what changed since the last build
+            current = {}
+            for filename in sorted(os.listdir(self.data_dir)):
+                if filename.endswith('.txt'):
+                    current[filename] = self.read_document(os.path.join(self.data_dir, filename))
+
+            files = manifest["files"]
+            stale = [name for name in files if name not in current or files[name]["hash"] != current[name][0]]
+            fresh = [name for name in current if name not in files or files[name]["hash"] != current[name][0]]
+            # Compared against the config for the current corpus size, so an ivf_flat
+            # fallback is retrained as ivf_pq once the corpus is large enough
+            live = sum(len(files[name]["ids"]) for name in files if name not in stale)
+            same_index = index is not None and manifest.get("index") == self.index_config(live)
+            if not stale and not fresh and same_index:
+                if manifest.get("search") != self.search_params():
+                    self.apply_search_params(index, self.search_params())
+                    self._save_index(index)
+                    manifest["search"] = self.search_params()
+                    self._save_manifest(manifest)
+                    logging.info("FAISS Search Settings Updated")
+                else:
+                    logging.info("FAISS Index Up To Date, Nothing To Rebuild")
+                return
+
+            # Carry over text of unchanged chunks
+            next_id = manifest["next_id"]
+            documents = [None] * next_id
+            if old_store is not None:
+                for info in files.values():
+                    for doc_id in info["ids"]:
+                        documents[doc_id] = old_store.get(doc_id)
+                old_store.close()
+
+            removed_ids = [doc_id for name in stale for doc_id in files.pop(name)["ids"]]
+            for doc_id in removed_ids:
+                documents[doc_id] = None
+
+            new_chunks, new_ids = [], []
+            for name in fresh:
+                digest, text = current[name]
+                chunks = self.chunk_text(text)
+                ids = list(range(next_id, next_id + len(chunks)))
+                next_id += len(chunks)
+                files[name] = {"hash": digest, "ids": ids}
+                new_chunks.extend(chunks)
+                new_ids.extend(ids)
+            documents.extend(new_chunks)
+            live += len(new_chunks)
+            same_index = index is not None and manifest.get("index") == self.index_config(live)
 
-            # Load local model (must have been downloaded beforehand)
-            model = SentenceTransformer(r'C:\Users\SPOT\Documents\AgroX\models\models--sentence-transformers--all-MiniLM-L6-v2')
-            embeddings = model.encode(raw_docs, convert_to_numpy=True, show_progress_bar=True)
+            logging.info(f"{len(fresh)} New/Changed Files, {len(stale)} Removed/Changed Files, "
+                         f"Embedding {len(new_chunks)} Chunks")
+            embeddings = None
+            if new_chunks:
+                embeddings = self.model.encode(new_chunks, convert_to_numpy=True, show_progress_bar=True)
+                embeddings = np.asarray(embeddings, dtype="float32")
+            dim = manifest.get("dim") or (embeddings.shape[1] if embeddings is not None else None)
+            if dim is None:
+                raise ValueError(f"No documents found in {self.data_dir}")
 
-            dim = embeddings.shape[1]
-            index = faiss.IndexFlatL2(dim)
-            index.add(embeddings)
+            # Keep every chunk's embedding so the index can be recreated without re-encoding
+            vectors = np.zeros((next_id, dim), dtype="float32")
+            if old_vectors is not None:
+                vectors[:len(old_vectors)] = old_vectors
+                del old_vectors
+            vectors[removed_ids] = 0
+            if embeddings is not None:
+                vectors[new_ids] = embeddings
 
-            # Save FAISS index
-            faiss.write_index(index, r'C:\Users\SPOT\Documents\AgroX\index\faiss_index.index')
+            # HNSW cannot delete, and a changed index config needs a new index
+            if same_index and not (removed_ids and self.index_type == "hnsw"):
+                if removed_ids:
+                    index.remove_ids(np.array(removed_ids, dtype=np.int64))
+                if embeddings is not None:
+                    index.add_with_ids(embeddings, np.array(new_ids, dtype=np.int64))
+                self.apply_search_params(index, self.search_params())
+            else:
+                logging.info(f"Creating New {self.index_config(live)['type']} Index")
+                live_ids = np.array(sorted(i for info in files.values() for i in info["ids"]), dtype=np.int64)
+                index = self.create_index(vectors[live_ids], live_ids)
 
-            # Save raw_docs for retrieval
-            with open(r'C:\Users\SPOT\Documents\AgroX\index\documents.pkl', 'wb') as f:
-                pickle.dump(raw_docs, f)
+            # Save FAISS index, with the documents it points at alongside it. Every file
+            # is swapped in atomically and the manifest goes last: a crash before it
+            # leaves the old manifest, whose hashes make the next build redo this work.
+            os.makedirs(self.index_dir, exist_ok=True)
+            self._save_index(index)
+            DocumentStore.write(self.index_dir, documents)
+            with replace_atomically(os.path.join(self.index_dir, EMBEDDINGS_FILE)) as tmp, open(tmp, "wb") as f:
+                np.save(f, vectors)
+            manifest.update({"next_id": next_id, "dim": dim,
+                             "index": self.index_config(index.ntotal), "search": self.search_params()})
+            self._save_manifest(manifest)
 
-            logging.info("FAISS Saved Successfully")
+            logging.info(f"FAISS Saved Successfully, {index.ntotal} Chunks Indexed")
 
         except Exception as e:
             logging.exception(f"An Error Occurred During FAISS Building: {e}")
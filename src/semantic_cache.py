@@ -0,0 +1,116 @@
+from collections import OrderedDict, defaultdict
+import numpy as np
+import threading
+import logging
+import faiss
+import time
+
+logging.basicConfig(level=logging.INFO)
+
+
+class SemanticCache:
+    ''' Cache of LLM answers looked up by question similarity
+
+    Questions are embedded and kept in an inner-product FAISS index over
+    L2-normalised vectors, so scores are cosine similarities. A cached answer
+    is reused only if the question is similar enough, the retrieved context
+    ids are the same and it was produced for the same route.
+    '''
+
+    def __init__(self, embed_fn, threshold=0.95, maxsize=1000, ttl=24 * 3600, candidates=5):
+        ''' Initialize cache
+        Args:
+            embed_fn: function mapping a text to a 1-D embedding
+            threshold: minimum cosine similarity for a hit
+            maxsize: answers kept; least recently used are evicted
+            ttl: seconds an answer stays valid
+            candidates: nearest questions checked per lookup
+        '''
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.candidates = candidates
+        self.index = None
+        self._entries = OrderedDict()  # id -> entry dict
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._route_stats = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._evictions = 0
+
+    def _embed(self, text):
+        vector = np.asarray(self.embed_fn(text), dtype="float32").reshape(1, -1).copy()
+        faiss.normalize_L2(vector)
+        return vector
+
+    def lookup(self, question, context_ids=None, route="default"):
+        ''' Return a cached answer for a similar question, or None
+        Args:
+            question: user question
+            context_ids: ids of the passages the answer would be based on
+            route: label of the generation route (counters are kept per route)
+        '''
+        vector = self._embed(question)
+        context_ids = tuple(context_ids or ())
+        with self._lock:
+            if self.index is not None and self.index.ntotal:
+                scores, ids = self.index.search(vector, min(self.candidates, self.index.ntotal))
+                for score, entry_id in zip(scores[0], ids[0]):
+                    if entry_id < 0 or score < self.threshold:
+                        continue
+                    entry = self._entries.get(int(entry_id))
+                    if entry is None:
+                        continue
+                    if time.time() - entry["created_at"] > self.ttl:
+                        self._remove([int(entry_id)])
+                        continue
+                    if entry["route"] == route and entry["context_ids"] == context_ids:
+                        self._entries.move_to_end(int(entry_id))
+                        self._route_stats[route]["hits"] += 1
+                        logging.info(f"Semantic Cache Hit (similarity {score:.3f}) on route '{route}'")
+                        return entry["answer"]
+            self._route_stats[route]["misses"] += 1
+        return None
+
+    def store(self, question, answer, context_ids=None, route="default"):
+        ''' Cache an answer for a question '''
+        vector = self._embed(question)
+        with self._lock:
+            if self.index is None:
+                self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+            entry_id = self._next_id
+            self._next_id += 1
+            self.index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = {
+                "question": question,
+                "answer": answer,
+                "context_ids": tuple(context_ids or ()),
+                "route": route,
+                "created_at": time.time(),
+            }
+            if len(self._entries) > self.maxsize:
+                overflow = list(self._entries)[:len(self._entries) - self.maxsize]
+                self._evictions += len(overflow)
+                self._remove(overflow)
+
+    def _remove(self, entry_ids):
+        for entry_id in entry_ids:
+            self._entries.pop(entry_id, None)
+        self.index.remove_ids(np.array(entry_ids, dtype=np.int64))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.index = None
+
+    def stats(self):
+        ''' Hit/miss counters over all routes, and per route under "routes" '''
+        with self._lock:
+            routes = {}
+            for route, counts in self._route_stats.items():
+                lookups = counts["hits"] + counts["misses"]
+                routes[route] = {**counts, "hit_rate": counts["hits"] / lookups if lookups else 0.0}
+            hits = sum(counts["hits"] for counts in routes.values())
+            misses = sum(counts["misses"] for counts in routes.values())
+            return {"size": len(self._entries), "evictions": self._evictions, "hits": hits, "misses": misses,
+                    "hit_rate": hits / (hits + misses) if hits + misses else 0.0, "routes": routes}
@@ -3,6 +3,63 @@ import json
 from datetime import datetime
 import random
 
+# Southeastern Nigeria states and their LGAs
+SOUTHEAST_DATA = {
+    "Abia": {
+        "code": "AB",
+        "lgas": [
+            "Aba North", "Aba South", "Arochukwu", "Bende", "Ikwuano",
+            "Isiala-Ngwa North", "Isiala-Ngwa South", "Isuikwato", "Obi Nwa",
+            "Ohafia", "Osisioma", "Ngwa", "Ugwunagbo", "Ukwa East",
+            "Ukwa West", "Umuahia North", "Umuahia South", "Umu-Neochi"
+        ]
+    },
+    "Anambra": {
+        "code": "AN",
+        "lgas": [
+            "Aguata", "Anambra East", "Anambra West", "Anaocha", "Awka North",
+            "Awka South", "Ayamelum", "Dunukofia", "Ekwusigo", "Idemili North",
+            "Idemili South", "Ihiala", "Njikoka", "Nnewi North", "Nnewi South",
+            "Ogbaru", "Onitsha North", "Onitsha South", "Orumba North",
+            "Orumba South", "Oyi"
+        ]
+    },
+    "Ebonyi": {
+        "code": "EB",
+        "lgas": [
+            "Abakaliki", "Afikpo North", "Afikpo South", "Ebonyi", "Ezza North",
+            "Ezza South", "Ikwo", "Ishielu", "Ivo", "Izzi", "Ohaozara",
+            "Ohaukwu", "Onicha"
+        ]
+    },
+    "Enugu": {
+        "code": "EN",
+        "lgas": [
+            "Aninri", "Awgu", "Enugu East", "Enugu North", "Enugu South",
+            "Ezeagu", "Igbo Etiti", "Igbo Eze North", "Igbo Eze South",
+            "Isi Uzo", "Nkanu East", "Nkanu West", "Nsukka", "Oji River",
+            "Udenu", "Udi", "Uzo Uwani"
+        ]
+    },
+    "Imo": {
+        "code": "IM",
+        "lgas": [
+            "Aboh Mbaise", "Ahiazu Mbaise", "Ehime Mbano", "Ezinihitte",
+            "Ideato North", "Ideato South", "Ihitte/Uboma", "Ikeduru",
+            "Isiala Mbano", "Isu", "Mbaitoli", "Ngor Okpala", "Njaba",
+            "Nkwerre", "Nwangele", "Obowo", "Oguta", "Ohaji/Egbema",
+            "Okigwe", "Orlu", "Orsu", "Oru East", "Oru West",
+            "Owerri Municipal", "Owerri North", "Owerri West", "Unuimo"
+        ]
+    }
+}
+
+# Common crops in southeastern Nigeria
+CROPS = [
+    "Cassava", "Yam", "Cocoyam", "Maize", "Rice", "Plantain", 
+    "Cocoa", "Oil Palm", "Sweet Potato", "Vegetables", "Pepper"
+]
+
 class SoutheastNigeriaSoilDB:
     def __init__(self, db_path=r"C:\Users\SPOT\Documents\AgroX\database\southeast_nigeria_soil.db"):
         self.db_path = db_path
@@ -91,59 +148,8 @@ class SoutheastNigeriaSoilDB:
         if cursor.fetchone()[0] > 0:
             return
         
-        # Southeastern Nigeria states and their LGAs
-        southeast_data = {
-            "Abia": {
-                "code": "AB",
-                "lgas": [
-                    "Aba North", "Aba South", "Arochukwu", "Bende", "Ikwuano",
-                    "Isiala-Ngwa North", "Isiala-Ngwa South", "Isuikwato", "Obi Nwa",
-                    "Ohafia", "Osisioma", "Ngwa", "Ugwunagbo", "Ukwa East",
-                    "Ukwa West", "Umuahia North", "Umuahia South", "Umu-Neochi"
-                ]
-            },
-            "Anambra": {
-                "code": "AN",
-                "lgas": [
-                    "Aguata", "Anambra East", "Anambra West", "Anaocha", "Awka North",
-                    "Awka South", "Ayamelum", "Dunukofia", "Ekwusigo", "Idemili North",
-                    "Idemili South", "Ihiala", "Njikoka", "Nnewi North", "Nnewi South",
-                    "Ogbaru", "Onitsha North", "Onitsha South", "Orumba North",
-                    "Orumba South", "Oyi"
-                ]
-            },
-            "Ebonyi": {
-                "code": "EB",
-                "lgas": [
-                    "Abakaliki", "Afikpo North", "Afikpo South", "Ebonyi", "Ezza North",
-                    "Ezza South", "Ikwo", "Ishielu", "Ivo", "Izzi", "Ohaozara",
-                    "Ohaukwu", "Onicha"
-                ]
-            },
-            "Enugu": {
-                "code": "EN",
-                "lgas": [
-                    "Aninri", "Awgu", "Enugu East", "Enugu North", "Enugu South",
-                    "Ezeagu", "Igbo Etiti", "Igbo Eze North", "Igbo Eze South",
-                    "Isi Uzo", "Nkanu East", "Nkanu West", "Nsukka", "Oji River",
-                    "Udenu", "Udi", "Uzo Uwani"
-                ]
-            },
-            "Imo": {
-                "code": "IM",
-                "lgas": [
-                    "Aboh Mbaise", "Ahiazu Mbaise", "Ehime Mbano", "Ezinihitte",
-                    "Ideato North", "Ideato South", "Ihitte/Uboma", "Ikeduru",
-                    "Isiala Mbano", "Isu", "Mbaitoli", "Ngor Okpala", "Njaba",
-                    "Nkwerre", "Nwangele", "Obowo", "Oguta", "Ohaji/Egbema",
-                    "Okigwe", "Orlu", "Orsu", "Oru East", "Oru West",
-                    "Owerri Municipal", "Owerri North", "Owerri West", "Unuimo"
-                ]
-            }
-        }
-        
         # Insert states and LGAs
-        for state_name, state_info in southeast_data.items():
+        for state_name, state_info in SOUTHEAST_DATA.items():
             cursor.execute(
                 "INSERT INTO states (name, code) VALUES (?, ?)",
                 (state_name, state_info["code"])
@@ -185,12 +191,6 @@ class SoutheastNigeriaSoilDB:
         cursor.execute("SELECT id, name, state_id FROM local_governments")
         lgas = cursor.fetchall()
         
-        # Common crops in southeastern Nigeria
-        crops = [
-            "Cassava", "Yam", "Cocoyam", "Maize", "Rice", "Plantain", 
-            "Cocoa", "Oil Palm", "Sweet Potato", "Vegetables", "Pepper"
-        ]
-        
         for lga in lgas:
             # Generate soil properties based on typical southeastern Nigeria soils
             soil_data = self.generate_realistic_soil_properties(lga['name'])
@@ -213,7 +213,7 @@ class SoutheastNigeriaSoilDB:
             ))
             
             # Generate crop suitability for each LGA
-            for crop in crops:
+            for crop in CROPS:
                 suitability = self.calculate_crop_suitability(crop, soil_data)
                 cursor.execute('''
                     INSERT INTO crop_suitability 
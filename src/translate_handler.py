@@ -1,72 +1,197 @@
-from langdetect import detect
-from argostranslate import package, translate
+from argostranslate import package, translate, settings
+from src.model_registry import registry
+from src.cache import LRUCache
+from src.metrics import timed
+from src import language_id
+import ctranslate2
 import logging
-import time
+import os
+import re
 
 logging.basicConfig(level=logging.INFO)
 
+# Translated sentences, keyed on language pair and sentence text
+sentence_cache = LRUCache(
+    maxsize=int(os.getenv("AGROX_TRANSLATION_CACHE_SIZE", 4096)),
+    ttl=float(os.getenv("AGROX_TRANSLATION_CACHE_TTL", 7 * 24 * 3600)),
+)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# Decoding settings argos uses for a single best translation
+BEAM_SIZE = 4
+LENGTH_PENALTY = 0.2
+MAX_BATCH_SIZE = 32
+
 class Translation:
     '''Class for Handling Translation'''
 
-    def __init__(self, text, supported_langs = ("ig", "en")):
+    def __init__(self, text, supported_langs = ("ig", "en"), lang_hint=None):
         '''
         Initializes translation by detecting language and ensuring package installation.
 
         Args:
             text (str): Input text
+            lang_hint (str): Language already detected for the text (e.g. by Whisper)
 
         Returns:
             Tuple: (text, lang_code) if valid
         '''
-        start = time.time()
         self.text = text
-        self.lang = self.detect_language(self.text)
+        self.lang = self.detect_language(self.text, lang_hint)
         if self.lang not in supported_langs:
             raise ValueError(f"{self.lang} is not supported")
         logging.info(f"Detected Language: {self.lang}")
 
         if self.lang == "ig":
             self.from_code, self.to_code = "ig", "en"
-            installed = [
-                (p.from_code, p.to_code) for p in package.get_installed_packages()
-            ]
-            if (self.from_code, self.to_code) not in installed:
-                logging.info(f"Downloading translation package for {self.from_code} -> {self.to_code}...")
-                pkg_path = package.download_package(self.from_code, self.to_code)
-                package.install_from_path(pkg_path)
-                end = time.time()
-                logging.info(f" Loading Audio Package Time Taken {end - start}")
+            # Package check and install happen once per process in the registry
+            registry.get(f"translator_{self.from_code}_{self.to_code}")
         elif self.lang == "en":
             logging.info("No translation needed for English.")
         else:
             raise ValueError(f"{self.lang} is not supported")
 
     @staticmethod
-    def detect_language(text):
-        '''Detect language using langdetect'''
+    def load_translation(from_code, to_code):
+        '''Install the argos package if needed and return its translation object
+
+        Args:
+            from_code (str): Source language code
+            to_code (str): Target language code
+
+        Returns:
+            argostranslate translation object
+        '''
+        installed = [
+            (p.from_code, p.to_code) for p in package.get_installed_packages()
+        ]
+        if (from_code, to_code) not in installed:
+            logging.info(f"Downloading translation package for {from_code} -> {to_code}...")
+            package.update_package_index()
+            available = package.get_available_packages()
+            pkg = next((p for p in available if p.from_code == from_code and p.to_code == to_code), None)
+            if pkg is None:
+                raise ValueError(f"No translation package available for {from_code} -> {to_code}")
+            package.install_from_path(pkg.download())
+
+        langs = translate.get_installed_languages()
+        from_lang = next((lang for lang in langs if lang.code == from_code), None)
+        to_lang = next((lang for lang in langs if lang.code == to_code), None)
+        if not from_lang or not to_lang:
+            raise ValueError("Required language packages not installed")
+        translation = from_lang.get_translation(to_lang)
+        # Load the CTranslate2 model with the package so the first batch does not pay for it
+        Translation.package_backend(translation)
+        return translation
+
+    @staticmethod
+    def package_backend(translation):
+        '''Package and CTranslate2 translator behind an argos translation
+
+        Args:
+            translation: argos translation object (possibly wrapped in a CachedTranslation)
+
+        Returns:
+            (package, ctranslate2.Translator), or None when the translation is not a
+            single installed package (e.g. a pivot through another language)
+        '''
+        while not hasattr(translation, "pkg") and hasattr(translation, "underlying"):
+            translation = translation.underlying
+        pkg = getattr(translation, "pkg", None)
+        if pkg is None or not hasattr(pkg, "tokenizer"):
+            return None
+        if getattr(translation, "translator", None) is None:
+            # Shared with argos, which loads the same model lazily under this attribute
+            translation.translator = ctranslate2.Translator(str(pkg.package_path / "model"), device=settings.device)
+        return pkg, translation.translator
+
+    @staticmethod
+    def detect_language(text, hint=None):
+        '''Detect language: hint, cached result, Igbo/English heuristics, then langdetect'''
         try:
-            return detect(text)
+            return language_id.detect_language(text, hint)
         except Exception as e:
             logging.error(f"Language detection failed: {e}")
             raise ValueError(" This Language is not yet Supported ")
 
+    @staticmethod
+    def split_sentences(text):
+        '''Split text into paragraphs of sentences
+
+        Returns:
+            list of lists of sentences, one inner list per line of the text
+        '''
+        return [[s for s in _SENTENCE_END.split(line.strip()) if s] for line in text.split("\n")]
+
+    @staticmethod
+    def translate_sentences(translation, sentences):
+        '''Translate sentences in one CTranslate2 translate_batch call
+
+        argos' own translate() splits its input into paragraphs and sentences and
+        decodes them one call at a time, so the sentences are tokenized and sent
+        to the package's translator together instead.
+        '''
+        backend = Translation.package_backend(translation)
+        if backend is None:
+            return [translation.translate(s) for s in sentences]
+        pkg, translator = backend
+        prefix = getattr(pkg, "target_prefix", "")
+        results = translator.translate_batch(
+            [pkg.tokenizer.encode(s) for s in sentences],
+            target_prefix=[[prefix]] * len(sentences) if prefix else None,
+            replace_unknowns=True,
+            max_batch_size=MAX_BATCH_SIZE,
+            beam_size=BEAM_SIZE,
+            num_hypotheses=1,
+            length_penalty=LENGTH_PENALTY,
+        )
+        translated = [pkg.tokenizer.decode(result.hypotheses[0]) for result in results]
+        if prefix:
+            translated = [t[len(prefix):] if t.startswith(prefix) else t for t in translated]
+        return translated
+
+    @staticmethod
+    def translate_batch(sentences, from_lang_code, to_lang_code):
+        '''Translate sentences, reusing cached ones and sending the rest in a single batch
+
+        Args:
+            sentences (list): Sentences to translate
+            from_lang_code (str): Source language code
+            to_lang_code (str): Target language code
+
+        Returns:
+            list: Translations in the same order
+        '''
+        keys = [f"{from_lang_code}:{to_lang_code}:{s}" for s in sentences]
+        results = {key: sentence_cache.get(key) for key in keys}
+        missing = list(dict.fromkeys(s for s, key in zip(sentences, keys) if results[key] is None))
+
+        if missing:
+            translation = registry.get(f"translator_{from_lang_code}_{to_lang_code}")
+            translated = Translation.translate_sentences(translation, missing)
+            for sentence, output in zip(missing, translated):
+                key = f"{from_lang_code}:{to_lang_code}:{sentence}"
+                results[key] = output.strip()
+                sentence_cache.set(key, results[key])
+
+        return [results[key] for key in keys]
+
+    @staticmethod
+    @timed("translate")
+    def translate_text(text, from_lang_code, to_lang_code):
+        '''Translate a text sentence by sentence, keeping its line breaks'''
+        paragraphs = Translation.split_sentences(text)
+        flat = [s for paragraph in paragraphs for s in paragraph]
+        translated = iter(Translation.translate_batch(flat, from_lang_code, to_lang_code))
+        return "\n".join(" ".join(next(translated) for _ in paragraph) for paragraph in paragraphs)
+
     @staticmethod
     def translate_to_english(text, from_lang_code="ig", to_lang_code="en"):
         '''Translate Igbo to English'''
         try:
             logging.info("Translating to English...")
-            start = time.time()
-            langs = translate.get_installed_languages()
-            from_lang = next((lang for lang in langs if lang.code == from_lang_code), None)
-            to_lang = next((lang for lang in langs if lang.code == to_lang_code), None)
-
-            if not from_lang or not to_lang:
-                raise ValueError("Required language packages not installed")
-
-            translation = from_lang.get_translation(to_lang)
-            end = time.time()
-            logging.info(f" inference to translate to english  Time Taken {end - start}")
-            return translation.translate(text)
+            return Translation.translate_text(text, from_lang_code, to_lang_code)
         except Exception as e:
             logging.exception(f"Error translating to English: {e}")
             raise e
@@ -75,19 +200,8 @@ class Translation:
     def translate_to_igbo(text, from_lang_code="en", to_lang_code="ig"):
         '''Translate English to Igbo'''
         try:
-            start = time.time()
             logging.info("Translating to Igbo...")
-            langs = translate.get_installed_languages()
-            from_lang = next((lang for lang in langs if lang.code == from_lang_code), None)
-            to_lang = next((lang for lang in langs if lang.code == to_lang_code), None)
-
-            if not from_lang or not to_lang:
-                raise ValueError("Required language packages not installed")
-
-            translation = from_lang.get_translation(to_lang)
-            end = time.time()
-            logging.info(f"inference time to translate to english Time Taken {end - start}")
-            return translation.translate(text)
+            return Translation.translate_text(text, from_lang_code, to_lang_code)
         except Exception as e:
             logging.exception(f"Error translating to Igbo: {e}")
             raise e
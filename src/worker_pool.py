@@ -0,0 +1,291 @@
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+import multiprocessing as mp
+import numpy as np
+import threading
+import logging
+import queue
+import time
+import os
+
+logging.basicConfig(level=logging.INFO)
+
+# Model families that can run out of process: default torch threads and the methods callers use.
+# The LLM stays in the API process: its streaming and async paths need in-process generators.
+WORKER_FAMILIES = {
+    "image_classifier": {"threads": 2, "methods": ["classify_plant_image", "classify_plant_images"]},
+    "whisper": {"threads": 2, "methods": ["transcribe"]},
+    "embedder": {"threads": 1, "methods": ["encode"]},
+}
+
+
+def _threads_for(family):
+    return int(os.getenv(f"AGROX_WORKER_THREADS_{family.upper()}", WORKER_FAMILIES[family]["threads"]))
+
+
+# ---- argument transport -------------------------------------------------
+# Arrays and images travel as shared memory blocks; everything else is pickled.
+
+def _to_shared(array, blocks):
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    blocks.append(block)
+    return block.name, array.shape, array.dtype.str
+
+
+def _encode(value, blocks):
+    if isinstance(value, np.ndarray):
+        return ("__array__", _to_shared(value, blocks))
+    if type(value).__module__.startswith("PIL."):
+        return ("__image__", _to_shared(np.asarray(value.convert("RGB")), blocks))
+    if isinstance(value, (list, tuple)):
+        return type(value)(_encode(v, blocks) for v in value)
+    return value
+
+
+def _decode(value, blocks):
+    if isinstance(value, tuple) and len(value) == 2 and value[0] in ("__array__", "__image__"):
+        name, shape, dtype = value[1]
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        if value[0] == "__image__":
+            from PIL import Image
+            return Image.fromarray(array.copy())
+        return array
+    if isinstance(value, (list, tuple)):
+        return type(value)(_decode(v, blocks) for v in value)
+    return value
+
+
+def _release(blocks, unlink):
+    for block in blocks:
+        try:
+            block.close()
+            if unlink:
+                block.unlink()
+        except (FileNotFoundError, BufferError):
+            # BufferError: a view is still referenced; the block goes when it is collected
+            pass
+
+
+# ---- worker process ----------------------------------------------------
+
+def _worker_main(family, threads, requests, responses):
+    ''' Entry point of a worker process: load one model family and serve calls on it '''
+    # Thread counts must be fixed before torch spins up its pools
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+    from src.model_registry import registry
+    model = registry.get(family)
+    logging.info(f"Worker for {family} Ready (pid {os.getpid()}, {threads} threads)")
+    responses.put(("ready", None, None))
+
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        job_id, method, args, kwargs = message
+        blocks = []
+        try:
+            result = getattr(model, method)(*_decode(args, blocks), **kwargs)
+            responses.put((job_id, True, result))
+        except Exception as e:
+            logging.exception(f"Worker for {family} Failed on {method}")
+            responses.put((job_id, False, f"{type(e).__name__}: {e}"))
+        finally:
+            # The API process owns the blocks and unlinks them
+            _release(blocks, unlink=False)
+
+
+# ---- API process side --------------------------------------------------
+
+class Inference_Worker:
+    ''' One model family served by a dedicated process, restarted if it dies '''
+
+    def __init__(self, family, threads=None, start_timeout=600, max_restart_delay=30):
+        ''' Initialize worker
+        Args:
+            family: registry name of the model the process loads
+            threads: torch threads in the process, defaults to AGROX_WORKER_THREADS_<FAMILY>
+            start_timeout: seconds to wait for the model to load
+            max_restart_delay: cap on the backoff between restarts
+        '''
+        self.family = family
+        self.threads = threads or _threads_for(family)
+        self.start_timeout = start_timeout
+        self.max_restart_delay = max_restart_delay
+        self._ctx = mp.get_context("spawn")
+        self._lock = threading.Lock()
+        self._pending = {}  # job_id -> (Future, shared memory blocks)
+        self._next_id = 0
+        self._running = False
+        self.process = None
+        self.stats = {"calls": 0, "errors": 0, "restarts": 0}
+
+    def start(self):
+        ''' Start the process and block until its model is loaded '''
+        self._running = True
+        self._spawn()
+        threading.Thread(target=self._supervise, name=f"{self.family}-supervisor", daemon=True).start()
+        return self
+
+    def _spawn(self):
+        self.requests = self._ctx.Queue()
+        self.responses = self._ctx.Queue()
+        self.process = self._ctx.Process(
+            target=_worker_main,
+            args=(self.family, self.threads, self.requests, self.responses),
+            name=f"agrox-{self.family}",
+            daemon=True,
+        )
+        self.process.start()
+        start = time.time()
+        while True:
+            try:
+                if self.responses.get(timeout=1)[0] == "ready":
+                    break
+            except queue.Empty:
+                if not self.process.is_alive():
+                    raise RuntimeError(f"Worker for {self.family} exited with code {self.process.exitcode} while loading")
+                if time.time() - start > self.start_timeout:
+                    self.process.kill()
+                    raise TimeoutError(f"Worker for {self.family} did not load within {self.start_timeout}s")
+        threading.Thread(target=self._read_responses, args=(self.responses,),
+                         name=f"{self.family}-responses", daemon=True).start()
+
+    def _read_responses(self, responses):
+        while True:
+            try:
+                job_id, ok, result = responses.get()
+            except (EOFError, OSError):
+                return
+            if job_id is None:
+                return
+            with self._lock:
+                future, blocks = self._pending.pop(job_id, (None, []))
+            _release(blocks, unlink=True)
+            if future is None:
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                with self._lock:
+                    self.stats["errors"] += 1
+                future.set_exception(RuntimeError(result))
+
+    def _supervise(self):
+        ''' Fail the calls of a crashed process and start a new one '''
+        delay = 1
+        while self._running:
+            self.process.join(timeout=1)
+            if not self._running or self.process.is_alive():
+                continue
+            logging.error(f"Worker for {self.family} Died (exit code {self.process.exitcode}), Restarting")
+            self.responses.put((None, None, None))  # stop the old reader
+            self._fail_pending(RuntimeError(f"Worker for {self.family} crashed"))
+            try:
+                self._spawn()
+                with self._lock:
+                    self.stats["restarts"] += 1
+                delay = 1
+            except Exception:
+                logging.exception(f"Restarting Worker for {self.family} Failed")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_restart_delay)
+
+    def _fail_pending(self, error):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future, blocks in pending.values():
+            _release(blocks, unlink=True)
+            if not future.done():
+                future.set_exception(error)
+
+    def submit(self, method, *args, **kwargs):
+        ''' Call a method of the worker's model
+        Args:
+            method: method name, e.g. "transcribe"
+            args: positional arguments; NumPy arrays and PIL images go through shared memory
+            kwargs: keyword arguments, pickled
+        Returns:
+            concurrent.futures.Future with the method's return value
+        '''
+        if not self.process or not self.process.is_alive():
+            raise RuntimeError(f"Worker for {self.family} is not running")
+        future = Future()
+        blocks = []
+        encoded = _encode(args, blocks)
+        with self._lock:
+            job_id = self._next_id
+            self._next_id += 1
+            self._pending[job_id] = (future, blocks)
+            self.stats["calls"] += 1
+        self.requests.put((job_id, method, encoded, kwargs))
+        return future
+
+    def call(self, method, *args, **kwargs):
+        ''' Blocking submit '''
+        return self.submit(method, *args, **kwargs).result()
+
+    def stop(self):
+        self._running = False
+        if self.process and self.process.is_alive():
+            self.requests.put(None)
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.kill()
+        self._fail_pending(RuntimeError(f"Worker for {self.family} stopped"))
+
+
+class Remote_Model:
+    ''' Stand-in for a model that lives in a worker process; method calls block on the worker '''
+
+    def __init__(self, worker, methods):
+        self._worker = worker
+        self._methods = set(methods)
+
+    def __getattr__(self, method):
+        if method.startswith("_") or method not in self._methods:
+            raise AttributeError(f"{self._worker.family} worker does not expose '{method}'")
+        return lambda *args, **kwargs: self._worker.call(method, *args, **kwargs)
+
+
+class Worker_Pool:
+    ''' Worker processes for several model families '''
+
+    def __init__(self, families=None):
+        self.workers = {family: Inference_Worker(family) for family in (families or WORKER_FAMILIES)}
+
+    def start(self):
+        for family, worker in self.workers.items():
+            start = time.time()
+            worker.start()
+            logging.info(f"Worker for {family} Started, Time Taken {time.time() - start}")
+        return self
+
+    def install(self, registry):
+        ''' Point the registry's entries for these families at the workers '''
+        for family, worker in self.workers.items():
+            registry.unload(family)
+            methods = WORKER_FAMILIES[family]["methods"]
+            registry.register(family, lambda worker=worker, methods=methods: Remote_Model(worker, methods),
+                              size_mb=0, pinned=True)
+            # Proxies cost nothing, and a loaded entry lets callers see the family is remote
+            registry.get(family)
+
+    def stop(self):
+        for worker in self.workers.values():
+            worker.stop()
+
+    def stats(self):
+        return {
+            family: {**worker.stats, "pid": worker.process.pid if worker.process else None,
+                     "threads": worker.threads, "pending": len(worker._pending)}
+            for family, worker in self.workers.items()
+        }
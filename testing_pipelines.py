@@ -7,7 +7,6 @@ from PIL import Image
 image_path  = r"C:\Users\SPOT\Documents\AgroX\images\images (2).webp"
 audio_path = r"C:\Users\SPOT\Documents\AgroX\audio\3 Jul, 12.10 am​.m4a"
 igbo_audio_path = r"C:\Users\SPOT\Documents\AgroX\audio\3 Jul, 11.36 pm​.m4a"
-output = r"C:\Users\SPOT\Documents\AgroX\audio\h1.wav"
 
 
 if __name__ == "__main__":
@@ -16,7 +15,7 @@ if __name__ == "__main__":
     label = image_model.classify_plant_image(img)
     prompt = f"Image shows: {label}."
     prompt += "What is the treatment?"'''
-    audio = Audio(audio_path, output_path = output)
+    audio = Audio(audio_path)
     raw_text = audio.transcribe_audio()
     print(raw_text)
     translator = Translation(raw_text)
@@ -0,0 +1,162 @@
+import asyncio
+
+import pytest
+
+from src.admission import (
+    Admission_Controller, Overloaded, Stage_Limiter, request_priority,
+    PRIORITY_TEXT, PRIORITY_IMAGE, PRIORITY_AUDIO, PRIORITY_JOB, IMAGE_MAX_BATCH,
+)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_admits_up_to_concurrency_without_queueing():
+    async def scenario():
+        limiter = Stage_Limiter("llm", concurrency=2, max_queue=4, queue_timeout=1)
+        await limiter.acquire()
+        await limiter.acquire()
+        return limiter.stats()
+
+    stats = run(scenario())
+    assert stats["active"] == 2
+    assert stats["queue_depth"] == 0
+    assert stats["admitted"] == 2
+
+
+def test_waiters_are_served_by_priority_then_arrival():
+    async def scenario():
+        limiter = Stage_Limiter("llm", concurrency=1, max_queue=8, queue_timeout=5)
+        await limiter.acquire()
+        order = []
+
+        async def waiter(name, priority):
+            await limiter.acquire(priority)
+            order.append(name)
+            limiter.release()
+
+        tasks = []
+        for name, priority in [("job", PRIORITY_JOB), ("audio", PRIORITY_AUDIO), ("text-1", PRIORITY_TEXT),
+                               ("image", PRIORITY_IMAGE), ("text-2", PRIORITY_TEXT)]:
+            tasks.append(asyncio.create_task(waiter(name, priority)))
+            await settle()
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return order, limiter.stats()
+
+    order, stats = run(scenario())
+    assert order == ["text-1", "text-2", "image", "audio", "job"]
+    assert stats["active"] == 0
+    assert stats["completed"] == 6
+
+
+def test_full_queue_sheds_at_once():
+    async def scenario():
+        limiter = Stage_Limiter("whisper", concurrency=1, max_queue=1, queue_timeout=5)
+        await limiter.acquire()
+        queued = asyncio.create_task(limiter.acquire())
+        await settle()
+        with pytest.raises(Overloaded) as shed:
+            await limiter.acquire()
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        return shed.value, limiter.stats()
+
+    error, stats = run(scenario())
+    assert error.stage == "whisper"
+    assert error.reason == "queue full"
+    assert error.retry_after >= 1
+    assert stats["shed_full"] == 1
+
+
+def test_unbounded_acquire_queues_past_max_queue():
+    async def scenario():
+        limiter = Stage_Limiter("llm", concurrency=1, max_queue=0, queue_timeout=5)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire(PRIORITY_JOB, timeout=None, bounded=False))
+        await settle()
+        depth = limiter.stats()["queue_depth"]
+        limiter.release()
+        await waiter
+        return depth, limiter.stats()
+
+    depth, stats = run(scenario())
+    assert depth == 1
+    assert stats["active"] == 1
+    assert stats["shed_full"] == 0
+
+
+def test_deadline_sheds_waiter_and_keeps_queue_clean():
+    async def scenario():
+        limiter = Stage_Limiter("classifier", concurrency=1, max_queue=4, queue_timeout=0.05)
+        await limiter.acquire()
+        with pytest.raises(Overloaded) as shed:
+            await limiter.acquire()
+        stats = limiter.stats()
+        # The slot is still owned by the first caller; freeing it leaves nothing active
+        limiter.release()
+        return shed.value, stats, limiter.stats()
+
+    error, during, after = run(scenario())
+    assert error.reason == "queue deadline exceeded"
+    assert during["shed_deadline"] == 1
+    assert during["queue_depth"] == 0
+    assert after["active"] == 0
+
+
+def test_cancelled_waiter_does_not_take_or_leak_a_slot():
+    async def scenario():
+        limiter = Stage_Limiter("llm", concurrency=1, max_queue=4, queue_timeout=5)
+        await limiter.acquire()
+        cancelled = asyncio.create_task(limiter.acquire())
+        survivor = asyncio.create_task(limiter.acquire())
+        await settle()
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        limiter.release()
+        await asyncio.wait_for(survivor, 1)
+        active = limiter.stats()["active"]
+        limiter.release()
+        return active, limiter.stats()
+
+    active, stats = run(scenario())
+    assert active == 1
+    assert stats["active"] == 0
+    assert stats["queue_depth"] == 0
+
+
+def test_slot_context_manager_releases_on_error():
+    async def scenario():
+        limiter = Stage_Limiter("llm", concurrency=1, max_queue=1, queue_timeout=1)
+        with pytest.raises(RuntimeError):
+            async with limiter.slot(PRIORITY_TEXT):
+                raise RuntimeError("generation failed")
+        return limiter.stats()
+
+    stats = run(scenario())
+    assert stats["active"] == 0
+    assert stats["completed"] == 1
+
+
+def test_controller_reads_env_overrides(monkeypatch):
+    monkeypatch.setenv("AGROX_ADMISSION_WHISPER", "3,7,1.5")
+    controller = Admission_Controller()
+    whisper = controller["whisper"]
+    assert (whisper.concurrency, whisper.max_queue, whisper.queue_timeout) == (3, 7, 1.5)
+    assert controller["llm"].concurrency == 2
+
+
+def test_request_priority():
+    assert request_priority(text="hi") == PRIORITY_TEXT
+    assert request_priority(image=b"x", text="hi") == PRIORITY_IMAGE
+    assert request_priority(image=b"x", audio=b"y") == PRIORITY_AUDIO
+
+
+def test_classifier_admits_a_full_image_batch():
+    assert Admission_Controller()["classifier"].concurrency >= IMAGE_MAX_BATCH
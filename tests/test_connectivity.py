@@ -0,0 +1,130 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from src.connectivity import ConnectivityMonitor
+
+
+class ScriptedWake:
+    ''' Stands in for the monitor's wake event: records each wait and replays scripted wake-ups '''
+
+    def __init__(self, monitor, woken, waits):
+        self.monitor = monitor
+        self.woken = list(woken)
+        self.waits = waits
+        self.delays = []
+
+    def wait(self, delay):
+        self.delays.append(delay)
+        if len(self.delays) >= self.waits:
+            self.monitor._stop.set()
+        return self.woken.pop(0) if self.woken else False
+
+    def set(self):
+        pass
+
+    def clear(self):
+        pass
+
+
+def run_scripted(monitor, woken=(), waits=6):
+    wake = ScriptedWake(monitor, woken, waits)
+    monitor._wake = wake
+    monitor._run()
+    return wake.delays
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_offline_probes_back_off_up_to_the_cap():
+    monitor = ConnectivityMonitor(interval=1.0, max_backoff=8.0, probe=lambda: False)
+    delays = run_scripted(monitor)
+    assert delays == [1.0, 2.0, 4.0, 8.0, 8.0, 8.0]
+    assert not monitor.is_online
+
+
+def test_backoff_resets_once_back_online():
+    answers = iter([False, False, True, True])
+    monitor = ConnectivityMonitor(interval=1.0, max_backoff=8.0, probe=lambda: next(answers))
+    delays = run_scripted(monitor, waits=5)
+    assert delays == [1.0, 2.0, 4.0, 1.0, 1.0]
+    assert monitor.is_online
+
+
+def test_probe_exception_counts_as_offline():
+    def probe():
+        raise OSError("network unreachable")
+
+    monitor = ConnectivityMonitor(probe=probe)
+    monitor.mark_online()
+    assert monitor.probe() is False
+    assert not monitor.is_online
+
+
+def test_wake_after_failure_does_not_back_off(monkeypatch):
+    monkeypatch.setattr("src.connectivity.time.sleep", lambda seconds: None)
+    monitor = ConnectivityMonitor(interval=1.0, max_backoff=8.0, probe=lambda: False)
+    delays = run_scripted(monitor, woken=[False, True, False], waits=4)
+    # The scripted wake-up re-probes at the normal interval instead of doubling
+    assert delays == [1.0, 2.0, 1.0, 2.0]
+
+
+def test_mark_offline_flips_state_and_reprobes_early():
+    probes = []
+
+    def probe():
+        probes.append(time.time())
+        return True
+
+    monitor = ConnectivityMonitor(interval=60.0, probe=probe).start()
+    try:
+        assert monitor.is_online and len(probes) == 1
+        monitor.mark_offline()
+        assert not monitor.is_online
+        assert monitor.stats()["seconds_since_change"] < 1.0
+        # Far sooner than the 60s interval, the monitor confirms and flips back
+        assert wait_for(lambda: monitor.is_online)
+        assert len(probes) == 2
+    finally:
+        monitor.stop()
+
+
+class _Ok(BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = HTTPServer(("127.0.0.1", 0), _Ok)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_probes_local_http_stub(stub_server):
+    host, port = stub_server.server_address
+    monitor = ConnectivityMonitor(target=f"http://{host}:{port}/", timeout=1.0)
+    assert monitor.probe() is True
+    assert monitor.stats()["online"] is True
+
+    stub_server.shutdown()
+    stub_server.server_close()
+    assert monitor.probe() is False
+    assert monitor.stats() == {"online": False, "target": monitor.target,
+                               "seconds_since_change": pytest.approx(0, abs=1)}
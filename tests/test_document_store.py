@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from src.document_store import DocumentStore, replace_atomically, BLOB_FILE
+
+
+def test_write_get_round_trip(tmp_path):
+    docs = ["Cassava grows well in sandy loam.", None, "Ọka (maize) is planted in April.", ""]
+    DocumentStore.write(str(tmp_path), docs)
+    store = DocumentStore(str(tmp_path))
+    try:
+        assert len(store) == 4
+        assert store.get(0) == docs[0]
+        assert store.get(1) is None
+        assert store.get(2) == docs[2]
+        assert store.get(3) is None
+        assert store.get(-1) is None
+        assert store.get(4) is None
+        assert store.get_many([2, -1, 0, 1]) == [docs[2], docs[0]]
+    finally:
+        store.close()
+
+
+def test_empty_store(tmp_path):
+    DocumentStore.write(str(tmp_path), [])
+    store = DocumentStore(str(tmp_path))
+    try:
+        assert len(store) == 0
+        assert store.get_many([0, 1]) == []
+    finally:
+        store.close()
+
+
+def test_rewrite_does_not_disturb_an_open_store(tmp_path):
+    DocumentStore.write(str(tmp_path), ["old document " * 50, "second"])
+    live = DocumentStore(str(tmp_path))
+    try:
+        # A smaller rewrite must not truncate the files the live store has mapped
+        DocumentStore.write(str(tmp_path), ["new"])
+        assert live.get(0) == "old document " * 50
+        assert live.get(1) == "second"
+    finally:
+        live.close()
+
+    reopened = DocumentStore(str(tmp_path))
+    try:
+        assert len(reopened) == 1
+        assert reopened.get(0) == "new"
+    finally:
+        reopened.close()
+
+
+def test_failed_write_leaves_previous_file_and_no_temp_files(tmp_path):
+    path = tmp_path / BLOB_FILE
+    path.write_bytes(b"previous")
+    with pytest.raises(RuntimeError):
+        with replace_atomically(str(path)) as tmp:
+            with open(tmp, "wb") as f:
+                f.write(b"partial")
+            raise RuntimeError("crash while writing")
+    assert path.read_bytes() == b"previous"
+    assert os.listdir(tmp_path) == [BLOB_FILE]
@@ -0,0 +1,52 @@
+import pytest
+
+from src.gazetteer import Gazetteer
+
+
+@pytest.fixture(scope="module")
+def gazetteer():
+    return Gazetteer.from_soil_db()
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("When should I plant cassava in Nsukka?", {"crop": "Cassava", "location": "Nsukka"}),
+    ("maize planting in Onitsha North in July", {"crop": "Maize", "location": "Onitsha North", "month": "July"}),
+    ("corn in Enugu State", {"crop": "Maize", "location": "Enugu"}),
+    ("yams in Sept", {"crop": "Yam", "month": "September"}),
+])
+def test_extract_exact(gazetteer, text, expected):
+    assert gazetteer.extract(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("plant casava in Nsuka", {"crop": "Cassava", "location": "Nsukka"}),
+    ("yam farming in Onitsa", {"crop": "Yam", "location": "Onitsha"}),
+    ("plantian suckers", {"crop": "Plantain"}),
+])
+def test_extract_fuzzy(gazetteer, text, expected):
+    assert gazetteer.extract(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "planting",
+    "plantation",
+    "prices",
+    "price",
+    "rains",
+    "best planting time",
+])
+def test_common_words_are_not_entities(gazetteer, text):
+    assert gazetteer.extract(text) == {}
+
+
+def test_planting_question_keeps_only_location(gazetteer):
+    assert gazetteer.extract("best planting time in Awka") == {"location": "Awka"}
+
+
+def test_prices_question_finds_crop_not_rice(gazetteer):
+    assert gazetteer.extract("prices of yam in Aba") == {"crop": "Yam", "location": "Aba"}
+
+
+def test_ambiguous_month_needs_capital(gazetteer):
+    assert "month" not in gazetteer.extract("you may plant yam now")
+    assert gazetteer.extract("plant yam in May")["month"] == "May"
@@ -0,0 +1,157 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("google.generativeai")
+from google.api_core import exceptions as google_exceptions
+
+from src.gemini_client import GeminiClient
+
+
+class Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    ''' generate_content_async that can fail on chosen attempts and tracks overlapping calls '''
+
+    def __init__(self, failures=(), delay=0.01):
+        self.failures = list(failures)
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.calls.append(prompt)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.failures:
+                raise self.failures.pop(0)
+            return Response(f" answer to {prompt} ")
+        finally:
+            self.active -= 1
+
+
+def client_with(model, **kwargs):
+    client = GeminiClient(**kwargs)
+    client._models[client.model] = model
+    return client
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def jitter(monkeypatch):
+    ''' Record the jitter window of each retry and sleep for none of it '''
+    windows = []
+
+    def uniform(low, high):
+        windows.append((low, high))
+        return 0.0
+
+    monkeypatch.setattr("src.gemini_client.random.uniform", uniform)
+    return windows
+
+
+def test_identical_concurrent_prompts_share_one_upstream_call():
+    model = FakeModel()
+    client = client_with(model)
+
+    async def scenario():
+        answers = await asyncio.gather(*(client.generate("cassava mosaic?") for _ in range(3)))
+        return answers, dict(client._inflight)
+
+    answers, inflight = run(scenario())
+    assert answers == ["answer to cassava mosaic?"] * 3
+    assert model.calls == ["cassava mosaic?"]
+    assert client.stats["requests"] == 3
+    assert client.stats["coalesced"] == 2
+    assert client.stats["upstream_calls"] == 1
+    assert inflight == {}
+
+
+def test_different_temperature_is_not_coalesced():
+    model = FakeModel()
+    client = client_with(model)
+
+    async def scenario():
+        await asyncio.gather(client.generate("maize", temperature=0.2), client.generate("maize", temperature=0.7))
+
+    run(scenario())
+    assert len(model.calls) == 2
+    assert client.stats["coalesced"] == 0
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    model = FakeModel(delay=0.05)
+    client = client_with(model)
+
+    async def scenario():
+        first = asyncio.ensure_future(client.generate("yam"))
+        second = asyncio.ensure_future(client.generate("yam"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert run(scenario()) == "answer to yam"
+    assert len(model.calls) == 1
+
+
+def test_concurrency_is_capped():
+    model = FakeModel(delay=0.02)
+    client = client_with(model, max_concurrency=2)
+
+    async def scenario():
+        return await asyncio.gather(*(client.generate(f"question {i}") for i in range(6)))
+
+    answers = run(scenario())
+    assert len(answers) == 6
+    assert model.peak == 2
+    assert client.stats["upstream_calls"] == 6
+
+
+def test_retryable_errors_are_retried_with_growing_jitter(jitter):
+    model = FakeModel(failures=[google_exceptions.ServiceUnavailable("503"), asyncio.TimeoutError()])
+    client = client_with(model, retries=3, backoff=0.5, max_backoff=8.0)
+
+    assert run(client.generate("sorghum")) == "answer to sorghum"
+    assert jitter == [(0, 0.5), (0, 1.0)]
+    assert client.stats["retries"] == 2
+    assert client.stats["upstream_calls"] == 3
+    assert client.stats["failures"] == 0
+
+
+def test_jitter_window_is_capped(jitter):
+    model = FakeModel(failures=[google_exceptions.ResourceExhausted("429")] * 4)
+    client = client_with(model, retries=4, backoff=1.0, max_backoff=3.0)
+
+    run(client.generate("millet"))
+    assert jitter == [(0, 1.0), (0, 2.0), (0, 3.0), (0, 3.0)]
+
+
+def test_gives_up_after_the_last_retry(jitter):
+    model = FakeModel(failures=[google_exceptions.DeadlineExceeded("slow")] * 3)
+    client = client_with(model, retries=2)
+
+    with pytest.raises(google_exceptions.DeadlineExceeded):
+        run(client.generate("rice"))
+    assert len(model.calls) == 3
+    assert client.stats["retries"] == 2
+    assert client.stats["failures"] == 1
+
+
+def test_non_retryable_errors_fail_fast(jitter):
+    model = FakeModel(failures=[google_exceptions.InvalidArgument("bad prompt")])
+    client = client_with(model, retries=3)
+
+    with pytest.raises(google_exceptions.InvalidArgument):
+        run(client.generate("beans"))
+    assert len(model.calls) == 1
+    assert jitter == []
+    assert client.stats["failures"] == 1
@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+import pytest
+
+from src.job_store import JobStore, Job_Queue, QUEUED, RUNNING, DONE, FAILED, idempotency_key_for
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"), ttl=60)
+    yield store
+    store.close()
+
+
+def test_same_key_returns_existing_job(store):
+    job, created = store.create({"text": "hello"}, idempotency_key="k1")
+    again, created_again = store.create({"text": "hello"}, idempotency_key="k1")
+    assert created and not created_again
+    assert again["job_id"] == job["job_id"]
+    assert again["status"] == QUEUED
+
+
+def test_different_keys_create_different_jobs(store):
+    first, _ = store.create({"text": "a"}, idempotency_key="k1")
+    second, created = store.create({"text": "b"}, idempotency_key="k2")
+    assert created
+    assert first["job_id"] != second["job_id"]
+
+
+def test_jobs_without_key_are_never_deduplicated(store):
+    first, _ = store.create({"text": "a"})
+    second, created = store.create({"text": "a"})
+    assert created
+    assert first["job_id"] != second["job_id"]
+
+
+def test_finished_job_is_returned_for_its_key(store):
+    job, _ = store.create({"text": "a"}, idempotency_key="k1")
+    store.mark_running(job["job_id"])
+    store.finish(job["job_id"], {"answer": "42"})
+    again, created = store.create({"text": "a"}, idempotency_key="k1")
+    assert not created
+    assert again["status"] == DONE
+    assert again["result"] == {"answer": "42"}
+    # Uploads are dropped once the job is done
+    assert store.inputs(job["job_id"]) is None
+
+
+def test_failed_job_frees_its_key_for_a_retry(store):
+    job, _ = store.create({"text": "a"}, idempotency_key="k1")
+    store.fail(job["job_id"], "boom")
+    assert store.get(job["job_id"])["status"] == FAILED
+
+    retry, created = store.create({"text": "a"}, idempotency_key="k1")
+    assert created
+    assert retry["job_id"] != job["job_id"]
+    assert store.inputs(retry["job_id"]) == {"text": "a"}
+
+
+def test_expired_job_frees_its_key(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"), ttl=0.05)
+    try:
+        job, _ = store.create({"text": "a"}, idempotency_key="k1")
+        time.sleep(0.1)
+        assert store.get(job["job_id"]) is None
+        retry, created = store.create({"text": "a"}, idempotency_key="k1")
+        assert created and retry["job_id"] != job["job_id"]
+    finally:
+        store.close()
+
+
+def test_active_only_key_matches_queued_and_running_jobs(store):
+    job, _ = store.create({"text": "a"}, idempotency_key="hash", active_only=True)
+    again, created = store.create({"text": "a"}, idempotency_key="hash", active_only=True)
+    assert not created and again["job_id"] == job["job_id"]
+
+    store.mark_running(job["job_id"])
+    again, created = store.create({"text": "a"}, idempotency_key="hash", active_only=True)
+    assert not created and again["status"] == RUNNING
+
+
+def test_active_only_key_does_not_return_finished_jobs(store):
+    job, _ = store.create({"text": "a"}, idempotency_key="hash", active_only=True)
+    store.finish(job["job_id"], {"answer": "offline fallback"})
+
+    fresh, created = store.create({"text": "a"}, idempotency_key="hash", active_only=True)
+    assert created
+    assert fresh["job_id"] != job["job_id"]
+    assert fresh["status"] == QUEUED
+    # The first client can still poll its result
+    assert store.get(job["job_id"])["result"] == {"answer": "offline fallback"}
+
+
+def test_unfinished_lists_queued_and_running_oldest_first(store):
+    first, _ = store.create({"n": 1})
+    second, _ = store.create({"n": 2})
+    done, _ = store.create({"n": 3})
+    store.mark_running(second["job_id"])
+    store.finish(done["job_id"], {})
+    assert store.unfinished() == [first["job_id"], second["job_id"]]
+    assert store.counts() == {QUEUED: 1, RUNNING: 1, DONE: 1}
+
+
+def test_idempotency_key_for_is_stable_and_input_sensitive():
+    assert idempotency_key_for(b"img", None, "text") == idempotency_key_for(b"img", None, "text")
+    assert idempotency_key_for(b"img", None, "text") != idempotency_key_for(None, b"img", "text")
+
+
+def test_start_fails_jobs_that_do_not_fit_the_queue(store):
+    jobs = [store.create({"n": n})[0]["job_id"] for n in range(3)]
+
+    async def handler(inputs):
+        return inputs
+
+    async def scenario():
+        queue = Job_Queue(store, handler, workers=0, maxsize=2)
+        await queue.start()
+        try:
+            return queue.queue.qsize(), queue.get_stats()
+        finally:
+            await queue.stop()
+
+    depth, stats = asyncio.run(scenario())
+    assert depth == 2
+    assert stats["failed"] == 1
+    assert [store.get(job_id)["status"] for job_id in jobs] == [QUEUED, QUEUED, FAILED]
+    assert store.get(jobs[2])["error"] == "Job queue is full"
@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip("langdetect")
+
+from src.language_id import identify, language_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    language_cache.clear()
+    yield
+    language_cache.clear()
+
+
+def test_english_hint_is_trusted_for_english_text():
+    result = identify("When should I plant maize on my farm?", hint="en")
+    assert result == {"lang": "en", "confidence": 1.0, "source": "hint"}
+
+
+def test_english_hint_is_overridden_by_igbo_letters():
+    result = identify("Kedu mgbe m ga-akọ ọka n'ubi m?", hint="en")
+    assert result["lang"] == "ig"
+    assert result["source"] == "heuristic"
+
+
+def test_english_hint_is_overridden_by_undotted_igbo_words():
+    result = identify("kedu ihe m ga eme maka ji na akpu", hint="en")
+    assert result["lang"] == "ig"
+    assert result["source"] == "heuristic"
+
+
+def test_hint_kept_when_heuristic_agrees():
+    assert identify("Ọ dị mma", hint="ig") == {"lang": "ig", "confidence": 1.0, "source": "hint"}
+
+
+def test_hint_kept_when_heuristic_is_unsure():
+    # Too few known words for the heuristic to disagree with confidence
+    assert identify("okwu", hint="en") == {"lang": "en", "confidence": 1.0, "source": "hint"}
+
+
+def test_unsupported_hint_is_ignored():
+    result = identify("kedu ihe m ga eme maka ji", hint="yo")
+    assert result["lang"] == "ig"
+    assert result["source"] == "heuristic"
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+
+import faiss
+import numpy as np
+import pytest
+
+from src.document_store import DocumentStore
+from src.rag_pipeline import FAISSGenerator, INDEX_FILE, MANIFEST_FILE
+
+DIM = 8
+
+
+class FakeEmbedder:
+    ''' Deterministic embeddings from a hash of the text; records what it was asked to encode '''
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, **kwargs):
+        self.encoded.extend(texts)
+        return np.stack([
+            np.frombuffer(hashlib.sha256(text.encode("utf-8")).digest()[:DIM * 4], dtype=np.uint32) % 1000
+            for text in texts
+        ]).astype("float32")
+
+
+def paragraph(topic, words=60):
+    return " ".join(f"{topic}{i}" for i in range(words))
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "cassava.txt").write_text(paragraph("cassava"), encoding="utf-8")
+    (data_dir / "maize.txt").write_text(paragraph("maize"), encoding="utf-8")
+    (data_dir / "notes.md").write_text("not indexed", encoding="utf-8")
+    return data_dir
+
+
+def generator(corpus, **kwargs):
+    gen = FAISSGenerator(data_dir=str(corpus), index_dir=str(corpus.parent / "index"),
+                         chunk_size=200, chunk_overlap=40, **kwargs)
+    gen._model = FakeEmbedder()
+    return gen
+
+
+def indexed(gen):
+    ''' (faiss ids, {id: document}) of the saved build '''
+    index = faiss.read_index(os.path.join(gen.index_dir, INDEX_FILE))
+    ids = set(faiss.vector_to_array(index.id_map).tolist())
+    store = DocumentStore(gen.index_dir)
+    try:
+        docs = {i: store.get(i) for i in range(len(store)) if store.get(i) is not None}
+    finally:
+        store.close()
+    return ids, docs
+
+
+def manifest(gen):
+    with open(os.path.join(gen.index_dir, MANIFEST_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---- chunking -----------------------------------------------------------
+
+def test_chunks_respect_size_and_word_boundaries():
+    gen = FAISSGenerator(chunk_size=100, chunk_overlap=20)
+    text = paragraph("yam", 80)
+    words = set(text.split())
+    chunks = gen.chunk_text(text)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk) <= 100
+        assert set(chunk.split()) <= words
+
+
+def test_chunks_overlap_and_cover_text():
+    gen = FAISSGenerator(chunk_size=100, chunk_overlap=20)
+    text = paragraph("yam", 80)
+    chunks = gen.chunk_text(text)
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous.split()[-1] in current.split()[:5]
+    covered = set(word for chunk in chunks for word in chunk.split())
+    assert covered == set(text.split())
+
+
+def test_short_and_empty_text():
+    gen = FAISSGenerator(chunk_size=100, chunk_overlap=20)
+    assert gen.chunk_text("  one short line  ") == ["one short line"]
+    assert gen.chunk_text("   ") == []
+
+
+# ---- incremental builds -------------------------------------------------
+
+def test_first_build_indexes_every_txt_file(corpus):
+    gen = generator(corpus)
+    gen.build_faiss_index()
+    ids, docs = indexed(gen)
+    files = manifest(gen)["files"]
+    assert set(files) == {"cassava.txt", "maize.txt"}
+    assert ids == set(docs) == {i for info in files.values() for i in info["ids"]}
+    assert len(gen.model.encoded) == len(docs)
+
+
+def test_unchanged_corpus_embeds_nothing(corpus):
+    generator(corpus).build_faiss_index()
+    gen = generator(corpus)
+    gen.build_faiss_index()
+    assert gen.model.encoded == []
+
+
+def test_changed_file_is_reembedded_and_its_old_chunks_removed(corpus):
+    first = generator(corpus)
+    first.build_faiss_index()
+    old = manifest(first)["files"]
+
+    (corpus / "maize.txt").write_text(paragraph("corn"), encoding="utf-8")
+    gen = generator(corpus)
+    gen.build_faiss_index()
+    files = manifest(gen)["files"]
+    ids, docs = indexed(gen)
+
+    assert all(chunk.startswith("corn") or " corn" in chunk for chunk in gen.model.encoded)
+    assert files["cassava.txt"] == old["cassava.txt"]
+    assert not set(old["maize.txt"]["ids"]) & ids
+    assert set(files["maize.txt"]["ids"]) <= ids
+    assert not any("maize" in doc for doc in docs.values())
+
+
+def test_deleted_file_is_removed(corpus):
+    generator(corpus).build_faiss_index()
+    removed = manifest(generator(corpus))["files"]["maize.txt"]["ids"]
+
+    (corpus / "maize.txt").unlink()
+    gen = generator(corpus)
+    gen.build_faiss_index()
+    ids, docs = indexed(gen)
+    assert gen.model.encoded == []
+    assert set(manifest(gen)["files"]) == {"cassava.txt"}
+    assert not set(removed) & ids
+    assert all("cassava" in doc for doc in docs.values())
+
+
+def test_added_file_gets_new_ids(corpus):
+    generator(corpus).build_faiss_index()
+    before = manifest(generator(corpus))["next_id"]
+
+    (corpus / "yam.txt").write_text(paragraph("yam"), encoding="utf-8")
+    gen = generator(corpus)
+    gen.build_faiss_index()
+    files = manifest(gen)["files"]
+    assert min(files["yam.txt"]["ids"]) == before
+    assert len(gen.model.encoded) == len(files["yam.txt"]["ids"])
+    ids, _ = indexed(gen)
+    assert set(files["yam.txt"]["ids"]) <= ids
+
+
+def test_changed_chunking_rebuilds_from_scratch(corpus):
+    generator(corpus).build_faiss_index()
+    gen = FAISSGenerator(data_dir=str(corpus), index_dir=str(corpus.parent / "index"),
+                         chunk_size=150, chunk_overlap=30)
+    gen._model = FakeEmbedder()
+    gen.build_faiss_index()
+    ids, docs = indexed(gen)
+    assert len(gen.model.encoded) == len(docs) == len(ids)
+
+
+def test_small_ivf_pq_corpus_records_fallback_and_retrains_when_large_enough(corpus):
+    gen = generator(corpus, index_type="ivf_pq", pq_m=4)
+    gen.build_faiss_index()
+    assert manifest(gen)["index"]["type"] == "ivf_flat"
+
+    (corpus / "teff.txt").write_text(paragraph("teff", 6000), encoding="utf-8")
+    gen = generator(corpus, index_type="ivf_pq", pq_m=4)
+    gen.build_faiss_index()
+    saved = manifest(gen)
+    assert sum(len(info["ids"]) for info in saved["files"].values()) >= 256
+    assert saved["index"] == {"type": "ivf_pq", "nlist": gen.nlist, "pq_m": 4}
+    index = faiss.read_index(os.path.join(gen.index_dir, INDEX_FILE))
+    assert isinstance(index, faiss.IndexIVFPQ)
@@ -0,0 +1,46 @@
+import numpy as np
+
+from src.metrics import Metrics_Registry
+from src.semantic_cache import SemanticCache
+
+WORDS = ["maize", "cassava", "yam", "plant", "when", "pests"]
+
+
+def bag_of_words(text):
+    return np.array([text.lower().count(word) for word in WORDS], dtype="float32") + 0.01
+
+
+def test_stats_aggregate_routes():
+    cache = SemanticCache(bag_of_words, threshold=0.99)
+    cache.store("When to plant maize", "April", route="RAG")
+    assert cache.lookup("when to plant maize", route="RAG") == "April"
+    assert cache.lookup("when to plant maize", route="BOTH") is None
+    assert cache.lookup("cassava pests", route="RAG") is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+    assert stats["hit_rate"] == 1 / 3
+    assert stats["routes"]["RAG"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+    assert stats["routes"]["BOTH"] == {"hits": 0, "misses": 1, "hit_rate": 0.0}
+
+
+def test_empty_cache_stats():
+    stats = SemanticCache(bag_of_words).stats()
+    assert stats == {"size": 0, "evictions": 0, "hits": 0, "misses": 0, "hit_rate": 0.0, "routes": {}}
+
+
+def test_cache_gauges_export_semantic_hit_ratio(monkeypatch):
+    from src import metrics as metrics_module
+
+    registry = Metrics_Registry()
+    monkeypatch.setattr(metrics_module, "metrics", registry)
+    cache = SemanticCache(bag_of_words, threshold=0.99)
+    cache.store("When to plant yam", "March")
+    cache.lookup("when to plant yam")
+    cache.lookup("maize pests")
+    metrics_module.cache_gauges({"semantic_answer": cache.stats})
+
+    text = registry.render()
+    assert 'agrox_cache_hit_ratio{cache="semantic_answer"} 0.5' in text
+    assert 'agrox_cache_hits{cache="semantic_answer"} 1' in text
+    assert 'agrox_cache_misses{cache="semantic_answer"} 1' in text
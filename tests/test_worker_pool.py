@@ -0,0 +1,106 @@
+import asyncio
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.image_classifier import Batch_Classifier
+from src.worker_pool import WORKER_FAMILIES, Remote_Model, _encode, _decode, _release
+
+
+class InProcessWorker:
+    ''' Inference_Worker stand-in serving calls in this process, with arguments
+    sent through the same shared-memory encoding as a real worker '''
+
+    family = "image_classifier"
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = []
+
+    def call(self, method, *args, **kwargs):
+        self.calls.append(method)
+        sent, received = [], []
+        try:
+            return getattr(self.model, method)(*_decode(_encode(args, sent), received), **kwargs)
+        finally:
+            _release(received, unlink=False)
+            _release(sent, unlink=True)
+
+
+class WidthClassifier:
+    ''' Labels an image by its width '''
+
+    def classify_plant_images(self, images):
+        return [f"width {image.size[0]}" for image in images]
+
+
+def remote_classifier():
+    worker = InProcessWorker(WidthClassifier())
+    return Remote_Model(worker, WORKER_FAMILIES["image_classifier"]["methods"]), worker
+
+
+def test_remote_model_only_exposes_family_methods():
+    model, _ = remote_classifier()
+    with pytest.raises(AttributeError):
+        model.load_image
+    with pytest.raises(AttributeError):
+        model._estimate_size
+
+
+def test_batch_classifier_over_remote_model():
+    model, worker = remote_classifier()
+    images = [Image.fromarray(np.zeros((8, width, 3), dtype=np.uint8)) for width in (16, 24, 32)]
+
+    async def classify_all():
+        batcher = Batch_Classifier(model, max_batch_size=8, batch_window_ms=20)
+        try:
+            return await asyncio.gather(*(batcher.classify(image) for image in images))
+        finally:
+            await batcher.stop()
+
+    assert asyncio.run(classify_all()) == ["width 16", "width 24", "width 32"]
+    # One forward pass in the worker for the whole batch
+    assert worker.calls == ["classify_plant_images"]
+
+
+def test_batch_classifier_over_remote_model_reports_bad_input():
+    model, _ = remote_classifier()
+
+    async def classify_bad():
+        batcher = Batch_Classifier(model)
+        try:
+            return await batcher.classify("no/such/image.png")
+        finally:
+            await batcher.stop()
+
+    with pytest.raises(ValueError):
+        asyncio.run(classify_bad())
+
+
+class FakeWhisper:
+    def transcribe(self, audio):
+        return {"text": f" {len(audio)} samples ", "language": "en"}
+
+
+def test_stream_chunks_go_to_the_whisper_worker(monkeypatch):
+    pytest.importorskip("whisper")
+    from src import audio_handler
+    from src.model_registry import ModelRegistry
+    from src.worker_pool import Worker_Pool
+
+    registry = ModelRegistry()
+    pool = Worker_Pool(["whisper"])
+    worker = InProcessWorker(FakeWhisper())
+    worker.family = "whisper"
+    pool.workers["whisper"] = worker
+    pool.install(registry)
+
+    def no_local_model(name):
+        raise AssertionError("chunk pool loaded its own Whisper model")
+
+    monkeypatch.setattr(audio_handler, "registry", registry)
+    monkeypatch.setattr(audio_handler.whisper, "load_model", no_local_model)
+    chunk = np.zeros(1600, dtype=np.float32)
+    assert audio_handler._transcribe_chunk(chunk) == ("1600 samples", "en")
+    assert worker.calls == ["transcribe"]